@@ -0,0 +1,149 @@
+"""
+adaptive_mcs.py
+---------------
+Adaptive iteration count for the MCS runner.
+
+Instead of a fixed ``--simulations``, the campaign runs in rounds and after
+each round checks, for every node, the width of the confidence interval of
+its q05, median and q95 completion year (distribution-free order-statistic
+intervals, see ``CompletionYearAggregator.quantile_ci_widths``). An option
+stops once every node that completes at all is within the target precision,
+when the time budget would be exceeded by the next round, or at
+``max_iterations``, whichever comes first.
+
+Rounds double the iteration count (``first_batch``, ``first_batch``,
+``2 * first_batch``, ...) up to ``max_batch`` per round, so small trees stop
+after a few hundred iterations while large ones keep going. Samples come from
+the same streams as ``--stream`` (legacy streams, or per-iteration seeded
+streams with ``workers``), taken from a campaign of ``max_iterations``.
+"""
+
+import contextlib
+import math
+import time
+
+from scipy.stats import norm
+
+CONFIDENCE = 0.95
+CI_QUANTILES = (("q05", 0.05), ("median", 0.5), ("q95", 0.95))
+
+
+def batch_sizes(first_batch, max_batch):
+    """Round sizes that double the campaign until rounds reach ``max_batch``."""
+    yield first_batch
+    total = first_batch
+    while True:
+        size = min(total, max_batch)
+        yield size
+        total += size
+
+
+def precision_report(aggregate, precision=None, confidence=CONFIDENCE):
+    """
+    Widest confidence interval per quantile over all nodes, and the nodes not
+    yet within ``precision`` years (every node if ``precision`` is None).
+    """
+    z = float(norm.ppf(0.5 + confidence / 2))
+    widths = aggregate.quantile_ci_widths([q for _, q in CI_QUANTILES], z)
+    max_width = {
+        name: max((node[q] for node in widths.values()), default=0.0) for name, q in CI_QUANTILES
+    }
+    unconverged = sorted(
+        label for label, node in widths.items()
+        if precision is None or any(width > precision for width in node.values())
+    )
+    return {
+        "max_ci_width": {name: None if math.isinf(w) else w for name, w in max_width.items()},
+        "unconverged_nodes": len(unconverged),
+        "unconverged_examples": unconverged[:5],
+    }
+
+
+def run_adaptive(scheduler, options, precision=None, time_budget=None, max_iterations=100_000,
+                 first_batch=100, max_batch=1000, workers=None, seed=24, years_to_simulate=30,
+                 log=print):
+    """
+    Run ``options`` round by round until each one converges, the time budget
+    (seconds) runs out or ``max_iterations`` is reached.
+
+    Returns (option -> ``CompletionYearAggregator``, option -> report), where
+    a report holds the iterations run, the stop reason and the achieved
+    precision (see ``precision_report``).
+    """
+    from completion_aggregates import CompletionYearAggregator
+
+    started = time.perf_counter()
+    options = list(options)
+    aggregates = {option: CompletionYearAggregator() for option in options}
+    iterations = dict.fromkeys(options, 0)
+    reports = {}
+    sizes = batch_sizes(first_batch, max_batch)
+
+    if workers:
+        from parallel_mcs import AggregatePool
+
+        pool = AggregatePool(scheduler, options, max_iterations, workers, seed, years_to_simulate)
+    else:
+        from batch_engine import iter_samples
+
+        pool = None
+        streams = {
+            option: iter_samples(scheduler.tree, option, max_iterations, batch_sizes(first_batch, max_batch))
+            for option in options
+        }
+
+    def run_round(active, size):
+        if pool is not None:
+            start = iterations[active[0]]
+            return pool.run(active, start, start + size)
+        parts = {}
+        for option in active:
+            samples = next(streams[option])
+            schedule = scheduler.run_events(samples.n_iterations, option, samples=samples)
+            parts[option] = CompletionYearAggregator().update(*schedule.completion_table(years_to_simulate))
+        return parts
+
+    per_iteration = None
+    rounds = 0
+    with pool if pool is not None else contextlib.nullcontext():
+        active = list(options)
+        for size in sizes:
+            if not active:
+                break
+            size = min(size, max_iterations - iterations[active[0]])
+            elapsed = time.perf_counter() - started
+            if (time_budget is not None and per_iteration is not None
+                    and elapsed + per_iteration * size * len(active) > time_budget):
+                for option in active:
+                    reports[option] = {"stop_reason": "time_budget"}
+                break
+
+            round_started = time.perf_counter()
+            for option, part in run_round(active, size).items():
+                aggregates[option].merge(part)
+                iterations[option] += size
+            per_iteration = (time.perf_counter() - round_started) / (size * len(active))
+
+            still_active = []
+            for option in active:
+                report = precision_report(aggregates[option], precision)
+                if precision is not None and not report["unconverged_nodes"]:
+                    reports[option] = {"stop_reason": "converged"}
+                elif iterations[option] >= max_iterations:
+                    reports[option] = {"stop_reason": "max_simulations"}
+                else:
+                    still_active.append(option)
+            rounds += 1
+            if still_active != active or rounds % 10 == 0:
+                log(f"  {iterations[active[0]]} iterations: "
+                    + ", ".join(f"{o} {'running' if o in still_active else reports[o]['stop_reason']}"
+                                for o in active))
+            active = still_active
+
+    reports = {
+        option: {"iterations": iterations[option], **reports[option],
+                 **precision_report(aggregates[option], precision)}
+        for option in options
+    }
+    return aggregates, reports
+
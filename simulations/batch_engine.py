@@ -0,0 +1,351 @@
+"""
+batch_engine.py
+---------------
+Vectorised Monte Carlo engine behind ``NuclearScheduler.run_batch``.
+
+All iterations of a campaign are advanced together: per-node state is held as
+(nodes x iterations) arrays, and each year step walks the tracked nodes once in
+tree order (so same-year unlocking matches ``run_simulation``) while updating
+every iteration with a single NumPy operation.
+
+Results are returned as stacked arrays shaped (iterations, tracked nodes,
+years); ``BatchResult.to_tables`` rebuilds the dict tables that
+``run_simulation`` returns for a single iteration.
+"""
+
+import itertools
+import time
+
+import numpy as np
+from scipy.stats import qmc, triang
+
+from compiled_tree import SimState
+from instrumentation import INSTRUMENTS
+
+STATUS_PENDING, STATUS_ACTIVE, STATUS_COMPLETED = 0, 1, 2
+STATUS_LABELS = ("Pending", "Active", "Completed")
+
+# Distribution parameters used by mcs_techtree_runner (global) and run_simulation (local)
+YEARS_PER_TRL_TRIANGLE = (1.5, 2.5, 3.5)
+RANDOM_DELAY_TRIANGLE = (0.0, 2.0, 5.0)
+
+
+class BatchSamples:
+    """
+    Sampled inputs for a batch of iterations.
+
+    ``initial_times`` is (iterations, nodes) over all compiled nodes;
+    ``years_per_trl`` holds the global draw per iteration (option_1/option_3)
+    and ``random_delays`` the local per-node draws (option_2/option_3) for the
+    nodes in ``CompiledTree.trl_parsed`` order.
+    """
+
+    __slots__ = ("option", "initial_times", "years_per_trl", "random_delays")
+
+    def __init__(self, option, initial_times, years_per_trl=None, random_delays=None):
+        self.option = option
+        self.initial_times = initial_times
+        self.years_per_trl = years_per_trl
+        self.random_delays = random_delays
+
+    @property
+    def n_iterations(self):
+        return self.initial_times.shape[0]
+
+    @classmethod
+    def from_draws(cls, tree, option, n_iterations, years_per_trl=None, random_delays=None):
+        initial_times = np.empty((n_iterations, tree.n_total))
+        for it in range(n_iterations):
+            initial_times[it] = tree.initial_times(
+                option,
+                None if years_per_trl is None else years_per_trl[it],
+                None if random_delays is None else random_delays[it],
+            )
+        return cls(option, initial_times, years_per_trl, random_delays)
+
+    def random_number_by_node(self, tree, iteration):
+        """label -> random number used in ``iteration`` (as in run_simulation's helper dict)."""
+        sampled = np.flatnonzero(tree.trl_parsed)
+        if self.option == 'option_1':
+            return {tree.labels[i]: float(self.years_per_trl[iteration]) for i in sampled}
+        if self.option in ('option_2', 'option_3'):
+            return {tree.labels[i]: float(v) for i, v in zip(sampled, self.random_delays[iteration])}
+        return {}
+
+
+def lhs_point_stream(lhc_seed, n):
+    """
+    ``n`` successive one-point draws of ``qmc.LatinHypercube(d=1, seed=lhc_seed)``.
+
+    A one-point LHS sample is ``1 - u`` for a single uniform draw, so the stream
+    is generated in one call. The first two draws are checked against the real
+    sampler (the second catches a SciPy that consumes more than one uniform
+    per call) and we fall back to it if the SciPy internals differ.
+    """
+    sampler = qmc.LatinHypercube(d=1, seed=lhc_seed)
+    if n == 0:
+        return np.empty(0)
+    checked = [sampler.random(n=1)[0, 0] for _ in range(min(n, 2))]
+    fast = 1.0 - np.random.default_rng(lhc_seed).uniform(size=n)
+    if np.array_equal(fast[:len(checked)], checked):
+        return fast
+    return np.array(checked + [sampler.random(n=1)[0, 0] for _ in range(n - len(checked))])
+
+
+def draw_samples(tree, option, n_iterations, seed=24, lhs_seed=42, lhc_seed=1):
+    """
+    Draw a batch with the same streams the serial runner used: ``seed`` for
+    the legacy global NumPy state (option_1/option_2), ``lhs_seed`` for the
+    option_3 global LHS and ``lhc_seed, lhc_seed + 1, ...`` per iteration for
+    the option_3 local LHS draws.
+    """
+    n_sampled = int(tree.trl_parsed.sum())
+    years_per_trl = None
+    random_delays = None
+
+    if option == 'option_1':
+        left, mode, right = YEARS_PER_TRL_TRIANGLE
+        years_per_trl = np.random.RandomState(seed).triangular(left, mode, right, size=n_iterations)
+    elif option == 'option_2':
+        left, mode, right = RANDOM_DELAY_TRIANGLE
+        random_delays = np.random.RandomState(seed).triangular(
+            left, mode, right, size=(n_iterations, n_sampled))
+    elif option == 'option_3':
+        min1, mode1, max1 = YEARS_PER_TRL_TRIANGLE
+        c1 = (mode1 - min1) / (max1 - min1)
+        sampler1 = qmc.LatinHypercube(d=1, seed=lhs_seed)
+        years_per_trl = triang.ppf(sampler1.random(n=n_iterations), c=c1, loc=min1,
+                                   scale=(max1 - min1))[:, 0]
+        min2, mode2, max2 = RANDOM_DELAY_TRIANGLE
+        c2 = (mode2 - min2) / (max2 - min2)
+        uniforms = np.array([lhs_point_stream(lhc_seed + it, n_sampled) for it in range(n_iterations)])
+        random_delays = triang.ppf(uniforms.reshape(n_iterations, n_sampled), c2, loc=min2,
+                                   scale=(max2 - min2))
+
+    return BatchSamples.from_draws(tree, option, n_iterations, years_per_trl, random_delays)
+
+
+def iter_samples(tree, option, n_iterations, batch_size, seed=24, lhs_seed=42, lhc_seed=1):
+    """
+    ``draw_samples`` in consecutive chunks of at most ``batch_size``
+    iterations (an int, or an iterable of chunk sizes), for streaming
+    campaigns. The legacy streams are consumed in the same order, so the
+    chunks concatenate to exactly ``draw_samples``; only the option_3 global
+    LHS (one value per iteration) is drawn up front.
+    """
+    n_sampled = int(tree.trl_parsed.sum())
+    legacy = np.random.RandomState(seed)
+    if option == 'option_3':
+        min1, mode1, max1 = YEARS_PER_TRL_TRIANGLE
+        sampler1 = qmc.LatinHypercube(d=1, seed=lhs_seed)
+        design = triang.ppf(sampler1.random(n=n_iterations), c=(mode1 - min1) / (max1 - min1),
+                            loc=min1, scale=(max1 - min1))[:, 0]
+
+    sizes = itertools.repeat(batch_size) if isinstance(batch_size, int) else iter(batch_size)
+    start = 0
+    for size in sizes:
+        if start >= n_iterations:
+            return
+        stop = min(start + size, n_iterations)
+        size = stop - start
+        years_per_trl = None
+        random_delays = None
+        with INSTRUMENTS.phase('sample'):
+            if option == 'option_1':
+                years_per_trl = legacy.triangular(*YEARS_PER_TRL_TRIANGLE, size=size)
+            elif option == 'option_2':
+                random_delays = legacy.triangular(*RANDOM_DELAY_TRIANGLE, size=(size, n_sampled))
+            elif option == 'option_3':
+                years_per_trl = design[start:stop]
+                min2, mode2, max2 = RANDOM_DELAY_TRIANGLE
+                uniforms = np.array([lhs_point_stream(lhc_seed + it, n_sampled) for it in range(start, stop)])
+                random_delays = triang.ppf(uniforms.reshape(size, n_sampled), (mode2 - min2) / (max2 - min2),
+                                           loc=min2, scale=(max2 - min2))
+            samples = BatchSamples.from_draws(tree, option, size, years_per_trl, random_delays)
+        yield samples
+        start = stop
+
+
+class BatchResult:
+    """
+    Stacked outputs of ``simulate_batch``.
+
+    ``status`` holds STATUS_* codes; ``impact_twh``, ``baseline_twh`` and
+    ``accelerated_twh`` are NaN wherever ``run_simulation`` would not have
+    written an entry.
+    """
+
+    def __init__(self, tree, samples, years, status, impact_twh, baseline_twh, accelerated_twh):
+        self.tree = tree
+        self.samples = samples
+        self.years = years
+        self.tracked_labels = [tree.labels[i] for i in tree.tracked_indices]
+        self.status = status
+        self.impact_twh = impact_twh
+        self.baseline_twh = baseline_twh
+        self.accelerated_twh = accelerated_twh
+
+    @property
+    def n_iterations(self):
+        return self.status.shape[0]
+
+    def select(self, rows, samples):
+        """Result restricted to iteration ``rows`` (a slice), described by ``samples``."""
+        return BatchResult(self.tree, samples, self.years, self.status[rows], self.impact_twh[rows],
+                           self.baseline_twh[rows], self.accelerated_twh[rows])
+
+    def to_tables(self, iteration):
+        """Dict tables for one iteration, shaped like ``baseline_simulation.run_simulation``."""
+        labels = self.tracked_labels
+        years = self.years.tolist()
+        rn = self.samples.random_number_by_node(self.tree, iteration)
+        impact_table = {label: {} for label in labels}
+        status_table = {label: {} for label in labels}
+        random_number_table = {label: {} for label in labels}
+        baseline_mwh_table = {label: {} for label in labels}
+        accelerated_mwh_table = {label: {} for label in labels}
+
+        status = self.status[iteration]
+        impact = self.impact_twh[iteration]
+        baseline = self.baseline_twh[iteration]
+        accelerated = self.accelerated_twh[iteration]
+        for k, label in enumerate(labels):
+            for y, year in enumerate(years):
+                status_table[label][year] = STATUS_LABELS[status[k, y]]
+                random_number_table[label][year] = rn.get(label, None)
+                if not np.isnan(baseline[k, y]):
+                    baseline_mwh_table[label][year] = float(baseline[k, y])
+                    accelerated_mwh_table[label][year] = float(accelerated[k, y])
+                if not np.isnan(impact[k, y]):
+                    impact_table[label][year] = float(impact[k, y])
+        return impact_table, status_table, random_number_table, baseline_mwh_table, accelerated_mwh_table
+
+
+def simulate_batch(tree, reach, solver, samples, years_to_simulate, start_year, discounted_mwh,
+                   mwh_to_twh, compute_impact=True, impact_nodes=None, allocate=None):
+    """
+    Advance every iteration in ``samples`` year by year.
+
+    ``reach`` and ``solver`` are the tree's ``ReachabilityIndex`` and
+    ``CriticalPathSolver``; ``discounted_mwh`` maps an array of deployment
+    years to discounted MWh. ``impact_nodes`` (node indices) restricts the
+    impact evaluation to those nodes; status is always simulated for all.
+
+    ``allocate(y, state, in_progress)`` is called after each year's sweep
+    with the still-active nodes as (tracked position, node, iteration rows)
+    and may spend extra work on them by changing ``state`` (bumping its
+    version); impacts are then evaluated on the changed state.
+    """
+    n_iter = samples.n_iterations
+    tracked = tree.tracked_indices.tolist()
+    n_tracked = len(tracked)
+    pred_lists = tree.pred_lists
+    concepts = np.flatnonzero(tree.is_concept)
+    years = np.arange(start_year, start_year + years_to_simulate)
+
+    # Node-major state so each node's iterations are contiguous
+    state = SimState.from_initial_times(tree, samples.initial_times.T)
+    time_remaining = state.time_remaining
+    prob_of_success = state.prob_of_success
+    is_complete = state.is_complete
+    risk_step = (1 - tree.init_prob)[:, None] / state.initial_time
+    evaluate = np.ones(tree.n_total, dtype=bool)
+    if impact_nodes is not None:
+        evaluate[:] = False
+        evaluate[np.asarray(list(impact_nodes), dtype=np.int64)] = True
+
+    status = np.empty((n_iter, n_tracked, years_to_simulate), dtype=np.int8)
+    impact_twh = np.full((n_iter, n_tracked, years_to_simulate), np.nan)
+    baseline_twh = np.full_like(impact_twh, np.nan)
+    accelerated_twh = np.full_like(impact_twh, np.nan)
+
+    # Sweep and impact time per year, only read when instrumentation is on
+    timed = INSTRUMENTS.enabled
+    clock = time.perf_counter
+    sweep_seconds = impact_seconds = 0.0
+
+    for y in range(years_to_simulate):
+        if timed:
+            year_started = clock()
+        in_progress = []
+        for k, i in enumerate(tracked):
+            done = is_complete[i]
+            preds = pred_lists[i]
+            ready = is_complete[list(preds)].all(axis=0) if preds else np.ones(n_iter, dtype=bool)
+            active = ~done & ready
+            status[:, k, y] = np.where(done, STATUS_COMPLETED,
+                                       np.where(active, STATUS_ACTIVE, STATUS_PENDING))
+            if not active.any():
+                continue
+            step = active & (time_remaining[i] > 0)
+            time_remaining[i, step] -= 1
+            prob_of_success[i, step] += risk_step[i, step]
+            finished = active & (time_remaining[i] <= 0)
+            is_complete[i, finished] = True
+            prob_of_success[i, finished] = 1.0
+            still_active = active & ~finished
+            if evaluate[i] and still_active.any():
+                in_progress.append((k, i, np.flatnonzero(still_active)))
+
+        state.version += 1
+        if allocate is not None:
+            allocate(y, state, in_progress)
+            # Nodes the allocation completed have no impact left to evaluate
+            in_progress = [(k, i, rows[~is_complete[i, rows]]) for k, i, rows in in_progress]
+            in_progress = [entry for entry in in_progress if len(entry[2])]
+        if timed:
+            impact_started = clock()
+            sweep_seconds += impact_started - year_started
+        if not compute_impact or not in_progress:
+            continue
+
+        base_times, base_probs = solver.solve(state)
+        base_value = {c: discounted_mwh(start_year + base_times[c]) * base_probs[c] for c in concepts.tolist()}
+        for k, i, rows in in_progress:
+            affected = reach.concepts_of(i)
+            if not affected:
+                continue
+            baseline_mwh = np.zeros(len(rows))
+            for c in affected:
+                baseline_mwh += base_value[c][rows]
+
+            # Apply acceleration (one year less, one year of risk reduction) as an overlay
+            acc_times, acc_probs = solver.overlay(reach, state, i, rows, -1, risk_step[i, rows])
+            accelerated_mwh = np.zeros(len(rows))
+            for c in affected:
+                accelerated_mwh += discounted_mwh(start_year + acc_times[c]) * acc_probs[c]
+
+            impact = (accelerated_mwh - baseline_mwh) / mwh_to_twh
+            baseline_twh[rows, k, y] = baseline_mwh / mwh_to_twh
+            accelerated_twh[rows, k, y] = accelerated_mwh / mwh_to_twh
+            impact_twh[rows, k, y] = np.where(impact > 0.001, impact, np.nan)
+        if timed:
+            impact_seconds += clock() - impact_started
+
+    if timed:
+        INSTRUMENTS.add_time('simulate', sweep_seconds)
+        INSTRUMENTS.add_time('impact', impact_seconds)
+        INSTRUMENTS.count('batch_iterations', n_iter)
+    return BatchResult(tree, samples, years, status, impact_twh, baseline_twh, accelerated_twh)
+
+
+def simulate_options(tree, reach, solver, samples_by_option, years_to_simulate, start_year,
+                     discounted_mwh, mwh_to_twh, compute_impact=True):
+    """
+    Evaluate the samples of several options in a single ``simulate_batch`` pass.
+
+    The iterations of every option are stacked side by side, so the per-year
+    walk over the tree, the critical-path solves and the cone overlays are
+    paid once for the whole set instead of once per option. Iterations never
+    interact, so each option's slice equals a separate run. Returns
+    option -> ``BatchResult``.
+    """
+    options = list(samples_by_option)
+    bounds = np.cumsum([0] + [samples_by_option[o].n_iterations for o in options])
+    stacked = BatchSamples(None, np.concatenate([samples_by_option[o].initial_times for o in options]))
+    result = simulate_batch(tree, reach, solver, stacked, years_to_simulate, start_year,
+                            discounted_mwh, mwh_to_twh, compute_impact=compute_impact)
+    return {
+        option: result.select(slice(bounds[k], bounds[k + 1]), samples_by_option[option])
+        for k, option in enumerate(options)
+    }
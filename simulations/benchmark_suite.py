@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark_suite.py
+------------------
+Scaling benchmarks for the MCS pipeline on synthetic tech trees.
+
+Usage:
+    python benchmark_suite.py [--preset quick|full] [--nodes 50 500] [--iterations 10 100]
+                              [--history benchmark_history.jsonl] [--fail-on-regression]
+
+``synthetic_tree`` generates a layered DAG in the tech tree JSON format with a
+given node count, depth, fan-in/fan-out, concept fraction and TRL mix. For
+every (nodes, iterations) size the suite times the stages of a runner run:
+
+* ``scheduler_init``  - ``NuclearScheduler(tree)`` (compiling the tree)
+* ``run_simulation``  - one ``NuclearScheduler.run_simulation`` call (option_3)
+* ``monte_carlo``     - ``run_option_batches`` + ``main_run_mcs`` (option_3)
+* ``stats``           - ``calculate_stats_for_all_nodes``
+* ``risk``            - ``main_run_risk_assessment``
+* ``sensitivity``     - ``node_sensitivity_analysis``
+* ``write_outputs``   - the stats/runs/risk/distributions/sensitivity JSON files
+
+Sizes whose status/impact arrays would exceed ``--max-cells`` are recorded as
+skipped, and once a size takes longer than ``--size-timeout`` the larger
+iteration counts for that tree are skipped too, so a full sweep shows how far
+tree size can be pushed before the nightly job runs out of time or memory.
+
+Every run appends one JSON line to the history file (machine, git commit,
+settings, per-case seconds). Each case is compared with the median of its
+last ``--baseline-runs`` timings on the same machine; it is a regression when
+it is slower by more than ``--tolerance`` (relative) and ``--min-seconds``
+(absolute). ``--fail-on-regression`` turns regressions into exit code 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from batch_engine import YEARS_PER_TRL_TRIANGLE
+from compiled_tree import CONCEPT_TYPES
+from simulation import TRL_PROBABILITY_MAP, NuclearScheduler
+
+HISTORY_VERSION = 1
+PRESETS = {
+    "quick": {"nodes": [50, 500], "iterations": [10, 100]},
+    "full": {"nodes": [50, 500, 5000, 50000], "iterations": [10, 100, 1000, 10000]},
+}
+CASES = ("scheduler_init", "run_simulation", "monte_carlo", "stats", "risk", "sensitivity", "write_outputs")
+DEFAULT_TRL_MIX = {trl: 1.0 for trl in TRL_PROBABILITY_MAP if trl != "default"}
+# Status (int8) plus three float64 impact arrays per (iteration, node, year)
+BYTES_PER_CELL = 25
+
+# ---------------------------------------------------------------------------
+# Synthetic tech trees
+# ---------------------------------------------------------------------------
+
+def synthetic_tree(n_nodes, depth=8, fan_in=2, fan_out=4, concept_fraction=0.1, trl_mix=None,
+                   projected_fraction=0.2, seed=0):
+    """
+    Layered tech tree DAG in the ``{"graph": {"nodes", "edges"}}`` format.
+
+    Milestones and enabling technologies are spread over ``depth`` layers;
+    each gets up to ``fan_in`` prerequisites from the layer below it (earlier
+    layers once that is used up), and no node gets more than ``fan_out``
+    successors unless every candidate is full. Concepts (``concept_fraction``
+    of the nodes) sit on top with ``fan_in`` prerequisites from any layer.
+    TRLs are drawn from ``trl_mix`` (TRL string -> weight, default uniform
+    over TRL_PROBABILITY_MAP); ``projected_fraction`` of the nodes get a
+    ``trl_projected_5_10_years``.
+    """
+    rng = np.random.default_rng(seed)
+    trl_mix = trl_mix or DEFAULT_TRL_MIX
+    trls = list(trl_mix)
+    weights = np.array([trl_mix[t] for t in trls], dtype=float)
+
+    n_concepts = min(max(int(round(n_nodes * concept_fraction)), 1), n_nodes - 1)
+    n_work = n_nodes - n_concepts
+    depth = max(1, min(depth, n_work))
+    layer_of = np.sort(np.concatenate([np.arange(depth), rng.integers(0, depth, n_work - depth)]))
+    layers = [np.flatnonzero(layer_of == k) for k in range(depth)]
+    out_degree = np.zeros(n_work, dtype=np.int64)
+
+    def pick(candidates, k):
+        chosen = []
+        for pool in candidates:
+            if len(chosen) >= k:
+                break
+            open_ = pool[out_degree[pool] < fan_out]
+            take = rng.choice(open_, size=min(k - len(chosen), len(open_)), replace=False)
+            chosen.extend(take.tolist())
+        if len(chosen) < k:  # every candidate is at fan_out; ignore the cap
+            rest = np.setdiff1d(np.concatenate(candidates), chosen)
+            chosen.extend(rng.choice(rest, size=min(k - len(chosen), len(rest)), replace=False).tolist())
+        out_degree[chosen] += 1
+        return chosen
+
+    ids = [f"synthetic_{i}" for i in range(n_nodes)]
+    edges = []
+    for layer in range(1, depth):
+        below = [layers[k] for k in range(layer - 1, -1, -1)]
+        for i in layers[layer].tolist():
+            for j in pick(below, int(rng.integers(1, fan_in + 1))):
+                edges.append((ids[j], ids[i]))
+    all_work = [np.concatenate(layers[::-1])]
+    for c in range(n_work, n_nodes):
+        for j in pick(all_work, fan_in):
+            edges.append((ids[j], ids[c]))
+
+    nodes = []
+    node_trls = rng.choice(trls, size=n_nodes, p=weights / weights.sum())
+    projected = rng.random(n_nodes) < projected_fraction
+    work_types = rng.choice(["Milestone", "EnablingTechnology"], size=n_work)
+    for i in range(n_nodes):
+        concept = i >= n_work
+        node = {
+            "id": ids[i],
+            "label": f"{'Concept' if concept else 'Node'} {i}",
+            "type": CONCEPT_TYPES[0] if concept else str(work_types[i]),
+            "trl_current": str(node_trls[i]),
+        }
+        if projected[i]:
+            node["trl_projected_5_10_years"] = "9"
+        nodes.append(node)
+    # Real trees are not stored in dependency order
+    order = rng.permutation(n_nodes)
+    return {
+        "graph": {
+            "nodes": [nodes[i] for i in order],
+            "edges": [{"id": f"edge_{k}", "source": s, "target": t} for k, (s, t) in enumerate(edges)],
+        }
+    }
+
+# ---------------------------------------------------------------------------
+# Timed cases
+# ---------------------------------------------------------------------------
+
+def _timed(fn, repeat):
+    """(best seconds over ``repeat`` calls, result of the last call)."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def benchmark_size(tech_tree, n_iterations, repeat=1):
+    """Seconds per case for one tree and iteration count (see CASES)."""
+    import mcs_techtree_runner as runner
+    from completion_aggregates import CompletionYearAggregator
+
+    seconds = {}
+    seconds["scheduler_init"], scheduler = _timed(lambda: NuclearScheduler(tech_tree), repeat)
+    seconds["run_simulation"], _ = _timed(
+        lambda: scheduler.run_simulation(option='option_3', random_number=YEARS_PER_TRL_TRIANGLE[1], lhc_seed=24),
+        repeat)
+
+    def monte_carlo():
+        batches = runner.run_option_batches(scheduler, ['option_3'], n_iterations)
+        return runner.main_run_mcs(scheduler, 'option_3', n_iterations, batch=batches['option_3'])
+
+    seconds["monte_carlo"], runs = _timed(monte_carlo, repeat)
+    seconds["stats"], (data_completed, stats) = _timed(
+        lambda: runner.calculate_stats_for_all_nodes(runs, scheduler, tech_tree), repeat)
+    seconds["risk"], evaluation = _timed(lambda: runner.main_run_risk_assessment(stats), repeat)
+    seconds["sensitivity"], sensitivity = _timed(
+        lambda: runner.node_sensitivity_analysis(data_completed, stats), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+
+        def write_outputs():
+            runner.save_stats_json(stats, out / "stats_option3.json")
+            runner.save_simulation_runs_json(data_completed, out / "simulation_runs_option3.json")
+            runner.save_risk_assessment_json(evaluation, out / "risk_assessment_option3.json")
+            runner.save_distributions_json(CompletionYearAggregator().update_runs(runs),
+                                           data_completed['Node'].value_counts().to_dict(),
+                                           out / "distributions_option3.json")
+            runner.save_sensitivity_json(sensitivity, out / "sensitivity.json")
+
+        seconds["write_outputs"], _ = _timed(write_outputs, repeat)
+    return seconds
+
+
+def run_suite(node_counts, iteration_counts, tree_params=None, repeat=1, max_cells=5e7,
+              size_timeout=None, log=print):
+    """
+    Time every case for every (nodes, iterations) size; returns a list of
+    result rows ``{"nodes", "iterations", "status", "seconds"?, "reason"?}``.
+    """
+    tree_params = tree_params or {}
+    results = []
+    for n_nodes in node_counts:
+        tech_tree = synthetic_tree(n_nodes, **tree_params)
+        too_slow = False
+        for n_iterations in iteration_counts:
+            row = {"nodes": n_nodes, "iterations": n_iterations}
+            cells = n_nodes * n_iterations * 30
+            if cells > max_cells:
+                row.update(status="skipped", reason=f"{cells:.3g} cells > --max-cells "
+                                                    f"(~{cells * BYTES_PER_CELL / 2**30:.1f} GiB)")
+            elif too_slow:
+                row.update(status="skipped", reason="a smaller iteration count exceeded --size-timeout")
+            else:
+                started = time.perf_counter()
+                row.update(status="ok", seconds=benchmark_size(tech_tree, n_iterations, repeat))
+                total = time.perf_counter() - started
+                too_slow = size_timeout is not None and total > size_timeout
+            log(f"  {n_nodes:>6} nodes x {n_iterations:>6} iterations: "
+                + (", ".join(f"{case} {s:.3f}s" for case, s in row["seconds"].items())
+                   if row["status"] == "ok" else f"skipped ({row['reason']})"))
+            results.append(row)
+    return results
+
+# ---------------------------------------------------------------------------
+# History and regression checks
+# ---------------------------------------------------------------------------
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def load_history(path):
+    """History entries (oldest first); a missing file is an empty history."""
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def find_regressions(results, history, machine, tolerance=0.25, min_seconds=0.05, baseline_runs=5):
+    """
+    Cases slower than the median of their last ``baseline_runs`` timings on
+    the same machine by more than ``tolerance`` (relative) and ``min_seconds``.
+    """
+    past = {}
+    for entry in history:
+        if entry.get("version") != HISTORY_VERSION or entry.get("machine") != machine:
+            continue
+        for row in entry["results"]:
+            for case, seconds in row.get("seconds", {}).items():
+                past.setdefault((row["nodes"], row["iterations"], case), []).append(seconds)
+
+    regressions = []
+    for row in results:
+        for case, seconds in row.get("seconds", {}).items():
+            previous = past.get((row["nodes"], row["iterations"], case), [])[-baseline_runs:]
+            if not previous:
+                continue
+            baseline = statistics.median(previous)
+            if seconds > baseline * (1 + tolerance) and seconds - baseline > min_seconds:
+                regressions.append({"nodes": row["nodes"], "iterations": row["iterations"], "case": case,
+                                    "seconds": seconds, "baseline_seconds": baseline,
+                                    "ratio": seconds / baseline})
+    return regressions
+
+
+def append_history(path, entry):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the MCS pipeline on synthetic tech trees.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick",
+                        help="Size grid (quick: 50-500 nodes, 10-100 iterations; "
+                             "full: 50-50,000 nodes, 10-10,000 iterations). Default: quick.")
+    parser.add_argument("--nodes", type=int, nargs="+", help="Node counts (overrides the preset).")
+    parser.add_argument("--iterations", type=int, nargs="+", help="Iteration counts (overrides the preset).")
+    parser.add_argument("--depth", type=int, default=8, help="Layers of the synthetic DAG (default: 8).")
+    parser.add_argument("--fan-in", type=int, default=2, help="Max prerequisites per node (default: 2).")
+    parser.add_argument("--fan-out", type=int, default=4, help="Max successors per node (default: 4).")
+    parser.add_argument("--concept-fraction", type=float, default=0.1,
+                        help="Share of concept nodes (default: 0.1).")
+    parser.add_argument("--trl-mix", type=json.loads, default=None,
+                        help='TRL weights as JSON, e.g. \'{"3": 1, "5-6": 2}\' (default: uniform).')
+    parser.add_argument("--seed", type=int, default=0, help="Tree generator seed (default: 0).")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat each case, keep the best (default: 1).")
+    parser.add_argument("--max-cells", type=float, default=5e7,
+                        help="Skip sizes above this many (iteration, node, year) cells (default: 5e7).")
+    parser.add_argument("--size-timeout", type=float, default=600,
+                        help="Skip larger iteration counts once a size takes longer (seconds, default: 600).")
+    parser.add_argument("--history", default=str(Path(__file__).resolve().parent / "benchmark_history.jsonl"),
+                        help="History file to compare against and append to (JSON lines).")
+    parser.add_argument("--no-record", action="store_true", help="Compare only, do not append to the history.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown that counts as a regression (default: 0.25).")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this (default: 0.05).")
+    parser.add_argument("--baseline-runs", type=int, default=5,
+                        help="Past runs whose median is the baseline (default: 5).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with code 1 on regressions.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    node_counts = args.nodes or PRESETS[args.preset]["nodes"]
+    iteration_counts = args.iterations or PRESETS[args.preset]["iterations"]
+    tree_params = {"depth": args.depth, "fan_in": args.fan_in, "fan_out": args.fan_out,
+                   "concept_fraction": args.concept_fraction, "trl_mix": args.trl_mix, "seed": args.seed}
+
+    print(f"Benchmarking {node_counts} nodes x {iteration_counts} iterations...")
+    results = run_suite(node_counts, iteration_counts, tree_params, repeat=args.repeat,
+                        max_cells=args.max_cells, size_timeout=args.size_timeout)
+
+    history_path = Path(args.history)
+    machine = machine_info()
+    regressions = find_regressions(results, load_history(history_path), machine, args.tolerance,
+                                   args.min_seconds, args.baseline_runs)
+    try:
+        git_hash = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        git_hash = "unknown"
+    entry = {
+        "version": HISTORY_VERSION,
+        "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_hash,
+        "machine": machine,
+        "tree": tree_params,
+        "repeat": args.repeat,
+        "thresholds": {"tolerance": args.tolerance, "min_seconds": args.min_seconds,
+                       "baseline_runs": args.baseline_runs},
+        "results": results,
+        "regressions": regressions,
+    }
+    if not args.no_record:
+        append_history(history_path, entry)
+        print(f"Appended results to {history_path}")
+
+    for r in regressions:
+        print(f"REGRESSION: {r['case']} at {r['nodes']} nodes x {r['iterations']} iterations: "
+              f"{r['seconds']:.3f}s vs {r['baseline_seconds']:.3f}s ({r['ratio']:.2f}x)", file=sys.stderr)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
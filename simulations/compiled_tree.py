@@ -0,0 +1,209 @@
+"""
+compiled_tree.py
+----------------
+Array-compiled form of a tech tree graph, built once per scheduler.
+
+Nodes are addressed by integer index (JSON order). Prerequisite and successor
+lists are stored CSR-style (``*_indptr`` / ``*_indices``) and every value the
+simulation re-derived from strings on each iteration (parsed TRL, initial
+probability of success, node type flags) is pre-parsed into NumPy arrays.
+
+Edge endpoints that do not exist as nodes are kept as "phantom" nodes appended
+after the real ones, so the compiled form reproduces the dict-based maps
+exactly: a missing prerequisite still counts on the critical path as
+(time 0, probability 1.0) and a missing target still counts as downstream.
+
+Mutable per-run values live in ``SimState`` and never touch the static node
+metadata (descriptions, references, ...).
+"""
+
+from collections import deque
+
+import numpy as np
+
+TRACKED_TYPES = ("Milestone", "EnablingTechnology")
+# Terminal deployable concepts per domain; pathways are valued on these nodes
+CONCEPT_TYPES = ("ReactorConcept", "HydroConcept", "WindConcept", "SolarConcept")
+
+
+def parse_trl_value(node):
+    """Leading numeric TRL used for the initial-time estimate, or None if unparseable."""
+    try:
+        return float(node.get('trl_current', '1').split('-')[0].split(' ')[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_trl_key(node):
+    """TRL string as used for TRL_PROBABILITY_MAP lookups (e.g. '4-5', '7')."""
+    trl_str = node.get('trl_current', 'default')
+    if ' ' in trl_str: trl_str = trl_str.split(' ')[0]
+    if ';' in trl_str: trl_str = trl_str.split(';')[0].strip()
+    return trl_str
+
+
+def _edge_targets(edge):
+    return edge.get('targets', [edge.get('target')])
+
+
+def _build_csr(n_rows, rows, cols):
+    """CSR arrays for (row, col) pairs, keeping the original pair order within a row."""
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+class CompiledTree:
+    """Static, index-based view of a tech tree graph."""
+
+    def __init__(self, graph_data, trl_probability_map,
+                 tracked_types=TRACKED_TYPES, concept_types=CONCEPT_TYPES):
+        nodes = {node['id']: node for node in graph_data['graph']['nodes']}
+        edges = graph_data['graph']['edges']
+
+        self.ids = list(nodes)
+        self.n_nodes = len(self.ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+
+        # Register phantom endpoints after the real nodes
+        for edge in edges:
+            for endpoint in [edge['source'], *_edge_targets(edge)]:
+                if endpoint and endpoint not in self.index:
+                    self.index[endpoint] = len(self.ids)
+                    self.ids.append(endpoint)
+        self.n_total = len(self.ids)
+
+        # Same inclusion rules as the dict-based dependency/successor maps
+        pred_rows, pred_cols, succ_rows, succ_cols = [], [], [], []
+        for edge in edges:
+            source_id = edge['source']
+            for target_id in _edge_targets(edge):
+                if target_id and target_id in nodes:
+                    pred_rows.append(self.index[target_id])
+                    pred_cols.append(self.index[source_id])
+                if source_id and source_id in nodes and target_id:
+                    succ_rows.append(self.index[source_id])
+                    succ_cols.append(self.index[target_id])
+        self.pred_indptr, self.pred_indices = _build_csr(self.n_total, pred_rows, pred_cols)
+        self.succ_indptr, self.succ_indices = _build_csr(self.n_total, succ_rows, succ_cols)
+        self.pred_lists = [
+            tuple(self.pred_indices[self.pred_indptr[i]:self.pred_indptr[i + 1]].tolist())
+            for i in range(self.n_total)
+        ]
+        self.succ_lists = [
+            tuple(self.succ_indices[self.succ_indptr[i]:self.succ_indptr[i + 1]].tolist())
+            for i in range(self.n_total)
+        ]
+
+        node_list = [nodes[node_id] for node_id in self.ids[:self.n_nodes]]
+        self.labels = [node['label'] for node in node_list]
+        self.types = [node.get('type') for node in node_list]
+
+        # Pre-parsed per-node values (phantoms: no TRL, certain, never tracked)
+        self.trl_value = np.full(self.n_total, np.nan)
+        self.trl_parsed = np.zeros(self.n_total, dtype=bool)
+        self.projected = np.zeros(self.n_total, dtype=bool)
+        self.init_prob = np.ones(self.n_total)
+        for i, node in enumerate(node_list):
+            self.projected[i] = 'trl_projected_5_10_years' in node
+            self.init_prob[i] = trl_probability_map.get(
+                parse_trl_key(node), trl_probability_map['default'])
+            if not self.projected[i]:
+                trl_val = parse_trl_value(node)
+                if trl_val is not None:
+                    self.trl_value[i] = trl_val
+                    self.trl_parsed[i] = True
+        self.is_phantom = np.arange(self.n_total) >= self.n_nodes
+
+        self.tracked_types = tuple(tracked_types)
+        self.concept_types = tuple(concept_types)
+        self.is_tracked = np.zeros(self.n_total, dtype=bool)
+        self.is_tracked[:self.n_nodes] = [t in self.tracked_types for t in self.types]
+        self.is_concept = np.zeros(self.n_total, dtype=bool)
+        self.is_concept[:self.n_nodes] = [t in self.concept_types for t in self.types]
+        self.tracked_indices = np.flatnonzero(self.is_tracked)
+
+        self.topo_order, self.cyclic_nodes = self._topological_order()
+        self.topo_position = np.full(self.n_total, self.n_total, dtype=np.int64)
+        self.topo_position[self.topo_order] = np.arange(len(self.topo_order))
+
+    def _topological_order(self):
+        """Kahn's algorithm over prerequisite edges; returns (order, nodes left on cycles)."""
+        indegree = np.diff(self.pred_indptr).astype(np.int64)
+        dependents = [[] for _ in range(self.n_total)]
+        for target, preds in enumerate(self.pred_lists):
+            for source in preds:
+                dependents[source].append(target)
+
+        queue = deque(np.flatnonzero(indegree == 0).tolist())
+        order = []
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for j in dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    queue.append(j)
+        cyclic = np.flatnonzero(indegree > 0)
+        return np.asarray(order, dtype=np.int32), cyclic
+
+    def initial_times(self, option=None, random_number=None, random_delays=None):
+        """
+        Vector of initial times for every node.
+
+        ``random_delays`` holds the per-node local draws (option_2/option_3) for
+        the nodes in ``self.trl_parsed`` order; option_1/option_3 scale the TRL
+        gap by the global ``random_number``.
+        """
+        times = np.full(self.n_total, 5.0)
+        times[self.projected] = 7.5
+        times[self.is_phantom] = 0.0
+        gap = 9 - self.trl_value[self.trl_parsed]
+        if option == 'option_1':
+            times[self.trl_parsed] = gap * random_number
+        elif option == 'option_2':
+            times[self.trl_parsed] = (gap * 2.5) + random_delays
+        elif option == 'option_3':
+            times[self.trl_parsed] = (gap * random_number) + random_delays
+        else:
+            times[self.trl_parsed] = gap * 2.5
+        return times
+
+
+class SimState:
+    """
+    Mutable per-run node state, stored as flat arrays indexed like CompiledTree.
+
+    ``version`` must be bumped whenever the arrays change; derived results
+    (e.g. cached critical paths) are keyed on it.
+    """
+
+    __slots__ = ("initial_time", "time_remaining", "prob_of_success", "is_complete", "version")
+
+    def __init__(self, initial_time, time_remaining, prob_of_success, is_complete):
+        self.initial_time = initial_time
+        self.time_remaining = time_remaining
+        self.prob_of_success = prob_of_success
+        self.is_complete = is_complete
+        self.version = 0
+
+    @classmethod
+    def from_initial_times(cls, tree, initial_times):
+        """State for (nodes,) or (nodes, iterations) initial times."""
+        initial_times = np.array(initial_times, dtype=float)
+        is_complete = initial_times <= 0
+        is_complete[tree.is_phantom] = True
+        prob_of_success = tree.init_prob.reshape((-1,) + (1,) * (initial_times.ndim - 1))
+        return cls(
+            initial_time=np.where(initial_times > 0, initial_times, 0.1),
+            time_remaining=initial_times,
+            prob_of_success=np.broadcast_to(prob_of_success, initial_times.shape).copy(),
+            is_complete=is_complete,
+        )
+
+    def copy(self):
+        return SimState(self.initial_time.copy(), self.time_remaining.copy(),
+                        self.prob_of_success.copy(), self.is_complete.copy())
@@ -0,0 +1,183 @@
+"""
+completion_aggregates.py
+------------------------
+Streaming, mergeable aggregates of node completion years.
+
+``CompletionYearAggregator`` keeps, per node label, an exact histogram over the
+(integer) completion years plus online moments, kept as exact integer power
+sums (count, sum, sum of squares). Memory depends on the number of nodes and
+distinct years only, never on the number of iterations, so a campaign can be
+fed through it batch by batch. Because everything is integer, aggregators of
+different batches, worker processes or machines combine with ``merge`` without
+any rounding drift, in any grouping; ``to_dict``/``from_dict`` give a JSON
+form for shipping shards around.
+
+From the histograms the aggregator reproduces the per-node completion stats of
+``calculate_stats_for_all_nodes`` (quantiles use the same linear interpolation
+as pandas/NumPy) and the ``distributions_*.json`` bins of
+process_simulation_data.py. Merging in iteration order keeps the bins' year
+order identical to a single pass.
+"""
+
+import math
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+STAT_QUANTILES = (("q05", 0.05), ("q25", 0.25), ("q75", 0.75), ("q95", 0.95))
+
+
+def _order_statistic(years, cumulative, k):
+    """k-th smallest (0-based) value of a histogram given its sorted years and cumulative counts."""
+    return years[np.searchsorted(cumulative, k, side='right')]
+
+
+def _linear_quantile(years, cumulative, q):
+    """``Series.quantile(q)`` (linear interpolation) of the values in a histogram."""
+    n = int(cumulative[-1])
+    q = (q * 100.0) / 100.0  # pandas hands NumPy a percentile
+    index = (n - 1) * q
+    lo = math.floor(index)
+    a = float(_order_statistic(years, cumulative, lo))
+    b = float(_order_statistic(years, cumulative, min(lo + 1, n - 1)))
+    t = index - lo
+    if t >= 0.5:
+        return b - (b - a) * (1 - t)
+    return a + (b - a) * t
+
+
+class CompletionYearAggregator:
+    """Per-node completion-year histograms and moments, built incrementally."""
+
+    def __init__(self):
+        self.histograms = {}  # label -> {year: count}, years in first-seen order
+        self.moments = {}     # label -> [count, sum, sum of squares] (Python ints)
+
+    @property
+    def n_nodes(self):
+        return len(self.histograms)
+
+    def update(self, labels, completion):
+        """
+        Add a batch: ``completion`` is (iterations, nodes) with the completion
+        year per iteration and node in ``labels``, negative where the node
+        never completes. Iterations are taken in row order.
+        """
+        completion = np.asarray(completion)
+        for k, label in enumerate(labels):
+            values = completion[:, k]
+            values = values[values >= 0]
+            if not len(values):
+                continue
+            years, first, counts = np.unique(values, return_index=True, return_counts=True)
+            order = np.argsort(first, kind='stable')
+            histogram = self.histograms.setdefault(label, {})
+            for year, count in zip(years[order].tolist(), counts[order].tolist()):
+                histogram[year] = histogram.get(year, 0) + count
+            values = values.astype(object)  # exact Python ints
+            self._combine_moments(label, len(values), int(values.sum()), int((values * values).sum()))
+        return self
+
+    def update_runs(self, runs):
+        """Add the iterations of a ``RunColumns``."""
+        return self.update(list(runs.nodes.categories), runs.completion_years())
+
+    def _combine_moments(self, label, count, total, squares):
+        current = self.moments.setdefault(label, [0, 0, 0])
+        current[0] += count
+        current[1] += total
+        current[2] += squares
+
+    def merge(self, other):
+        """Fold ``other`` (later iterations) into this aggregator and return it."""
+        for label, histogram in other.histograms.items():
+            target = self.histograms.setdefault(label, {})
+            for year, count in histogram.items():
+                target[year] = target.get(year, 0) + count
+        for label, (count, total, squares) in other.moments.items():
+            self._combine_moments(label, count, total, squares)
+        return self
+
+    def counts(self):
+        """label -> number of completed iterations."""
+        return {label: int(moments[0]) for label, moments in self.moments.items()}
+
+    def distributions(self):
+        """label -> {"year": count}, labels sorted, as in ``distributions_*.json``."""
+        return {
+            label: {str(int(year)): count for year, count in self.histograms[label].items()}
+            for label in sorted(self.histograms)
+        }
+
+    def node_stats(self):
+        """
+        Completion-year stats per node (Node, mean, median, min, max, std, span,
+        q05, q25, q75, q95), sorted by node label like the groupby in
+        ``calculate_stats_for_all_nodes``.
+        """
+        rows = []
+        for label in sorted(self.histograms):
+            histogram = self.histograms[label]
+            years = np.array(sorted(histogram), dtype=np.int64)
+            cumulative = np.cumsum([histogram[y] for y in years.tolist()])
+            count, total, squares = self.moments[label]
+            n = int(cumulative[-1])
+            lo, hi = int(years[0]), int(years[-1])
+            if n % 2:
+                median = float(_order_statistic(years, cumulative, n // 2))
+            else:
+                median = (float(_order_statistic(years, cumulative, n // 2 - 1))
+                          + float(_order_statistic(years, cumulative, n // 2))) / 2
+            # Exact sample variance, rounded once
+            variance = Fraction(count * squares - total * total, count * (count - 1)) if count > 1 else 0
+            row = {
+                'Node': label, 'mean': total / count, 'median': median, 'min': lo, 'max': hi,
+                'std': math.sqrt(float(variance)), 'span': hi - lo,
+            }
+            for name, q in STAT_QUANTILES:
+                row[name] = _linear_quantile(years, cumulative, q)
+            rows.append(row)
+        columns = ['Node', 'mean', 'median', 'min', 'max', 'std', 'span'] + [n for n, _ in STAT_QUANTILES]
+        stats = pd.DataFrame(rows, columns=columns)
+        return stats.astype({'min': np.int64, 'max': np.int64, 'span': np.int64})
+
+    def quantile_ci_widths(self, quantiles, z):
+        """
+        label -> {q: width in years} of the distribution-free confidence
+        interval for each quantile ``q``: the order statistics at ranks
+        ``n*q -/+ z*sqrt(n*q*(1-q))``. ``inf`` while too few iterations have
+        completed for the interval to lie within the sample.
+        """
+        widths = {}
+        for label, histogram in self.histograms.items():
+            years = np.array(sorted(histogram), dtype=np.int64)
+            cumulative = np.cumsum([histogram[y] for y in years.tolist()])
+            n = int(cumulative[-1])
+            node = {}
+            for q in quantiles:
+                half = z * math.sqrt(n * q * (1 - q))
+                lo, hi = math.floor(n * q - half), math.ceil(n * q + half)  # 1-based ranks
+                if lo < 1 or hi > n:
+                    node[q] = math.inf
+                else:
+                    node[q] = float(_order_statistic(years, cumulative, hi - 1)
+                                    - _order_statistic(years, cumulative, lo - 1))
+            widths[label] = node
+        return widths
+
+    def to_dict(self):
+        """JSON-serialisable form (histogram years as strings)."""
+        return {
+            'histograms': {label: {str(y): c for y, c in h.items()} for label, h in self.histograms.items()},
+            'moments': {label: list(m) for label, m in self.moments.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls()
+        aggregator.histograms = {
+            label: {int(y): int(c) for y, c in h.items()} for label, h in data['histograms'].items()
+        }
+        aggregator.moments = {label: [int(v) for v in m] for label, m in data['moments'].items()}
+        return aggregator
@@ -0,0 +1,194 @@
+"""
+completion_analytics.py
+-----------------------
+Vectorised completion-year statistics and rank correlations for the MCS
+runner's post-processing.
+
+``completion_stats`` computes the per-node stats of
+``calculate_stats_for_all_nodes`` from the (iterations, nodes) completion-year
+matrix: one ``np.sort`` over all nodes gives every order statistic, from which
+the median and all quantiles are read with the same linear interpolation as
+pandas. Means and standard deviations come from exact integer sums, so the
+values equal the former ``groupby().agg`` with per-group lambdas.
+
+``rank_correlations`` computes Spearman's rho and its two-sided p-value for
+every node at once: the observations are ranked within each node (average
+ranks for ties; the completion years only once for all columns) and the
+Pearson correlation of the ranks is reduced per node with ``np.bincount``,
+matching ``scipy.stats.spearmanr`` node by node (including NaN for constant
+or incomplete inputs) up to rounding far below the precision of the JSON
+outputs.
+"""
+
+import math
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from completion_aggregates import STAT_QUANTILES
+
+STAT_COLUMNS = ['Node', 'mean', 'median', 'min', 'max', 'std', 'span'] + [name for name, _ in STAT_QUANTILES]
+
+
+def _linear_quantiles(ordered, n, q):
+    """``Series.quantile(q)`` per column of ``ordered`` (sorted, first ``n`` rows valid)."""
+    cols = np.arange(ordered.shape[1])
+    q = (q * 100.0) / 100.0  # pandas hands NumPy a percentile
+    index = (n - 1) * q
+    lo = np.floor(index).astype(np.int64)
+    a = ordered[lo, cols].astype(float)
+    b = ordered[np.minimum(lo + 1, n - 1), cols].astype(float)
+    t = index - lo
+    return np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+
+
+def completion_stats(labels, completion):
+    """
+    Stats per node (Node, mean, median, min, max, std, span, q05, q25, q75,
+    q95) for the nodes that complete at least once, sorted by label.
+    ``completion`` is (iterations, nodes) with -1 where a node never completes.
+    """
+    completion = np.asarray(completion, dtype=np.int64)
+    labels = np.asarray(labels, dtype=object)
+    completed = completion >= 0
+    counts = completed.sum(axis=0)
+    keep = np.flatnonzero(counts)
+    keep = keep[np.argsort(labels[keep], kind='stable')]
+    values = completion[:, keep]
+    done = completed[:, keep]
+    n = counts[keep]
+    cols = np.arange(len(keep))
+
+    # Never-completed iterations sort to the end of each column
+    ordered = np.sort(np.where(done, values, np.iinfo(np.int64).max), axis=0)
+    lo = ordered[0]
+    hi = ordered[n - 1, cols]
+    upper_mid = ordered[n // 2, cols].astype(float)
+    lower_mid = ordered[np.maximum(n // 2 - 1, 0), cols].astype(float)
+    median = np.where(n % 2 == 1, upper_mid, (lower_mid + upper_mid) / 2)
+
+    zeroed = np.where(done, values, 0)
+    totals = zeroed.sum(axis=0)
+    squares = (zeroed * zeroed).sum(axis=0)
+    std = []
+    for count, total, square in zip(n.tolist(), totals.tolist(), squares.tolist()):
+        # Exact sample variance, rounded once
+        variance = Fraction(count * square - total * total, count * (count - 1)) if count > 1 else 0
+        std.append(math.sqrt(float(variance)))
+
+    stats = pd.DataFrame({
+        'Node': labels[keep],
+        'mean': totals / n,
+        'median': median,
+        'min': lo,
+        'max': hi,
+        'std': np.array(std, dtype=float),
+        'span': hi - lo,
+        **{name: _linear_quantiles(ordered, n, q) for name, q in STAT_QUANTILES},
+    }, columns=STAT_COLUMNS)
+    return stats.astype({'min': np.int64, 'max': np.int64, 'span': np.int64})
+
+
+def _group_ranks(groups, values, starts, counts):
+    """Average ranks (1-based, ties averaged) of ``values`` within each contiguous group."""
+    # Sorting each group's slice is much cheaper than a lexsort over all rows
+    order = np.concatenate([
+        start + np.argsort(values[start:start + count], kind='stable')
+        for start, count in zip(starts.tolist(), counts.tolist())
+    ] or [np.empty(0, dtype=np.int64)])
+    v = values[order]
+    g = groups[order]
+    position = np.arange(len(v)) - starts[g]
+    new_run = np.ones(len(v), dtype=bool)
+    new_run[1:] = (v[1:] != v[:-1]) | (g[1:] != g[:-1])
+    run = np.cumsum(new_run) - 1
+    run_first = position[new_run]
+    run_last = run_first + np.diff(np.append(np.flatnonzero(new_run), len(v))) - 1
+    ranks = np.empty(len(v))
+    ranks[order] = (run_first[run] + run_last[run]) / 2.0 + 1.0
+    return ranks
+
+
+def rank_correlations(groups, xs, y, n_groups):
+    """
+    Spearman (rho, two-sided p) of each row of ``xs`` against ``y`` within each
+    group; both results are (len(xs), n_groups) arrays.
+
+    ``groups`` holds the group code (0..n_groups-1) of every observation, with
+    each group's observations contiguous. Groups with NaNs, a constant input or
+    fewer than two observations get NaN.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    xs = np.atleast_2d(np.asarray(xs, dtype=float))
+    y = np.asarray(y, dtype=float)
+    n = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    safe_n = np.maximum(n, 1)
+
+    def per_group(weights):
+        return np.bincount(groups, weights=weights, minlength=n_groups)
+
+    def constant(values):
+        if not len(values):
+            return np.ones(n_groups, dtype=bool)
+        first = values[np.minimum(starts, len(values) - 1)[groups]]
+        return per_group(values != first) == 0
+
+    def centred_ranks(values):
+        ranks = _group_ranks(groups, np.nan_to_num(values), starts, n)
+        return ranks - (per_group(ranks) / safe_n)[groups]
+
+    y_invalid = (per_group(np.isnan(y)) > 0) | constant(y)
+    dy = centred_ranks(y)
+    # Same steps as np.corrcoef: covariances, then divide by each stddev
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = 1.0 / (safe_n - 1)  # inf for single-observation groups, which are NaN anyway
+        cyy = per_group(dy * dy) * factor
+    dof = n - 2
+    rhos, ps = [], []
+    for x in xs:
+        valid = (n > 1) & ~y_invalid & ~(per_group(np.isnan(x)) > 0) & ~constant(x)
+        dx = centred_ranks(x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cxx = per_group(dx * dx) * factor
+            cxy = per_group(dx * dy) * factor
+            rho = np.clip(cxy / np.sqrt(cxx) / np.sqrt(cyy), -1, 1)
+            t = rho * np.sqrt((dof / ((rho + 1.0) * (1.0 - rho))).clip(0))
+            p = 2 * special.stdtr(dof, -np.abs(t))
+        rhos.append(np.where(valid, rho, np.nan))
+        ps.append(np.where(valid, p, np.nan))
+    return np.array(rhos).reshape(len(xs), n_groups), np.array(ps).reshape(len(xs), n_groups)
+
+
+def node_sensitivity(data_completed_years, nodes, columns, min_obs=3):
+    """
+    Spearman correlation of each column in ``columns`` with the completion
+    Year, per node in ``nodes`` with at least ``min_obs`` completions.
+    ``data_completed_years`` holds one row per (node, iteration).
+    """
+    codes = pd.Categorical(data_completed_years['Node'], categories=list(nodes)).codes
+    present = codes >= 0
+    order = np.argsort(codes[present], kind='stable')
+    groups = codes[present][order]
+    n_obs = np.bincount(groups, minlength=len(nodes))
+    year = data_completed_years['Year'].to_numpy(dtype=float)[present][order]
+
+    available = [col for col in columns if col in data_completed_years.columns]
+    values = [data_completed_years[col].to_numpy(dtype=float)[present][order] for col in available]
+    rho, p = rank_correlations(groups, np.reshape(values, (len(available), len(year))), year, len(nodes))
+
+    frame = pd.DataFrame({'Node': list(nodes), 'n_obs': n_obs})
+    for col in columns:
+        if col in available:
+            k = available.index(col)
+            frame[f"{col}_rho"] = rho[k]
+            frame[f"{col}_p"] = p[k]
+        else:
+            frame[f"{col}_rho"] = None
+            frame[f"{col}_p"] = None
+    frame = frame[frame['n_obs'] >= min_obs].reset_index(drop=True)
+    if frame.empty:
+        return pd.DataFrame()
+    return frame
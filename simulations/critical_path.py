@@ -0,0 +1,130 @@
+"""
+critical_path.py
+----------------
+Iterative critical-path solver over a ``CompiledTree``.
+
+The (time, probability) to reach every node is computed in one pass over the
+topological order: a node's time is its own remaining time plus the slowest
+prerequisite path, its probability its own probability times that of every
+prerequisite path. Inputs may be (nodes,) or (nodes, iterations) arrays.
+
+Results are cached per ``SimState`` version, so every consumer within one
+simulation year (baseline pathways, acceleration overlays, ...) reuses the same
+solve. Dependency cycles raise ``CycleError`` instead of being cut silently.
+"""
+
+import numpy as np
+
+
+class CycleError(ValueError):
+    """Raised when critical paths are requested for a tree with a dependency cycle."""
+
+    def __init__(self, cycle_ids):
+        self.cycle_ids = list(cycle_ids)
+        super().__init__("tech tree has a dependency cycle: " + " -> ".join(self.cycle_ids))
+
+
+def find_cycle(tree):
+    """One dependency cycle as a list of node ids (first id repeated at the end), or []."""
+    remaining = set(tree.cyclic_nodes.tolist())
+    if not remaining:
+        return []
+    # Every node left over by Kahn's algorithm has a prerequisite that is also
+    # left over, so walking prerequisites inside that set must revisit a node.
+    path, seen = [], {}
+    node = min(remaining)
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = next(p for p in tree.pred_lists[node] if p in remaining)
+    cycle = path[seen[node]:][::-1]
+    return [tree.ids[i] for i in cycle + cycle[:1]]
+
+
+class CriticalPathSolver:
+    """Topological-order critical-path DP with a per-state-version cache."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.cycle = find_cycle(tree)
+        self.hits = 0
+        self.misses = 0
+        self.overlays = 0
+        self._cached = None
+
+    def check_acyclic(self):
+        if self.cycle:
+            raise CycleError(self.cycle)
+
+    def solve(self, state):
+        """(times, probs) for every node of ``state``; reused while ``state.version`` is unchanged."""
+        cached = self._cached
+        if cached is not None and cached[0] is state and cached[1] == state.version:
+            self.hits += 1
+            return cached[2]
+        self.misses += 1
+        result = self.solve_arrays(state.time_remaining, state.prob_of_success)
+        self._cached = (state, state.version, result)
+        return result
+
+    def solve_arrays(self, time_remaining, prob_of_success):
+        """Uncached solve for raw (nodes, ...) time/probability arrays."""
+        self.check_acyclic()
+        times = np.empty_like(time_remaining)
+        probs = np.empty_like(prob_of_success)
+        pred_lists = self.tree.pred_lists
+        for j in self.tree.topo_order.tolist():
+            preds = pred_lists[j]
+            if not preds:
+                times[j] = time_remaining[j]
+                probs[j] = prob_of_success[j]
+                continue
+            max_time = times[preds[0]]
+            combined = probs[preds[0]]
+            for p in preds[1:]:
+                max_time = np.maximum(max_time, times[p])
+                combined = combined * probs[p]
+            times[j] = time_remaining[j] + max_time
+            probs[j] = prob_of_success[j] * combined
+        return times, probs
+
+    def overlay(self, reach, state, node, rows, time_delta, prob_delta):
+        """
+        Critical paths after perturbing one node, without copying any state.
+
+        ``node``'s remaining time is shifted by ``time_delta`` and its
+        probability by ``prob_delta`` (scalars or arrays over ``rows``). Only
+        the node's impact cone (see ``ReachabilityIndex.impact_cone``) is
+        recomputed; every prerequisite outside the cone is read from the cached
+        solve of ``state``. Returns (times, probs) dicts of cone node -> values
+        over ``rows``.
+        """
+        self.overlays += 1
+        base_times, base_probs = self.solve(state)
+        times, probs = {}, {}
+        pred_lists = self.tree.pred_lists
+        for j in reach.impact_cone(node):
+            own_time = state.time_remaining[j, rows]
+            own_prob = state.prob_of_success[j, rows]
+            if j == node:
+                own_time = own_time + time_delta
+                own_prob = own_prob + prob_delta
+            preds = pred_lists[j]
+            if not preds:
+                times[j] = own_time
+                probs[j] = own_prob
+                continue
+            max_time = combined = None
+            for p in preds:
+                if p in times:
+                    pred_time, pred_prob = times[p], probs[p]
+                else:
+                    pred_time, pred_prob = base_times[p, rows], base_probs[p, rows]
+                if max_time is None:
+                    max_time, combined = pred_time, pred_prob
+                else:
+                    max_time = np.maximum(max_time, pred_time)
+                    combined = combined * pred_prob
+            times[j] = own_time + max_time
+            probs[j] = own_prob * combined
+        return times, probs
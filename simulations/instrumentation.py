@@ -0,0 +1,173 @@
+"""
+instrumentation.py
+------------------
+Phase timings, counters and profiling for simulation runs.
+
+``INSTRUMENTS`` is a process-wide recorder. While it is disabled (the
+default), ``phase`` returns a shared no-op context manager and ``add_time``
+and ``count`` return immediately, so library callers pay nothing; the MCS
+runner enables it and writes ``report`` into ``metadata.json``.
+
+Phases (wall seconds, summed over calls):
+
+* ``load``     - reading the tree JSON and compiling the scheduler
+* ``run``      - the whole simulation step of the runner (includes the
+  three engine phases below, and worker time when ``--workers`` is used)
+* ``sample``   - drawing the per-iteration inputs
+* ``simulate`` - the status sweep (batch engine) or event-driven schedule
+* ``impact``   - the counterfactual acceleration impacts (critical paths)
+* ``stats``    - stats, risk assessment and sensitivity
+* ``write``    - writing the output files
+* ``sobol``    - the Sobol sensitivity (``--sobol``)
+
+Counters come from the recorder itself (iterations per engine) and from the
+scheduler's caches: critical-path solves and cache hits, cone overlays and
+reachability cache hits/misses. Phases run inside ``--workers`` processes
+are only visible through ``run``.
+
+``Profiler`` wraps a run in cProfile (``.prof`` for pstats/snakeviz) or a
+sampling profiler that writes collapsed stacks (``.collapsed``, one
+``frame;frame;... count`` line per stack, for flamegraph.pl/speedscope).
+"""
+
+import cProfile
+import contextlib
+import os
+import signal
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children (MiB), or None."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return {"self": own / 2**20, "children": children / 2**20}
+
+
+class Instrumentation:
+    """Accumulates phase wall times and event counters while ``enabled``."""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def phase(self, name):
+        """Context manager adding its wall time to phase ``name``."""
+        return self._timed(name) if self.enabled else _NO_PHASE
+
+    def add_time(self, name, seconds):
+        if self.enabled:
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def report(self, scheduler=None):
+        """JSON-serialisable phases, counters (incl. ``scheduler``'s caches) and peak RSS."""
+        counters = dict(self.counters)
+        if scheduler is not None:
+            solver, reach = scheduler.critical_paths, scheduler.reachability
+            counters.update(
+                critical_path_solves=solver.misses,
+                critical_path_cache_hits=solver.hits,
+                critical_path_overlays=solver.overlays,
+                reachability_cache_hits=reach.cache_hits,
+                reachability_cache_misses=reach.cache_misses,
+            )
+        return {
+            "phases": {name: {"seconds": round(s, 6), "calls": self.calls[name]}
+                       for name, s in self.seconds.items()},
+            "counters": counters,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+INSTRUMENTS = Instrumentation()
+
+
+def merge_reports(reports):
+    """One report from several ``Instrumentation.report`` results (e.g. of parallel jobs)."""
+    phases, counters, rss = {}, defaultdict(int), {}
+    for report in reports:
+        for name, phase in report["phases"].items():
+            merged = phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+            merged["seconds"] = round(merged["seconds"] + phase["seconds"], 6)
+            merged["calls"] += phase["calls"]
+        for name, value in report["counters"].items():
+            counters[name] += value
+        for name, value in (report["peak_rss_mb"] or {}).items():
+            rss[name] = max(rss.get(name, 0.0), value)
+    return {"phases": phases, "counters": dict(counters), "peak_rss_mb": rss or None}
+
+
+class Profiler:
+    """
+    Context manager profiling the enclosed block into ``path``: cProfile
+    stats (``mode='cprofile'``) or collapsed stacks sampled every
+    ``interval`` seconds of CPU time (``mode='collapsed'``, needs SIGPROF).
+    """
+
+    def __init__(self, path, mode="cprofile", interval=0.005):
+        if mode == "collapsed" and not hasattr(signal, "setitimer"):
+            raise ValueError("collapsed-stack profiling needs signal.setitimer (not available on Windows)")
+        self.path = path
+        self.mode = mode
+        self.interval = interval
+        self.stacks = defaultdict(int)
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._previous = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == "cprofile":
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous)
+            with open(self.path, "w") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        return False
@@ -13,6 +13,7 @@ Results are written as JSON files to <output_dir>/<tree_name>/ for downstream da
 """
 
 import argparse
+import contextlib
 import json
 import os
 import sys
@@ -23,14 +24,15 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from scipy.stats import qmc, triang, spearmanr, pearsonr
-from tqdm import tqdm
+
+# option -> output file suffix
+OPTIONS = {'option_1': "option1", 'option_2': "option2", 'option_3': "option3"}
 
 # ---------------------------------------------------------------------------
 # CLI argument parsing
 # ---------------------------------------------------------------------------
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Run MCS for a tech tree JSON file.")
     parser.add_argument("tech_tree_path", help="Path to the tech tree JSON file.")
     parser.add_argument(
@@ -45,128 +47,179 @@ def parse_args():
         "--simulation-module-path", default=".",
         help="Path to the directory containing simulation.py (NuclearScheduler)."
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--concept-types", default=None,
+        help="Comma-separated node types treated as deployable concepts "
+             "(default: the scheduler's CONCEPT_TYPES)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Distribute iterations over N processes using per-iteration seed streams "
+             "(results do not depend on N). Default: single process, legacy streams."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=24,
+        help="Root seed for the per-iteration streams used with --workers (default: 24)."
+    )
+    parser.add_argument(
+        "--options", default=",".join(OPTIONS),
+        help="Comma-separated options to run, evaluated together in one pass "
+             "(default: option_1,option_2,option_3). sensitivity.json needs option_3."
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Feed completion years batch by batch into mergeable aggregates (memory independent "
+             "of --simulations). Writes stats, risk assessment and distributions; skips "
+             "simulation_runs and sensitivity, which need every iteration."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000,
+        help="Iterations per batch with --stream, largest batch in adaptive mode (default: 1000)."
+    )
+    parser.add_argument(
+        "--precision", type=float, default=None,
+        help="Adaptive mode: run in growing batches until the 95%% confidence interval of every "
+             "node's q05/median/q95 completion year is at most this many years wide. Writes the "
+             "same outputs as --stream; --simulations is ignored."
+    )
+    parser.add_argument(
+        "--time-budget", type=float, default=None,
+        help="Adaptive mode: stop before the next batch would exceed this many seconds "
+             "(with or without --precision)."
+    )
+    parser.add_argument(
+        "--max-simulations", type=int, default=100_000,
+        help="Adaptive mode: upper bound on iterations per option (default: 100000)."
+    )
+    parser.add_argument(
+        "--sobol", type=int, default=None, metavar="N",
+        help="Also write sobol_sensitivity.json: Sobol indices of each concept's ready time for "
+             "every per-node delay (option_3, or option_2 if option_3 is not run), from a Saltelli "
+             "design with N base samples (rounded up to a power of two), i.e. N*(d+2) runs."
+    )
+    parser.add_argument(
+        "--runs-format", choices=("store", "json", "both"), default="store",
+        help="Per-iteration completion records: memory-mappable run store directories "
+             "runs_option*/ (see run_store.py), simulation_runs_option*.json, or both "
+             "(default: store)."
+    )
+    parser.add_argument(
+        "--tree-cache-dir", default=None,
+        help="Directory for compiled trees, keyed by content hash (default: $MCS_TREE_CACHE_DIR, "
+             "else ~/.cache/investment-tech-tree/compiled)."
+    )
+    parser.add_argument(
+        "--no-tree-cache", action="store_true",
+        help="Always compile the tree instead of using the compiled-tree cache."
+    )
+    parser.add_argument(
+        "--strict", action="store_true",
+        help="Reject trees with validation warnings (dangling edge endpoints, duplicate labels or edges)."
+    )
+    parser.add_argument(
+        "--profile", choices=("cprofile", "collapsed"), default=None,
+        help="Profile the run into <output-dir>/<tree_name>/profile.prof (cProfile, for pstats/"
+             "snakeviz) or profile.collapsed (sampled collapsed stacks, for flame graphs)."
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Run even if outputs for the same tree, parameters and code already exist."
+    )
+    parser.add_argument(
+        "--cache-dir", default=os.environ.get("MCS_CACHE_DIR"),
+        help="Content-addressed output cache shared across runs (default: $MCS_CACHE_DIR; "
+             "without it only outputs already in --output-dir are reused)."
+    )
+    parser.add_argument(
+        "--cache-max-age-days", type=float, default=None,
+        help="Prune cache entries not used for this many days."
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=float, default=None,
+        help="Prune least-recently-used cache entries until the cache fits this size."
+    )
+    args = parser.parse_args(argv)
+    args.adaptive = args.precision is not None or args.time_budget is not None
+    args.options = [o.strip() for o in args.options.split(",") if o.strip()]
+    unknown = [o for o in args.options if o not in OPTIONS]
+    if unknown or not args.options:
+        parser.error(f"--options must be a subset of {', '.join(OPTIONS)} (got {unknown or 'none'})")
+    if args.sobol is not None and not {'option_2', 'option_3'} & set(args.options):
+        parser.error("--sobol needs option_2 or option_3 (per-node delays) in --options")
+    return args
 
 # ---------------------------------------------------------------------------
-# Monte Carlo simulation helpers  (unchanged logic, extracted from notebook)
+# Monte Carlo simulation helpers
 # ---------------------------------------------------------------------------
 
-def monte_carlo_simulation(scheduler, option, NUM_SIMULATIONS):
-    np.random.seed(24)
-    result_impact_data_list = []
-    result_status_data_list = []
-    result_random_number_data_list = []
-    x1_samples = None
-
-    if option == 'option_1':
-        np.random.seed(24)
-        random_number_list = np.random.triangular(left=1.5, mode=2.5, right=3.5, size=NUM_SIMULATIONS).tolist()
-        for random_number in tqdm(random_number_list, desc="Option 1"):
-            impact_data, status_data, random_number_data, lhc_seed = scheduler.run_simulation(
-                years_to_simulate=30, option=option, random_number=random_number
-            )
-            result_impact_data_list.append(impact_data)
-            result_status_data_list.append(status_data)
-            result_random_number_data_list.append(random_number_data)
-
-    elif option == 'option_2':
-        np.random.seed(24)
-        for _ in tqdm(range(NUM_SIMULATIONS), desc="Option 2"):
-            impact_data, status_data, random_number_data, lhc_seed = scheduler.run_simulation(
-                years_to_simulate=30, option=option
-            )
-            result_impact_data_list.append(impact_data)
-            result_status_data_list.append(status_data)
-            result_random_number_data_list.append(random_number_data)
-
-    elif option == 'option_3':
-        min1, mode1, max1 = 1.5, 2.5, 3.5
-        c1 = (mode1 - min1) / (max1 - min1)
-        sampler1 = qmc.LatinHypercube(d=1, seed=42)
-        random_number_list = sampler1.random(n=NUM_SIMULATIONS)
-        x1_samples = triang.ppf(random_number_list, c=c1, loc=min1, scale=(max1 - min1)).tolist()
-        lhc_seed = 1
-        for [item1] in tqdm(x1_samples, desc="Option 3"):
-            impact_data, status_data, random_number_data, lhc_seed = scheduler.run_simulation(
-                years_to_simulate=30, option='option_3', random_number=item1, lhc_seed=lhc_seed
-            )
-            lhc_seed += 1
-            result_impact_data_list.append(impact_data)
-            result_status_data_list.append(status_data)
-            result_random_number_data_list.append(random_number_data)
-
-    return result_impact_data_list, result_status_data_list, result_random_number_data_list, x1_samples
-
-
-def simulation_results_to_dataframe(result_impact_data_list, result_status_data_list,
-                                    result_random_number_data_list, x1_samples):
-    records_impact = [
-        {'Iteration': i + 1, 'Node': node, 'Year': year, 'Value': value}
-        for i, iteration in enumerate(result_impact_data_list)
-        for node, years in iteration.items()
-        for year, value in years.items()
-    ]
-    records_status = [
-        {'Iteration': i + 1, 'Node': node, 'Year': year, 'Status': status}
-        for i, iteration in enumerate(result_status_data_list)
-        for node, years in iteration.items()
-        for year, status in years.items()
-    ]
-    records_rng = [
-        {'Iteration': i + 1, 'Node': node, 'Year': year, 'RandomNumber': rn}
-        for i, iteration in enumerate(result_random_number_data_list)
-        for node, years in iteration.items()
-        for year, rn in years.items()
-    ]
-    df = pd.merge(pd.DataFrame(records_status), pd.DataFrame(records_impact),
-                  on=["Iteration", "Node", "Year"], how="left")
-    df = pd.merge(df, pd.DataFrame(records_rng),
-                  on=["Iteration", "Node", "Year"], how="left")
-    if x1_samples:
-        rn_map = {i + 1: x1_samples[i][0] for i in range(len(x1_samples))}
-        df['YearsPerTRL'] = df['Iteration'].map(rn_map)
-    return df
-
-
-def main_run_mcs(scheduler, option, NUM_SIMULATIONS):
-    result_impact, result_status, result_rng, x1_samples = monte_carlo_simulation(
-        scheduler, option=option, NUM_SIMULATIONS=NUM_SIMULATIONS
-    )
-    df = simulation_results_to_dataframe(result_impact, result_status, result_rng, x1_samples)
-    if option == 'option_1':
-        df.rename(columns={"RandomNumber": "YearsPerTRL"}, inplace=True)
-    elif option in ('option_2', 'option_3'):
-        df.rename(columns={"RandomNumber": "RandomDelay"}, inplace=True)
-    return df
+def run_option_batches(scheduler, options, NUM_SIMULATIONS, workers=None, seed=24):
+    """
+    Draw the samples of every option in ``options`` up front and evaluate them
+    together in one stacked batch; returns option -> BatchResult.
+
+    Without ``workers`` the draws reproduce the former per-iteration loop;
+    with ``workers`` every iteration gets its own SeedSequence stream (see
+    parallel_mcs.py) and results are identical for any worker count.
+    """
+    if workers:
+        from parallel_mcs import run_parallel_options  # lives next to simulation.py
+        return run_parallel_options(scheduler, options, NUM_SIMULATIONS, workers=workers, seed=seed)
+    return scheduler.run_options(NUM_SIMULATIONS, options, years_to_simulate=30)
+
+
+def main_run_mcs(scheduler, option, NUM_SIMULATIONS, workers=None, seed=24, batch=None):
+    """
+    Results of ``option`` as ``RunColumns`` (status codes, impacts and random
+    numbers as (iteration, node, year) arrays), running the batch first
+    unless a precomputed ``batch`` (see ``run_option_batches``) is given.
+    """
+    from run_columns import RunColumns  # lives next to simulation.py
+    if batch is None:
+        batch = run_option_batches(scheduler, [option], NUM_SIMULATIONS, workers=workers, seed=seed)[option]
+    return RunColumns.from_batch(batch, option)
+
+def stream_option_aggregates(scheduler, options, NUM_SIMULATIONS, batch_size, workers=None, seed=24):
+    """
+    Run the campaign in batches of ``batch_size`` iterations and fold each
+    batch's completion years into a ``CompletionYearAggregator`` per option.
+    Uses the same streams as ``run_option_batches``; impacts are not needed,
+    so the event-driven engine computes the completion years directly.
+    """
+    if workers:
+        from parallel_mcs import aggregate_parallel_options  # lives next to simulation.py
+        return aggregate_parallel_options(scheduler, options, NUM_SIMULATIONS, workers=workers,
+                                          seed=seed, chunk_size=batch_size)
+    from batch_engine import iter_samples
+    from completion_aggregates import CompletionYearAggregator
+
+    aggregates = {option: CompletionYearAggregator() for option in options}
+    streams = [iter_samples(scheduler.tree, option, NUM_SIMULATIONS, batch_size) for option in options]
+    for chunk in zip(*streams):
+        for option, samples in zip(options, chunk):
+            schedule = scheduler.run_events(samples.n_iterations, option, samples=samples)
+            aggregates[option].update(*schedule.completion_table(30))
+    return aggregates
 
 # ---------------------------------------------------------------------------
 # Stats & risk helpers (unchanged logic)
 # ---------------------------------------------------------------------------
 
-def calculate_stats_for_all_nodes(df, random_number_column, scheduler, tech_tree):
-    data_completed = df[df['Status'] == 'Completed']
-    if random_number_column == 'CombinedUncertainty':
-        data_completed_years = (
-            data_completed
-            .groupby(['Node', 'Iteration'])[['Year', 'RandomDelay', 'YearsPerTRL']]
-            .first().reset_index()
-        )
-    else:
-        data_completed_years = (
-            data_completed
-            .groupby(['Node', 'Iteration'])[['Year', random_number_column]]
-            .first().reset_index()
-        )
-
-    stats = (data_completed_years
-             .groupby('Node')['Year']
-             .agg(mean='mean', median='median', min='min', max='max', std='std',
-                  span=lambda x: x.max() - x.min(),
-                  q05=lambda x: x.quantile(0.05), q25=lambda x: x.quantile(0.25),
-                  q75=lambda x: x.quantile(0.75), q95=lambda x: x.quantile(0.95))
-             .fillna({'std': 0})
-             .reset_index())
+def calculate_stats_for_all_nodes(runs, scheduler, tech_tree):
+    from completion_analytics import completion_stats  # lives next to simulation.py
+    # First completion year per (node, iteration), read straight from the status codes
+    data_completed_years = runs.completed_frame()
+
+    # One sorted pass over the completion-year matrix instead of per-group lambdas
+    stats = completion_stats(list(runs.nodes.categories), runs.completion_years())
+    return data_completed_years, add_structure_columns(stats, scheduler, tech_tree)
+
 
+def calculate_stats_from_aggregate(aggregate, scheduler, tech_tree):
+    """Same stats as ``calculate_stats_for_all_nodes``, from a CompletionYearAggregator."""
+    return add_structure_columns(aggregate.node_stats(), scheduler, tech_tree)
+
+
+def add_structure_columns(stats, scheduler, tech_tree):
     label_node_mapper = {node["label"]: node["id"] for node in tech_tree["graph"]["nodes"]}
     dep = scheduler.dependencies
     succ = scheduler.successors
@@ -174,7 +227,7 @@ def calculate_stats_for_all_nodes(df, random_number_column, scheduler, tech_tree
     stats['dep'] = stats['Node'].map(lambda lbl: dep.get(label_node_mapper.get(lbl, ''), []))
     stats['succ_count'] = stats['Node'].map(lambda lbl: len(succ.get(label_node_mapper.get(lbl, ''), [])))
     stats['succ'] = stats['Node'].map(lambda lbl: succ.get(label_node_mapper.get(lbl, ''), []))
-    return data_completed_years, stats
+    return stats
 
 
 def classify_5_levels(series):
@@ -201,23 +254,9 @@ def main_run_risk_assessment(stats):
 
 
 def node_sensitivity_analysis(data_completed_years, stats):
-    sensitivity_cols = ["YearsPerTRL", "RandomDelay"]
-    results = []
-    for node in stats["Node"]:
-        node_data = data_completed_years[data_completed_years["Node"] == node]
-        if len(node_data) < 3:
-            continue
-        row = {"Node": node, "n_obs": len(node_data)}
-        for col in sensitivity_cols:
-            if col not in node_data.columns:
-                row[f"{col}_rho"] = None
-                row[f"{col}_p"] = None
-                continue
-            rho, p_value = spearmanr(node_data[col], node_data["Year"])
-            row[f"{col}_rho"] = rho
-            row[f"{col}_p"] = p_value
-        results.append(row)
-    return pd.DataFrame(results)
+    from completion_analytics import node_sensitivity  # lives next to simulation.py
+    # Spearman rho/p per node for every node at once (nodes with at least 3 completions)
+    return node_sensitivity(data_completed_years, stats["Node"], ["YearsPerTRL", "RandomDelay"])
 
 # ---------------------------------------------------------------------------
 # JSON output helpers
@@ -236,6 +275,20 @@ def save_stats_json(stats, path):
         json.dump(_df_to_records(exportable), f, indent=2)
 
 
+def save_distributions_json(aggregate, raw_node_counts, path):
+    """
+    Histogram bins of completion years per node (``distributions_*.json``, read
+    by the frontend), checked against independently counted completions per
+    node with the integrity checks of process_simulation_data.py.
+    """
+    from process_simulation_data import verify_distributions  # lives next to this script
+    distributions = aggregate.distributions()
+    if not verify_distributions(distributions, raw_node_counts):
+        print(f"WARNING: integrity checks failed for {path.name}", file=sys.stderr)
+    with open(path, "w") as f:
+        json.dump(distributions, f, indent=2)
+
+
 def save_simulation_runs_json(data_completed_years, path):
     """Raw per-iteration completion years — used for histogram / distribution plots."""
     with open(path, "w") as f:
@@ -254,7 +307,15 @@ def save_sensitivity_json(node_sensitivity_df, path):
         json.dump(_df_to_records(node_sensitivity_df), f, indent=2)
 
 
-def save_metadata_json(tech_tree_path, NUM_SIMULATIONS, tree_name, path):
+def save_sobol_json(result, path):
+    """Sobol first-order/total-effect indices per concept (see sobol_sensitivity.py)."""
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def save_metadata_json(tech_tree_path, NUM_SIMULATIONS, tree_name, path, options=None,
+                       stream_batch_size=None, runs_format=None, cache=None, adaptive=None,
+                       instrumentation=None):
     """Run provenance — timestamp, source file, git commit, settings."""
     try:
         git_hash = subprocess.check_output(
@@ -274,10 +335,81 @@ def save_metadata_json(tech_tree_path, NUM_SIMULATIONS, tree_name, path):
         "run_timestamp_utc": datetime.now(timezone.utc).isoformat(),
         "num_simulations": NUM_SIMULATIONS,
         "simulation_option": "option_3",  # primary option used for dashboard outputs
+        "options_run": list(options or OPTIONS),
+        "stream_batch_size": stream_batch_size,
+        "runs_format": runs_format,
+        **({"adaptive": adaptive} if adaptive else {}),
+        **(cache or {}),
+        **({"instrumentation": instrumentation} if instrumentation else {}),
     }
     with open(path, "w") as f:
         json.dump(metadata, f, indent=2)
 
+# ---------------------------------------------------------------------------
+# Result cache
+# ---------------------------------------------------------------------------
+
+def expected_outputs(options, stream, runs_format, sobol=False):
+    """Names of the files (and run store directories) a run writes into the tree's output dir."""
+    names = ["sobol_sensitivity.json"] if sobol else []
+    for option in options:
+        suffix = OPTIONS[option]
+        names += [f"stats_{suffix}.json", f"risk_assessment_{suffix}.json", f"distributions_{suffix}.json"]
+        if not stream:
+            if runs_format in ("store", "both"):
+                names.append(f"runs_{suffix}")
+            if runs_format in ("json", "both"):
+                names.append(f"simulation_runs_{suffix}.json")
+    if not stream and 'option_3' in options:
+        names.append("sensitivity.json")
+    return names + ["metadata.json"]
+
+
+def run_cache_info(args, tree_sha256, concept_types):
+    """
+    (cache key, parameters, metadata cache fields, expected output names) of
+    a run with ``args`` on the tree with content hash ``tree_sha256``.
+    """
+    from result_cache import cache_key, code_version  # lives next to simulation.py
+    from simulation import CURRENT_YEAR  # lives next to simulation.py
+    params = {
+        "options": args.options,
+        "simulations": args.simulations,
+        "years": 30,
+        # Output years start at the current year, so a new year invalidates every output
+        "start_year": CURRENT_YEAR,
+        "concept_types": list(concept_types),
+        # --workers switches to per-iteration SeedSequence streams (worker count is irrelevant)
+        "streams": "seeded" if args.workers else "legacy",
+        "seed": args.seed if args.workers else None,
+        "stream": args.stream,
+        "runs_format": None if args.stream or args.adaptive else args.runs_format,
+    }
+    if args.sobol is not None:
+        params["sobol"] = {"n_base": args.sobol, "seed": args.seed}
+    if args.adaptive:
+        params.update(simulations=None, adaptive={
+            "precision": args.precision, "time_budget": args.time_budget,
+            "max_simulations": args.max_simulations, "batch_size": args.batch_size,
+        })
+    cache_info = {
+        "tree_sha256": tree_sha256,
+        "code_version": code_version(Path(args.simulation_module_path), Path(__file__).resolve().parent),
+    }
+    key = cache_key(cache_info["tree_sha256"], params, cache_info["code_version"])
+    outputs = expected_outputs(args.options, args.stream or args.adaptive, args.runs_format, args.sobol is not None)
+    return key, params, {"cache_key": key, **cache_info}, outputs
+
+
+def outputs_up_to_date(output_dir, key, names):
+    """True if ``output_dir`` already holds every output of the run recorded under ``key``."""
+    try:
+        with open(output_dir / "metadata.json") as f:
+            recorded = json.load(f).get("cache_key")
+    except (OSError, ValueError):
+        return False
+    return recorded == key and all((output_dir / name).exists() for name in names)
+
 # ---------------------------------------------------------------------------
 # Main entry point
 # ---------------------------------------------------------------------------
@@ -290,77 +422,176 @@ def main():
         print(f"ERROR: tech tree file not found: {tech_tree_path}", file=sys.stderr)
         sys.exit(1)
 
-    NUM_SIMULATIONS = args.simulations
-
     # Derive a clean output folder name from the filename (e.g. "nuclear" from "nuclear.json")
     tree_name = tech_tree_path.stem
     output_dir = Path(args.output_dir) / tree_name
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"[{tree_name}] Loading tech tree from {tech_tree_path}")
-    with open(tech_tree_path, "r") as f:
-        tech_tree = json.load(f)
-
     # Add simulation module to path and import scheduler
-    sys.path.append(str(Path(args.simulation_module_path).resolve()))
-    from simulation import NuclearScheduler  # noqa: E402
-
-    scheduler = NuclearScheduler(tech_tree)
-
-    # --- Run all three options (option_3 is primary; 1 & 2 kept for comparison outputs) ---
-    print(f"[{tree_name}] Running Option 1 ({NUM_SIMULATIONS} simulations)...")
-    np.random.seed(24)
-    df_o1 = main_run_mcs(scheduler, option='option_1', NUM_SIMULATIONS=NUM_SIMULATIONS)
-
-    print(f"[{tree_name}] Running Option 2 ({NUM_SIMULATIONS} simulations)...")
-    np.random.seed(24)
-    df_o2 = main_run_mcs(scheduler, option='option_2', NUM_SIMULATIONS=NUM_SIMULATIONS)
-
-    print(f"[{tree_name}] Running Option 3 ({NUM_SIMULATIONS} simulations, LHS)...")
-    np.random.seed(24)
-    df_o3 = main_run_mcs(scheduler, option='option_3', NUM_SIMULATIONS=NUM_SIMULATIONS)
-
-    # --- Compute stats for all three options ---
-    data_completed_o1, stats_o1 = calculate_stats_for_all_nodes(df_o1, "YearsPerTRL", scheduler, tech_tree)
-    data_completed_o2, stats_o2 = calculate_stats_for_all_nodes(df_o2, "RandomDelay", scheduler, tech_tree)
-    data_completed_o3, stats_o3 = calculate_stats_for_all_nodes(df_o3, "CombinedUncertainty", scheduler, tech_tree)
-
-    # --- Risk assessment ---
-    eval_o1 = main_run_risk_assessment(stats_o1)
-    eval_o2 = main_run_risk_assessment(stats_o2)
-    eval_o3 = main_run_risk_assessment(stats_o3)
-
-    # --- Sensitivity analysis (option 3 only — has both columns) ---
-    sensitivity_df = node_sensitivity_analysis(data_completed_o3, stats_o3)
-
-    # --- Save all outputs ---
-    print(f"[{tree_name}] Saving outputs to {output_dir}/")
+    module_path = str(Path(args.simulation_module_path).resolve())
+    if module_path not in sys.path:
+        sys.path.append(module_path)
+    from simulation import NuclearScheduler, CONCEPT_TYPES  # noqa: E402
+    from instrumentation import INSTRUMENTS, Profiler  # noqa: E402
+    from tree_loader import DEFAULT_CACHE_DIR, TreeValidationError, load_tree  # noqa: E402
 
-    # stats.json — one file per option
-    save_stats_json(stats_o1, output_dir / "stats_option1.json")
-    save_stats_json(stats_o2, output_dir / "stats_option2.json")
-    save_stats_json(stats_o3, output_dir / "stats_option3.json")
+    # Phase timings and counters for metadata.json
+    INSTRUMENTS.enabled = True
+    INSTRUMENTS.reset()
 
-    # simulation_runs.json — raw per-iteration completion years per option
-    save_simulation_runs_json(data_completed_o1, output_dir / "simulation_runs_option1.json")
-    save_simulation_runs_json(data_completed_o2, output_dir / "simulation_runs_option2.json")
-    save_simulation_runs_json(data_completed_o3, output_dir / "simulation_runs_option3.json")
+    concept_types = tuple(t.strip() for t in args.concept_types.split(",")) if args.concept_types else CONCEPT_TYPES
 
-    # risk_assessment.json — per option
-    save_risk_assessment_json(eval_o1, output_dir / "risk_assessment_option1.json")
-    save_risk_assessment_json(eval_o2, output_dir / "risk_assessment_option2.json")
-    save_risk_assessment_json(eval_o3, output_dir / "risk_assessment_option3.json")
-
-    # sensitivity.json — option 3 only
-    save_sensitivity_json(sensitivity_df, output_dir / "sensitivity.json")
-
-    # metadata.json
-    save_metadata_json(tech_tree_path, NUM_SIMULATIONS, tree_name, output_dir / "metadata.json")
+    # Parse, validate and compile (or reuse the compiled tree) before any simulation
+    print(f"[{tree_name}] Loading tech tree from {tech_tree_path}")
+    try:
+        with INSTRUMENTS.phase("load"):
+            tree_cache = None if args.no_tree_cache else args.tree_cache_dir or DEFAULT_CACHE_DIR
+            loaded = load_tree(tech_tree_path, concept_types, cache_dir=tree_cache, strict=args.strict)
+    except TreeValidationError as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        sys.exit(1)
+    for issue in loaded.warnings:
+        print(f"[{tree_name}] WARNING: {issue.message}", file=sys.stderr)
+    tech_tree = loaded.graph_data
+
+    # --- Skip the run when tree, parameters and simulation code are unchanged ---
+    from result_cache import ResultCache
+    key, params, cache_info, outputs = run_cache_info(args, loaded.digest, concept_types)
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    try:
+        if not args.force and outputs_up_to_date(output_dir, key, outputs):
+            print(f"[{tree_name}] Up to date (cache key {key[:12]}), nothing to do.")
+            return
+        if not args.force and cache is not None and cache.restore(key, output_dir):
+            print(f"[{tree_name}] Restored outputs from cache (key {key[:12]}).")
+            return
+        if args.profile:
+            profile_path = output_dir / ("profile.prof" if args.profile == "cprofile" else "profile.collapsed")
+            profiler = Profiler(profile_path, args.profile)
+        else:
+            profiler = contextlib.nullcontext()
+        with profiler:
+            with INSTRUMENTS.phase("load"):
+                scheduler = loaded.scheduler(NuclearScheduler)
+            run_and_save(args, tech_tree_path, tech_tree, tree_name, output_dir, scheduler, cache_info)
+        if args.profile:
+            print(f"[{tree_name}] Profile written to {profile_path}")
+        if cache is not None:
+            cache.store(key, output_dir, outputs, info={"tree_name": tree_name, "params": params})
+    finally:
+        if cache is not None and (args.cache_max_age_days is not None or args.cache_max_mb is not None):
+            max_bytes = None if args.cache_max_mb is None else int(args.cache_max_mb * 1024 * 1024)
+            removed = cache.prune(args.cache_max_age_days, max_bytes)
+            if removed:
+                print(f"[{tree_name}] Pruned {removed} cache entr{'y' if removed == 1 else 'ies'}.")
 
     print(f"[{tree_name}] Done. Output files:")
     for p in sorted(output_dir.iterdir()):
         print(f"  {p}")
 
 
+def save_aggregate_outputs(aggregates, scheduler, tech_tree, output_dir):
+    """Stats, risk assessment and distributions of every option from its CompletionYearAggregator."""
+    from instrumentation import INSTRUMENTS  # lives next to simulation.py
+    for option, aggregate in aggregates.items():
+        suffix = OPTIONS[option]
+        with INSTRUMENTS.phase("stats"):
+            stats = calculate_stats_from_aggregate(aggregate, scheduler, tech_tree)
+            evaluation = main_run_risk_assessment(stats)
+        with INSTRUMENTS.phase("write"):
+            save_stats_json(stats, output_dir / f"stats_{suffix}.json")
+            save_risk_assessment_json(evaluation, output_dir / f"risk_assessment_{suffix}.json")
+            save_distributions_json(aggregate, aggregate.counts(), output_dir / f"distributions_{suffix}.json")
+
+
+def save_option_outputs(option, batch, scheduler, tech_tree, output_dir, runs_format):
+    """Stats, runs, risk assessment, distributions (and for option_3 sensitivity) of one option's batch."""
+    from completion_aggregates import CompletionYearAggregator  # lives next to simulation.py
+    from instrumentation import INSTRUMENTS
+    suffix = OPTIONS[option]
+    with INSTRUMENTS.phase("stats"):
+        runs = main_run_mcs(scheduler, option, batch.n_iterations, batch=batch)
+        data_completed, stats = calculate_stats_for_all_nodes(runs, scheduler, tech_tree)
+        evaluation = main_run_risk_assessment(stats)
+        # distributions.json — binned straight from the in-memory results
+        distributions = CompletionYearAggregator().update_runs(runs)
+        # sensitivity.json — option 3 only (has both columns)
+        sensitivity_df = node_sensitivity_analysis(data_completed, stats) if option == 'option_3' else None
+
+    with INSTRUMENTS.phase("write"):
+        save_stats_json(stats, output_dir / f"stats_{suffix}.json")
+        # Raw per-iteration completion years — run store and/or simulation_runs.json
+        if runs_format in ("store", "both"):
+            from run_store import write_run_store
+            write_run_store(output_dir / f"runs_{suffix}", runs)
+        if runs_format in ("json", "both"):
+            save_simulation_runs_json(data_completed, output_dir / f"simulation_runs_{suffix}.json")
+        save_risk_assessment_json(evaluation, output_dir / f"risk_assessment_{suffix}.json")
+        save_distributions_json(distributions, data_completed['Node'].value_counts().to_dict(),
+                                output_dir / f"distributions_{suffix}.json")
+        if sensitivity_df is not None:
+            save_sensitivity_json(sensitivity_df, output_dir / "sensitivity.json")
+
+
+def run_and_save(args, tech_tree_path, tech_tree, tree_name, output_dir, scheduler, cache_info):
+    """Run the requested options and write every output file."""
+    from instrumentation import INSTRUMENTS  # lives next to simulation.py
+    NUM_SIMULATIONS = args.simulations
+    options = args.options
+    if args.adaptive:
+        from adaptive_mcs import CONFIDENCE, run_adaptive  # lives next to simulation.py
+        target = f"precision {args.precision} years" if args.precision is not None else "no precision target"
+        budget = f", time budget {args.time_budget:g}s" if args.time_budget is not None else ""
+        print(f"[{tree_name}] Adaptive run of {', '.join(options)} ({target}{budget}, "
+              f"at most {args.max_simulations} simulations each)...")
+        with INSTRUMENTS.phase("run"):
+            aggregates, reports = run_adaptive(
+                scheduler, options, precision=args.precision, time_budget=args.time_budget,
+                max_iterations=args.max_simulations, max_batch=args.batch_size,
+                workers=args.workers, seed=args.seed,
+            )
+        print(f"[{tree_name}] Saving outputs to {output_dir}/ (no simulation_runs/sensitivity in adaptive mode)")
+        save_aggregate_outputs(aggregates, scheduler, tech_tree, output_dir)
+        adaptive = {
+            "precision_target": args.precision,
+            "time_budget_s": args.time_budget,
+            "confidence": CONFIDENCE,
+            "options": reports,
+        }
+        metadata = dict(NUM_SIMULATIONS=max(r["iterations"] for r in reports.values()),
+                        stream_batch_size=args.batch_size, adaptive=adaptive)
+    elif args.stream:
+        print(f"[{tree_name}] Streaming {', '.join(options)} ({NUM_SIMULATIONS} simulations each, "
+              f"batches of {args.batch_size})...")
+        with INSTRUMENTS.phase("run"):
+            aggregates = stream_option_aggregates(scheduler, options, NUM_SIMULATIONS, args.batch_size,
+                                                  workers=args.workers, seed=args.seed)
+        print(f"[{tree_name}] Saving outputs to {output_dir}/ (no simulation_runs/sensitivity when streaming)")
+        save_aggregate_outputs(aggregates, scheduler, tech_tree, output_dir)
+        metadata = dict(NUM_SIMULATIONS=NUM_SIMULATIONS, stream_batch_size=args.batch_size)
+    else:
+        # --- Draw and evaluate all requested options in one pass (option_3 is primary) ---
+        print(f"[{tree_name}] Running {', '.join(options)} ({NUM_SIMULATIONS} simulations each)...")
+        with INSTRUMENTS.phase("run"):
+            batches = run_option_batches(scheduler, options, NUM_SIMULATIONS, workers=args.workers, seed=args.seed)
+
+        print(f"[{tree_name}] Saving outputs to {output_dir}/")
+        for option in options:
+            save_option_outputs(option, batches[option], scheduler, tech_tree, output_dir, args.runs_format)
+        metadata = dict(NUM_SIMULATIONS=NUM_SIMULATIONS, runs_format=args.runs_format)
+
+    if args.sobol is not None:
+        from sobol_sensitivity import run_sobol  # lives next to simulation.py
+        sobol_option = 'option_3' if 'option_3' in options else 'option_2'
+        print(f"[{tree_name}] Sobol sensitivity ({sobol_option}, {args.sobol} base samples)...")
+        with INSTRUMENTS.phase("sobol"):
+            sobol = run_sobol(scheduler, sobol_option, n_base=args.sobol, seed=args.seed)
+        with INSTRUMENTS.phase("write"):
+            save_sobol_json(sobol, output_dir / "sobol_sensitivity.json")
+
+    # metadata.json — written last so it carries the timings of every phase
+    save_metadata_json(tech_tree_path, tree_name=tree_name, path=output_dir / "metadata.json", options=options,
+                       cache=cache_info, instrumentation=INSTRUMENTS.report(scheduler), **metadata)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+orchestrate_outputs.py
+----------------------
+Generate deterministic and Monte Carlo outputs for many tech trees in one
+command, with every (tree, job) pair scheduled on a shared worker pool.
+
+Usage:
+    python simulations/orchestrate_outputs.py data/*.json \
+        [--jobs deterministic,option_1,option_2,option_3] [--workers 4] [--simulations 100]
+
+Jobs per tree:
+
+* ``deterministic``      - ``deterministic_analysis.json`` in
+  ``<deterministic-output-dir>/<tree>/`` (as save_baseline_simulation.py)
+* ``option_1..option_3`` - stats, risk assessment, runs, distributions (and
+  for option_3 sensitivity) in ``<mcs-output-dir>/<tree>/`` (as
+  mcs_techtree_runner.py); once every requested option of a tree succeeded,
+  its ``metadata.json`` is written with the same cache key as a runner call
+  with ``--options`` set to those options
+* ``distributions``      - re-bin ``distributions_*.json`` from the tree's run
+  stores / simulation_runs files (as process_simulation_data.py), after the
+  tree's option jobs
+
+Every tree is loaded, validated and compiled once in the parent process (see
+tree_loader.py) and handed to the workers, so no job re-parses a tree. Jobs
+are submitted longest first, each job is timed, and a failing job (or an
+invalid tree) only fails its own outputs: the others still run, and the exit
+code is 1 if anything failed. With enough workers the wall time is about that
+of the slowest job instead of the sum over trees.
+
+MCS option jobs whose tree, parameters and code match the recorded
+``metadata.json`` are skipped unless ``--force`` is given.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import mcs_techtree_runner as runner
+from compiled_tree import CONCEPT_TYPES
+from tree_loader import DEFAULT_CACHE_DIR, TreeValidationError, load_tree
+
+JOBS = ("deterministic", *runner.OPTIONS, "distributions")
+DEFAULT_JOBS = ("deterministic", *runner.OPTIONS)
+SIMULATION_DIR = Path(__file__).resolve().parent
+
+# Worker state, set once per process by _init_worker
+_TREES = {}
+_SETTINGS = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate deterministic and MCS outputs for many tech trees on a worker pool."
+    )
+    parser.add_argument("tech_tree_paths", nargs="+", help="Path(s) to tech tree JSON file(s).")
+    parser.add_argument(
+        "--jobs", default=",".join(DEFAULT_JOBS),
+        help=f"Comma-separated jobs per tree, from {', '.join(JOBS)} "
+             f"(default: {','.join(DEFAULT_JOBS)})."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Worker processes (default: CPU count; 1 runs every job in this process)."
+    )
+    parser.add_argument(
+        "--simulations", type=int, default=100,
+        help="Monte Carlo iterations per option (default: 100)."
+    )
+    parser.add_argument("--years", type=int, default=30, help="Years for the deterministic run (default: 30).")
+    parser.add_argument(
+        "--mcs-output-dir", default="./outputs",
+        help="Root of the MCS outputs, <mcs-output-dir>/<tree>/ (default: ./outputs)."
+    )
+    parser.add_argument(
+        "--deterministic-output-dir", default="./public/outputs",
+        help="Root of the deterministic outputs, <deterministic-output-dir>/<tree>/ (default: ./public/outputs)."
+    )
+    parser.add_argument(
+        "--runs-format", choices=("store", "json", "both"), default="store",
+        help="Per-iteration completion records of the option jobs (see mcs_techtree_runner.py)."
+    )
+    parser.add_argument(
+        "--concept-types", default=None,
+        help="Comma-separated node types treated as deployable concepts (default: the scheduler's CONCEPT_TYPES)."
+    )
+    parser.add_argument("--strict", action="store_true", help="Reject trees with validation warnings.")
+    parser.add_argument(
+        "--no-tree-cache", action="store_true",
+        help="Always compile trees instead of using the compiled-tree cache."
+    )
+    parser.add_argument("--force", action="store_true", help="Run option jobs even if their outputs are up to date.")
+    parser.add_argument("--report", default=None, help="Also write the per-job timings to this JSON file.")
+    args = parser.parse_args()
+    args.jobs = [j.strip() for j in args.jobs.split(",") if j.strip()]
+    unknown = [j for j in args.jobs if j not in JOBS]
+    if unknown or not args.jobs:
+        parser.error(f"--jobs must be a subset of {', '.join(JOBS)} (got {unknown or 'none'})")
+    return args
+
+# ---------------------------------------------------------------------------
+# Jobs (run in the workers)
+# ---------------------------------------------------------------------------
+
+def _init_worker(trees, settings):
+    _TREES.update(trees)
+    _SETTINGS.update(settings)
+
+
+def _deterministic_job(name, loaded):
+    from save_baseline_simulation import process_tree
+    process_tree(loaded.path, _SETTINGS["years"], Path(_SETTINGS["deterministic_output_dir"]), SIMULATION_DIR,
+                 loaded.tree.concept_types, loaded=loaded)
+
+
+def _option_job(name, loaded, option):
+    from instrumentation import INSTRUMENTS
+    from simulation import NuclearScheduler
+
+    INSTRUMENTS.enabled = True
+    INSTRUMENTS.reset()
+    output_dir = Path(_SETTINGS["mcs_output_dir"]) / name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with INSTRUMENTS.phase("load"):
+        scheduler = loaded.scheduler(NuclearScheduler)
+    print(f"[{name}] Running {option} ({_SETTINGS['simulations']} simulations)...")
+    with INSTRUMENTS.phase("run"):
+        batch = runner.run_option_batches(scheduler, [option], _SETTINGS["simulations"])[option]
+    runner.save_option_outputs(option, batch, scheduler, loaded.graph_data, output_dir, _SETTINGS["runs_format"])
+    return INSTRUMENTS.report(scheduler)
+
+
+def _distributions_job(name, loaded):
+    from process_simulation_data import find_jobs, run_job
+    found = find_jobs(Path(_SETTINGS["mcs_output_dir"]) / name)
+    if not found:
+        print(f"[{name}] No run stores or simulation_runs files to bin.")
+    for kind, input_path, output_path in found:
+        print("\n".join(run_job(kind, input_path, output_path)))
+
+
+def run_job(name, job):
+    """Run one (tree, job) pair; returns a result dict instead of raising."""
+    loaded = _TREES[name]
+    log = io.StringIO()
+    started = time.perf_counter()
+    result = {"tree": name, "job": job, "status": "ok", "report": None, "error": None}
+    try:
+        with contextlib.redirect_stdout(log):
+            if job == "deterministic":
+                _deterministic_job(name, loaded)
+            elif job == "distributions":
+                _distributions_job(name, loaded)
+            else:
+                result["report"] = _option_job(name, loaded, job)
+    except Exception:
+        result.update(status="failed", error=traceback.format_exc())
+    result.update(seconds=time.perf_counter() - started, log=log.getvalue())
+    return result
+
+# ---------------------------------------------------------------------------
+# Scheduling (parent process)
+# ---------------------------------------------------------------------------
+
+def estimated_cost(loaded, job, simulations):
+    """Rough relative job cost, used to start the longest jobs first."""
+    tracked = int(loaded.tree.is_tracked.sum())
+    if job in runner.OPTIONS:
+        return tracked * simulations
+    if job == "deterministic":
+        return tracked * 10  # one iteration, but every node's impact is evaluated every year
+    return tracked
+
+
+def plan_trees(args, concept_types):
+    """
+    Load every tree once; returns (name -> LoadedTree, name -> option jobs
+    to run, name -> runner cache info, results for trees that failed to load).
+    """
+    trees, option_jobs, cache_infos, failed = {}, {}, {}, []
+    tree_cache = None if args.no_tree_cache else DEFAULT_CACHE_DIR
+    requested = [j for j in args.jobs if j in runner.OPTIONS]
+    for raw_path in args.tech_tree_paths:
+        path = Path(raw_path)
+        name = path.stem
+        if name in trees:
+            print(f"WARNING: {path} has the same output name as another tree, skipping", file=sys.stderr)
+            failed.append({"tree": name, "job": "load", "status": "failed", "seconds": 0.0,
+                           "error": "duplicate tree name"})
+            continue
+        started = time.perf_counter()
+        try:
+            loaded = load_tree(path, concept_types, cache_dir=tree_cache, strict=args.strict)
+        except (OSError, TreeValidationError) as exc:
+            print(f"ERROR: {exc}", file=sys.stderr)
+            failed.append({"tree": name, "job": "load", "status": "failed",
+                           "seconds": time.perf_counter() - started, "error": str(exc)})
+            continue
+        for issue in loaded.warnings:
+            print(f"[{name}] WARNING: {issue.message}", file=sys.stderr)
+        trees[name] = loaded
+
+        option_jobs[name] = requested
+        if requested:
+            runner_args = runner.parse_args([
+                str(path), "--simulations", str(args.simulations), "--options", ",".join(requested),
+                "--output-dir", args.mcs_output_dir, "--simulation-module-path", str(SIMULATION_DIR),
+                "--runs-format", args.runs_format,
+            ])
+            key, _params, cache_info, outputs = runner.run_cache_info(runner_args, loaded.digest, concept_types)
+            cache_infos[name] = cache_info
+            if not args.force and runner.outputs_up_to_date(Path(args.mcs_output_dir) / name, key, outputs):
+                print(f"[{name}] MCS outputs up to date (cache key {key[:12]}), skipping {', '.join(requested)}.")
+                option_jobs[name] = []
+    return trees, option_jobs, cache_infos, failed
+
+
+def write_tree_metadata(args, loaded, name, options, cache_info, reports):
+    """metadata.json of a tree whose option jobs all succeeded, as the runner writes it."""
+    from instrumentation import merge_reports
+    runner.save_metadata_json(
+        loaded.path, args.simulations, name, Path(args.mcs_output_dir) / name / "metadata.json",
+        options=options, runs_format=args.runs_format, cache=cache_info,
+        instrumentation=merge_reports(reports),
+    )
+
+
+def orchestrate(args):
+    concept_types = tuple(t.strip() for t in args.concept_types.split(",")) if args.concept_types else CONCEPT_TYPES
+    trees, option_jobs, cache_infos, results = plan_trees(args, concept_types)
+
+    pending = []
+    for name in trees:
+        pending += [(name, job) for job in args.jobs
+                    if job in ("deterministic", "distributions") or job in option_jobs[name]]
+    pending.sort(key=lambda nj: -estimated_cost(trees[nj[0]], nj[1], args.simulations))
+    settings = {
+        "years": args.years, "simulations": args.simulations, "runs_format": args.runs_format,
+        "mcs_output_dir": args.mcs_output_dir, "deterministic_output_dir": args.deterministic_output_dir,
+    }
+    remaining_options = {name: set(option_jobs[name]) for name in trees}
+    option_reports = {name: [] for name in trees}
+    failed_trees = set()
+
+    def ready(name, job):
+        # distributions bins the runs written by the tree's option jobs
+        return job != "distributions" or not remaining_options[name]
+
+    def finish(result):
+        name, job = result["tree"], result["job"]
+        results.append(result)
+        print(f"[{name}] {job}: {result['status']} in {result['seconds']:.2f}s")
+        if result.get("log"):
+            print("\n".join("    " + line for line in result["log"].rstrip().splitlines()))
+        if result["status"] != "ok":
+            print(result["error"], file=sys.stderr)
+        if job in runner.OPTIONS:
+            remaining_options[name].discard(job)
+            if result["status"] != "ok":
+                failed_trees.add(name)
+            else:
+                option_reports[name].append(result["report"])
+            if not remaining_options[name] and option_jobs[name] and name not in failed_trees:
+                write_tree_metadata(args, trees[name], name, option_jobs[name], cache_infos[name],
+                                    option_reports[name])
+
+    def skip_blocked():
+        # A failed option job leaves nothing consistent to re-bin
+        for name, job in list(pending):
+            if job == "distributions" and name in failed_trees and not remaining_options[name]:
+                pending.remove((name, job))
+                finish({"tree": name, "job": job, "status": "skipped", "seconds": 0.0,
+                        "error": "an option job of this tree failed"})
+
+    started = time.perf_counter()
+    print(f"Scheduling {len(pending)} job(s) for {len(trees)} tree(s) on {args.workers} worker(s)...")
+    if args.workers <= 1:
+        _init_worker(trees, settings)
+        while pending:
+            skip_blocked()
+            job = next((nj for nj in pending if ready(*nj)), None)
+            if job is None:
+                break
+            pending.remove(job)
+            finish(run_job(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(trees, settings)) as pool:
+            running = {}
+            while pending or running:
+                skip_blocked()
+                for job in [nj for nj in pending if ready(*nj)]:
+                    pending.remove(job)
+                    try:
+                        running[pool.submit(run_job, *job)] = job
+                    except BrokenProcessPool as exc:
+                        finish({"tree": job[0], "job": job[1], "status": "failed", "seconds": 0.0,
+                                "error": f"worker pool is broken: {exc}"})
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, job = running.pop(future)
+                    try:
+                        finish(future.result())
+                    except BrokenProcessPool as exc:
+                        finish({"tree": name, "job": job, "status": "failed", "seconds": 0.0,
+                                "error": f"worker process died: {exc}"})
+    wall = time.perf_counter() - started
+
+    job_seconds = sum(r["seconds"] for r in results)
+    print(f"\nFinished in {wall:.2f}s wall time ({job_seconds:.2f}s summed over jobs).")
+    return results, wall
+
+
+def main():
+    args = parse_args()
+    results, wall = orchestrate(args)
+    if args.report:
+        report = {
+            "wall_seconds": wall,
+            "workers": args.workers,
+            "jobs": [{k: r.get(k) for k in ("tree", "job", "status", "seconds", "error")} for r in results],
+        }
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    failed = [r for r in results if r["status"] != "ok"]
+    if failed:
+        print(f"Completed with {len(failed)} failed or skipped job(s): "
+              + ", ".join(f"{r['tree']}/{r['job']}" for r in failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+parallel_mcs.py
+---------------
+Process-pool Monte Carlo with reproducible per-iteration seed streams.
+
+Every iteration ``i`` of a campaign draws its inputs from its own generator,
+``default_rng(SeedSequence(seed, spawn_key=(i,)))`` (the i-th child of
+``SeedSequence(seed).spawn``), so an iteration's samples never depend on which
+worker runs it, in which chunk, or in what order. Campaign-level designs (the
+option_3 LHS over iterations) are drawn once in the parent from the root
+sequence. The scheduler, with its compiled tree, is sent to each worker once
+through the pool initializer; tasks only carry iteration ranges.
+
+Because the batch engine is element-wise across iterations, the merged result
+is bit-identical for any ``workers``/``chunk_size``.
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import qmc, triang
+
+from batch_engine import (
+    BatchResult,
+    BatchSamples,
+    RANDOM_DELAY_TRIANGLE,
+    YEARS_PER_TRL_TRIANGLE,
+)
+
+_WORKER_SCHEDULER = None
+
+
+def iteration_rng(seed, iteration):
+    """Generator for one iteration: child ``iteration`` of ``SeedSequence(seed)``."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(iteration,)))
+
+
+def _triangular_ppf(uniforms, triangle):
+    low, mode, high = triangle
+    return triang.ppf(uniforms, (mode - low) / (high - low), loc=low, scale=high - low)
+
+
+def campaign_years_per_trl(option, n_iterations, seed):
+    """Campaign-level YearsPerTRL design (LHS over iterations) for option_3, else None."""
+    if option != 'option_3':
+        return None
+    sampler = qmc.LatinHypercube(d=1, seed=np.random.default_rng(np.random.SeedSequence(seed)))
+    return _triangular_ppf(sampler.random(n=n_iterations)[:, 0], YEARS_PER_TRL_TRIANGLE)
+
+
+def draw_seeded_samples(tree, option, iterations, seed, years_per_trl=None):
+    """
+    BatchSamples for the given iteration indices using per-iteration streams.
+
+    ``years_per_trl`` is the campaign design from ``campaign_years_per_trl``
+    for the same iterations (option_3 only).
+    """
+    iterations = list(iterations)
+    n_sampled = int(tree.trl_parsed.sum())
+    years = None
+    delays = None
+    if option == 'option_1':
+        years = np.array([iteration_rng(seed, i).triangular(*YEARS_PER_TRL_TRIANGLE)
+                          for i in iterations])
+    elif option == 'option_2':
+        delays = np.array([iteration_rng(seed, i).triangular(*RANDOM_DELAY_TRIANGLE, size=n_sampled)
+                           for i in iterations]).reshape(len(iterations), n_sampled)
+    elif option == 'option_3':
+        years = np.asarray(years_per_trl, dtype=float)
+        uniforms = np.array([1.0 - iteration_rng(seed, i).random(n_sampled) for i in iterations])
+        delays = _triangular_ppf(uniforms.reshape(len(iterations), n_sampled), RANDOM_DELAY_TRIANGLE)
+    return BatchSamples.from_draws(tree, option, len(iterations), years, delays)
+
+
+def _init_worker(scheduler):
+    global _WORKER_SCHEDULER
+    _WORKER_SCHEDULER = scheduler
+
+
+def _run_chunk(options, start, stop, seed, years_to_simulate, designs, compute_impact):
+    return _simulate_chunk(_WORKER_SCHEDULER, options, start, stop, seed, years_to_simulate,
+                           designs, compute_impact)
+
+
+def _simulate_chunk(scheduler, options, start, stop, seed, years_to_simulate, designs,
+                    compute_impact):
+    samples = {
+        option: draw_seeded_samples(scheduler.tree, option, range(start, stop), seed, designs[option])
+        for option in options
+    }
+    results = scheduler.run_options(stop - start, options, years_to_simulate=years_to_simulate,
+                                    samples=samples, compute_impact=compute_impact)
+    # Ship arrays only; the tree stays on both sides
+    return {
+        option: (samples[option], result.years, result.status, result.impact_twh,
+                 result.baseline_twh, result.accelerated_twh)
+        for option, result in results.items()
+    }
+
+
+def _run_aggregate_chunk(options, start, stop, seed, years_to_simulate, designs):
+    return _aggregate_chunk(_WORKER_SCHEDULER, options, start, stop, seed, years_to_simulate, designs)
+
+
+def _aggregate_chunk(scheduler, options, start, stop, seed, years_to_simulate, designs):
+    """Completion-year aggregates of one chunk; only these leave the worker."""
+    from completion_aggregates import CompletionYearAggregator
+
+    aggregates = {}
+    for option in options:
+        samples = draw_seeded_samples(scheduler.tree, option, range(start, stop), seed, designs[option])
+        schedule = scheduler.run_events(stop - start, option, samples=samples)
+        aggregates[option] = CompletionYearAggregator().update(*schedule.completion_table(years_to_simulate))
+    return aggregates
+
+
+def _chunks(n_iterations, workers, chunk_size):
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(n_iterations / (workers * 4)))
+    return [(start, min(start + chunk_size, n_iterations))
+            for start in range(0, n_iterations, chunk_size)]
+
+
+def run_parallel(scheduler, option, n_iterations, workers=1, seed=24, years_to_simulate=30,
+                 chunk_size=None, compute_impact=True):
+    """
+    Run a seeded Monte Carlo campaign across ``workers`` processes and return
+    one merged ``BatchResult`` (iterations in order).
+    """
+    return run_parallel_options(scheduler, [option], n_iterations, workers=workers, seed=seed,
+                                years_to_simulate=years_to_simulate, chunk_size=chunk_size,
+                                compute_impact=compute_impact)[option]
+
+
+def run_parallel_options(scheduler, options, n_iterations, workers=1, seed=24, years_to_simulate=30,
+                         chunk_size=None, compute_impact=True):
+    """
+    Seeded campaigns for several options, evaluated together chunk by chunk.
+
+    Each chunk draws the samples of every option for its iteration range and
+    runs them as one stacked batch (``SchedulerCore.run_options``). All options
+    share ``seed``, so iteration ``i`` of each option uses the same stream, as
+    when the options are run separately. Returns option -> ``BatchResult``.
+    """
+    options = list(options)
+    designs = {option: campaign_years_per_trl(option, n_iterations, seed) for option in options}
+    tasks = [
+        (options, start, stop, seed, years_to_simulate,
+         {o: None if d is None else d[start:stop] for o, d in designs.items()}, compute_impact)
+        for start, stop in _chunks(n_iterations, workers, chunk_size)
+    ]
+    if workers <= 1:
+        parts = [_simulate_chunk(scheduler, *task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(scheduler,)) as pool:
+            parts = list(pool.map(_run_chunk, *zip(*tasks)))
+    return {option: merge_parts(scheduler.tree, option, [p[option] for p in parts]) for option in options}
+
+
+def merge_parts(tree, option, parts):
+    """Concatenate chunk outputs of ``_simulate_chunk`` into one BatchResult."""
+    samples = [p[0] for p in parts]
+
+    def cat(values):
+        return None if values[0] is None else np.concatenate(values)
+
+    merged_samples = BatchSamples(
+        option,
+        np.concatenate([s.initial_times for s in samples]),
+        cat([s.years_per_trl for s in samples]),
+        cat([s.random_delays for s in samples]),
+    )
+    return BatchResult(
+        tree, merged_samples, parts[0][1],
+        np.concatenate([p[2] for p in parts]),
+        np.concatenate([p[3] for p in parts]),
+        np.concatenate([p[4] for p in parts]),
+        np.concatenate([p[5] for p in parts]),
+    )
+
+
+class AggregatePool:
+    """
+    Worker pool that evaluates iteration ranges of a seeded campaign into
+    merged ``CompletionYearAggregator``s, kept open across calls so adaptive
+    campaigns can extend a run round by round. ``n_iterations`` sizes the
+    option_3 campaign design; ranges must lie within it.
+    """
+
+    def __init__(self, scheduler, options, n_iterations, workers=1, seed=24, years_to_simulate=30):
+        self.scheduler = scheduler
+        self.workers = workers
+        self.seed = seed
+        self.years_to_simulate = years_to_simulate
+        self.designs = {option: campaign_years_per_trl(option, n_iterations, seed) for option in options}
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.scheduler,))
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run(self, options, start, stop, chunk_size=None):
+        """Aggregates of iterations ``start..stop`` of ``options``, merged in iteration order."""
+        from completion_aggregates import CompletionYearAggregator
+
+        options = list(options)
+        tasks = [
+            (options, start + a, start + b, self.seed, self.years_to_simulate,
+             {o: None if self.designs[o] is None else self.designs[o][start + a:start + b] for o in options})
+            for a, b in _chunks(stop - start, self.workers, chunk_size)
+        ]
+        merged = {option: CompletionYearAggregator() for option in options}
+        if self._pool is None:
+            parts = (_aggregate_chunk(self.scheduler, *task) for task in tasks)
+        else:
+            parts = self._pool.map(_run_aggregate_chunk, *zip(*tasks))
+        for part in parts:
+            for option in options:
+                merged[option].merge(part[option])
+        return merged
+
+
+def aggregate_parallel_options(scheduler, options, n_iterations, workers=1, seed=24, years_to_simulate=30,
+                               chunk_size=None):
+    """
+    Streaming variant of ``run_parallel_options``: each chunk is reduced to
+    ``CompletionYearAggregator``s in its worker and merged in iteration order,
+    so memory no longer grows with the number of iterations. Impacts are not
+    evaluated, so chunks run on the event-driven engine. Returns option ->
+    aggregator.
+    """
+    with AggregatePool(scheduler, options, n_iterations, workers, seed, years_to_simulate) as pool:
+        return pool.run(options, 0, n_iterations, chunk_size)
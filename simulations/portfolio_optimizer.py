@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+portfolio_optimizer.py
+----------------------
+Budgeted allocation of acceleration-years to Milestone/EnablingTechnology
+nodes, behind ``NuclearScheduler.optimise_acceleration``.
+
+Each simulated year, after the normal sweep, the optimiser may buy units of
+extra work for nodes that are still Active. One unit is one more year of work
+on a node: its remaining time drops by a year and its risk by a year's worth
+(the perturbation behind the impact tables, with a node that finishes going
+to probability 1 as in the sweep). Bought units change the simulated state, so
+their effect carries into every later year. Budgets are ``budget_per_year``
+units each year and/or ``total_budget`` units over the horizon; the total is
+spent as early as units still have a positive gain.
+
+Units are bought by their gain in the expected discounted TWh of every
+concept's pathway, valued as in the impact tables (deployment at the start
+year plus the critical-path time, times the pathway probability) and averaged
+over the iterations of ``samples``; the plan is shared by all iterations. The
+plan is scored by the realised value of the run (``realised_value``): nodes
+finish in the year they completed, unfinished work continues after the
+horizon, so finishing earlier counts even once everything is done.
+
+Within a year units are chosen greedily by marginal gain, each gain being a
+cone overlay of the critical paths (no state copies). Buying a unit makes the
+other gains stale; like CELF, stale gains stay in a max-heap and only the top
+entry is re-evaluated until a fresh one is on top, instead of re-evaluating
+every candidate after each pick. Gains are not strictly submodular here (a
+concept waits for its slowest prerequisite, so speeding up one of two parallel
+prerequisites can pay only once the other is sped up too), so a stale gain is
+not a guaranteed bound; ``lazy=False`` runs the plain greedy for comparison.
+
+Usage:
+    python simulations/portfolio_optimizer.py data/nuclear_tt.json --budget-per-year 2
+    python simulations/portfolio_optimizer.py data/nuclear_tt.json --total-budget 20 --output plan.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import sys
+
+import numpy as np
+
+from batch_engine import STATUS_COMPLETED, simulate_batch
+
+
+def pathway_value(solver, state, concepts, start_year, valuation):
+    """Expected discounted MWh of all ``concepts``, averaged over the iterations of ``state``."""
+    times, probs = solver.solve(state)
+    return float(sum((valuation(start_year + times[c]) * probs[c]).mean() for c in concepts))
+
+
+def realised_value(tree, solver, state, batch, start_year, valuation):
+    """
+    Expected discounted MWh of all concepts for a run that produced ``batch``
+    and ended in ``state``: tracked nodes finish at the end of the year they
+    completed in, unfinished ones continue after the horizon, and every other
+    node (concepts included) takes its own time after its last prerequisite.
+    """
+    horizon = len(batch.years)
+    completed = batch.status == STATUS_COMPLETED
+    # Shown as Completed from year f on means finished at the end of year f - 1
+    shown = np.where(completed.any(axis=2), completed.argmax(axis=2), horizon).T
+    completed_at = dict(zip(tree.tracked_indices.tolist(), shown))
+    finish = np.empty_like(state.time_remaining)
+    for j in tree.topo_order.tolist():
+        preds = tree.pred_lists[j]
+        ready = np.max([finish[p] for p in preds], axis=0) if preds else 0.0
+        if j in completed_at:
+            finish[j] = np.where(state.is_complete[j], completed_at[j],
+                                 np.maximum(ready, horizon) + state.time_remaining[j])
+        else:
+            finish[j] = ready + state.time_remaining[j]
+    _times, probs = solver.solve(state)
+    concepts = np.flatnonzero(tree.is_concept).tolist()
+    return float(sum((valuation(start_year + finish[c]) * probs[c]).mean() for c in concepts))
+
+
+class _Allocator:
+    """``simulate_batch`` hook spending the budget year by year (and recording the objective)."""
+
+    def __init__(self, tree, reach, solver, start_year, valuation, budget_per_year=0, total_budget=None,
+                 max_units_per_node=1, candidates=None, lazy=True):
+        self.tree = tree
+        self.reach = reach
+        self.solver = solver
+        self.start_year = start_year
+        self.valuation = valuation
+        self.concepts = np.flatnonzero(tree.is_concept).tolist()
+        self.budget_per_year = budget_per_year
+        self.remaining = total_budget
+        self.max_units_per_node = max_units_per_node
+        self.candidates = candidates
+        self.lazy = lazy
+        self.risk_step = None
+        self.state = None
+        self.allocations = {}
+        self.values = []
+        self.evaluations = 0
+        self.plain_greedy_evaluations = 0
+
+    def gain(self, state, node, rows):
+        """Expected MWh gained by one more year of work on ``node`` in iterations ``rows``."""
+        self.evaluations += 1
+        affected = self.reach.concepts_of(node)
+        if not affected:
+            return 0.0
+        base_times, base_probs = self.solver.solve(state)
+        time_remaining = state.time_remaining[node, rows]
+        prob_delta = np.where(time_remaining - 1 <= 0, 1.0 - state.prob_of_success[node, rows],
+                              self.risk_step[node, rows])
+        acc_times, acc_probs = self.solver.overlay(self.reach, state, node, rows, -1, prob_delta)
+        gain = 0.0
+        for c in affected:
+            accelerated = self.valuation(self.start_year + acc_times[c]) * acc_probs[c]
+            baseline = self.valuation(self.start_year + base_times[c, rows]) * base_probs[c, rows]
+            gain += float((accelerated - baseline).sum())
+        return gain / state.time_remaining.shape[1]
+
+    def apply(self, state, node, rows):
+        """Spend one unit on ``node`` in iterations ``rows``; returns the rows still running."""
+        state.time_remaining[node, rows] -= 1
+        state.prob_of_success[node, rows] += self.risk_step[node, rows]
+        finished = rows[state.time_remaining[node, rows] <= 0]
+        state.is_complete[node, finished] = True
+        state.prob_of_success[node, finished] = 1.0
+        state.version += 1
+        return rows[~state.is_complete[node, rows]]
+
+    def __call__(self, y, state, in_progress):
+        if self.risk_step is None:
+            self.risk_step = (1 - self.tree.init_prob)[:, None] / state.initial_time
+        self.state = state
+        budget = math.inf if self.budget_per_year is None else self.budget_per_year
+        if self.remaining is not None:
+            budget = min(budget, self.remaining)
+        if budget > 0:
+            spent = self.spend(y, state, in_progress, budget)
+            if self.remaining is not None:
+                self.remaining -= spent
+        self.values.append(pathway_value(self.solver, state, self.concepts, self.start_year, self.valuation))
+
+    def spend(self, y, state, in_progress, budget):
+        rows_of = {i: rows for _k, i, rows in in_progress
+                   if (self.candidates is None or i in self.candidates) and self.reach.concepts_of(i)}
+        units_left = dict.fromkeys(rows_of, self.max_units_per_node)
+        # Entries are (-gain, node, picks when evaluated); -1 marks a gain known to be stale
+        heap = [(-self.gain(state, i, rows), i, 0) for i, rows in rows_of.items()]
+        heapq.heapify(heap)
+        self.plain_greedy_evaluations += len(heap)
+        picks = 0
+        while picks < budget and heap:
+            neg_gain, i, evaluated = heapq.heappop(heap)
+            if evaluated != picks:
+                heapq.heappush(heap, (-self.gain(state, i, rows_of[i]), i, picks))
+                continue
+            if neg_gain >= 0:
+                break
+            rows_of[i] = self.apply(state, i, rows_of[i])
+            entry = self.allocations.setdefault((y, i), [0, 0.0])
+            entry[0] += 1
+            entry[1] += -neg_gain
+            picks += 1
+            units_left[i] -= 1
+            if units_left[i] > 0 and len(rows_of[i]):
+                heapq.heappush(heap, (neg_gain, i, -1))
+            if picks < budget:
+                self.plain_greedy_evaluations += len(heap)
+                if not self.lazy:
+                    heap = [(-self.gain(state, j, rows_of[j]), j, picks) for _g, j, _e in heap]
+                    heapq.heapify(heap)
+        return picks
+
+
+class PortfolioResult:
+    """
+    Outcome of ``optimise_portfolio``: the allocations, the realised value
+    and the pathway value per year with and without them, and the two
+    ``BatchResult`` runs.
+    """
+
+    def __init__(self, tree, settings, allocations, years, value, baseline_value, pathway_values,
+                 baseline_pathway_values, evaluations, plain_greedy_evaluations, batch, baseline_batch,
+                 mwh_to_twh):
+        self.tree = tree
+        self.settings = settings
+        self.allocations = allocations
+        self.years = years
+        self.value_twh = value / mwh_to_twh
+        self.baseline_value_twh = baseline_value / mwh_to_twh
+        self.pathway_value_twh = np.asarray(pathway_values) / mwh_to_twh
+        self.baseline_pathway_value_twh = np.asarray(baseline_pathway_values) / mwh_to_twh
+        self.evaluations = evaluations
+        self.plain_greedy_evaluations = plain_greedy_evaluations
+        self.batch = batch
+        self.baseline_batch = baseline_batch
+        self.mwh_to_twh = mwh_to_twh
+
+    @property
+    def units_spent(self):
+        return sum(units for units, _gain in self.allocations.values())
+
+    @property
+    def gain_twh(self):
+        """Realised value added by the allocations."""
+        return self.value_twh - self.baseline_value_twh
+
+    def completion_years(self, batch):
+        """label -> mean first year shown as Completed (over iterations that get there), or None."""
+        completed = batch.status == STATUS_COMPLETED
+        reached = completed.any(axis=2)
+        first = self.years[completed.argmax(axis=2)].astype(float)
+        first[~reached] = np.nan
+        out = {}
+        for k, label in enumerate(batch.tracked_labels):
+            out[label] = float(np.nanmean(first[:, k])) if reached[:, k].any() else None
+        return out
+
+    def to_dict(self):
+        tree = self.tree
+        units_by_year = {}
+        for (y, _i), (units, _gain) in self.allocations.items():
+            units_by_year[y] = units_by_year.get(y, 0) + units
+        baseline_done = self.completion_years(self.baseline_batch)
+        plan_done = self.completion_years(self.batch)
+        return {
+            **self.settings,
+            "units_spent": self.units_spent,
+            "value_twh": {
+                "baseline": self.baseline_value_twh,
+                "portfolio": self.value_twh,
+                "gain": self.gain_twh,
+            },
+            "allocations": [
+                {"year": int(self.years[y]), "node_id": tree.ids[i], "label": tree.labels[i],
+                 "units": units, "gain_twh": gain / self.mwh_to_twh}
+                for (y, i), (units, gain) in sorted(self.allocations.items(),
+                                                    key=lambda item: (item[0][0], -item[1][1]))
+            ],
+            "yearly": {
+                str(year): {
+                    "units": units_by_year.get(y, 0),
+                    "baseline_pathway_value_twh": float(self.baseline_pathway_value_twh[y]),
+                    "portfolio_pathway_value_twh": float(self.pathway_value_twh[y]),
+                }
+                for y, year in enumerate(self.years.tolist())
+            },
+            "completion_year_changes": {
+                label: {"baseline": baseline_done[label], "portfolio": plan_done[label]}
+                for label in plan_done if plan_done[label] != baseline_done[label]
+            },
+            "evaluations": {"performed": self.evaluations, "plain_greedy": self.plain_greedy_evaluations},
+        }
+
+
+def optimise_portfolio(tree, reach, solver, samples, years_to_simulate, start_year, valuation, mwh_to_twh,
+                       budget_per_year=None, total_budget=None, max_units_per_node=1, candidates=None,
+                       lazy=True):
+    """
+    Allocate acceleration-years to maximise the expected discounted TWh of
+    all pathways; returns a ``PortfolioResult``.
+
+    ``budget_per_year`` and ``total_budget`` are whole units (either may be
+    None for no limit, not both); ``max_units_per_node`` caps the units one
+    node gets in a year and ``candidates`` (node indices) restricts the nodes
+    that can be accelerated.
+    """
+    if budget_per_year is None and total_budget is None:
+        raise ValueError("give budget_per_year and/or total_budget")
+    for name, value in (("budget_per_year", budget_per_year), ("total_budget", total_budget),
+                        ("max_units_per_node", max_units_per_node)):
+        if value is not None and (int(value) != value or value < 0):
+            raise ValueError(f"{name} must be a non-negative whole number, got {value!r}")
+    candidates = None if candidates is None else set(candidates)
+
+    common = (tree, reach, solver, start_year, valuation)
+    baseline = _Allocator(*common, budget_per_year=0)
+    baseline_batch = simulate_batch(tree, reach, solver, samples, years_to_simulate, start_year, valuation,
+                                    mwh_to_twh, compute_impact=False, allocate=baseline)
+    allocator = _Allocator(*common, budget_per_year, total_budget, max_units_per_node, candidates, lazy)
+    batch = simulate_batch(tree, reach, solver, samples, years_to_simulate, start_year, valuation,
+                           mwh_to_twh, compute_impact=False, allocate=allocator)
+    settings = {
+        "option": samples.option,
+        "n_iterations": samples.n_iterations,
+        "budget_per_year": budget_per_year,
+        "total_budget": total_budget,
+        "max_units_per_node": max_units_per_node,
+        "lazy": lazy,
+    }
+    value = realised_value(tree, solver, allocator.state, batch, start_year, valuation)
+    baseline_value = realised_value(tree, solver, baseline.state, baseline_batch, start_year, valuation)
+    return PortfolioResult(tree, settings, allocator.allocations, batch.years, value, baseline_value,
+                           allocator.values, baseline.values, allocator.evaluations,
+                           allocator.plain_greedy_evaluations, batch, baseline_batch, mwh_to_twh)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Choose which milestones to accelerate under a budget of acceleration-years."
+    )
+    parser.add_argument("tech_tree_path", help="Path to the tech tree JSON file.")
+    parser.add_argument("--budget-per-year", type=int, default=None,
+                        help="Acceleration-years available each year.")
+    parser.add_argument("--total-budget", type=int, default=None,
+                        help="Acceleration-years available over the whole horizon.")
+    parser.add_argument("--max-units-per-node", type=int, default=1,
+                        help="Most acceleration-years one node gets in a year (default: 1).")
+    parser.add_argument("--years", type=int, default=30, help="Years to simulate (default: 30).")
+    parser.add_argument("--option", choices=["option_1", "option_2", "option_3"], default=None,
+                        help="Optimise the expectation over MCS samples of this option "
+                             "(default: the deterministic run).")
+    parser.add_argument("--simulations", type=int, default=100,
+                        help="Iterations for --option (default: 100).")
+    parser.add_argument("--plain-greedy", action="store_true",
+                        help="Re-evaluate every candidate after each pick instead of lazily.")
+    parser.add_argument("--output", default=None, help="Write the full result to this JSON file.")
+    args = parser.parse_args(argv)
+    if args.budget_per_year is None and args.total_budget is None:
+        parser.error("give --budget-per-year and/or --total-budget")
+    return args
+
+
+def main(argv=None):
+    from baseline_simulation import NuclearScheduler
+    from tree_loader import load_tree
+
+    args = parse_args(argv)
+    scheduler = load_tree(args.tech_tree_path).scheduler(NuclearScheduler)
+    result = scheduler.optimise_acceleration(
+        budget_per_year=args.budget_per_year, total_budget=args.total_budget,
+        years_to_simulate=args.years, option=args.option,
+        n_iterations=args.simulations if args.option else 1,
+        max_units_per_node=args.max_units_per_node, lazy=not args.plain_greedy,
+    )
+    summary = result.to_dict()
+    value = summary["value_twh"]
+    print(f"Spent {summary['units_spent']} acceleration-year(s): {value['baseline']:.3f} -> "
+          f"{value['portfolio']:.3f} TWh expected discounted ({value['gain']:+.3f} TWh)")
+    for entry in summary["allocations"]:
+        print(f"  {entry['year']}  {entry['units']} x {entry['label']}  (+{entry['gain_twh']:.3f} TWh)")
+    evaluations = summary["evaluations"]
+    print(f"Gain evaluations: {evaluations['performed']} (plain greedy: {evaluations['plain_greedy']})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
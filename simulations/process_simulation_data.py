@@ -1,18 +1,57 @@
 import json
 import argparse
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def process_raw_simulations(input_path, output_path):
-    print(f"  -> Loading: {input_path.name}")
+READ_CHUNK_SIZE = 1 << 20
+
+def iter_json_array(input_path, chunk_size=READ_CHUNK_SIZE):
+    # Yield the elements of a top-level JSON array one by one, reading the file
+    # in chunks, so memory stays bounded by the largest single record.
+    decoder = json.JSONDecoder()
     with open(input_path, 'r') as f:
-        raw_data = json.load(f)
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError(f"{input_path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if started and pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError("need more data")
+                element, end = decoder.raw_decode(buffer, pos)
+                if end == len(buffer) and not eof:
+                    raise ValueError("element may continue in the next chunk")
+            except ValueError:
+                if eof:
+                    raise ValueError(f"{input_path}: truncated JSON array") from None
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield element
+            pos = end
+
+def process_raw_simulations(input_path, output_path, log=print):
+    log(f"  -> Loading: {input_path.name}")
 
     distributions = defaultdict(lambda: defaultdict(int))
     raw_node_counts = defaultdict(int) # Track expected totals per node
 
-    # 1. Aggregate the data
-    for record in raw_data:
+    # 1. Aggregate the data, one record at a time
+    for record in iter_json_array(input_path):
         node = record.get("Node")
         year = record.get("Year")
         if node is not None and year is not None:
@@ -20,71 +59,186 @@ def process_raw_simulations(input_path, output_path):
             raw_node_counts[node] += 1
 
     final_distributions = {node: dict(years) for node, years in distributions.items()}
+    verify_and_save(final_distributions, raw_node_counts, output_path, log)
+
+def process_run_store(store_path, output_path, log=print):
+    # Imported here so plain JSON processing keeps working without NumPy
+    from run_store import RunStore
+
+    log(f"  -> Loading: {store_path.name} (run store)")
+    store = RunStore(store_path)
+
+    # 1. Aggregate the data, reading only the completion_year column
+    final_distributions = store.distributions()
+    # The per-node counts would come from that same column, so check the
+    # store against its manifest instead of against itself
+    verify_run_store(store, final_distributions, log)
+    save_distributions(final_distributions, output_path, log)
+
+def verify_run_store(store, final_distributions, log=print):
+    # 2. Run Integrity Checks against the manifest; returns True if every check passed
+    log("  -> Running integrity checks...")
+    ok = True
+    n_nodes, n_iterations = len(store.nodes), store.n_iterations
+
+    # Check A: Does every column have the shape the manifest's nodes and iterations imply?
+    expected_shapes = {
+        "completion_year": (n_nodes, n_iterations),
+        "RandomDelay": (n_nodes, n_iterations),
+        "YearsPerTRL": (n_iterations,),
+        "sampled": (n_nodes,),
+    }
+    bad_columns = []
+    for name in store.columns:
+        actual = tuple(store.column(name).shape)
+        expected = expected_shapes.get(name, tuple(store.manifest["columns"][name]["shape"]))
+        if actual != expected:
+            bad_columns.append((name, expected, actual))
+    if "completion_year" not in store.columns:
+        bad_columns.append(("completion_year", expected_shapes["completion_year"], None))
+
+    if bad_columns:
+        log(f"     [!] ERROR: {len(bad_columns)} columns do not match the manifest!")
+        for name, expected, actual in bad_columns:
+            log(f"         - {name}: Expected shape {expected}, got {actual}")
+        ok = False
+    else:
+        log(f"     [✓] Verified: {len(store.columns)} columns match {n_nodes} nodes x {n_iterations} iterations.")
+
+    # Check B: Does every node complete at most once per iteration, within the simulated years?
+    first_year, last_year = store.manifest["years"]
+    failed_nodes = []
+    for node, years_dict in final_distributions.items():
+        total_binned = sum(years_dict.values())
+        out_of_range = [year for year in years_dict if not first_year <= int(year) <= last_year]
+        if node not in store.node_index or total_binned > n_iterations or out_of_range:
+            failed_nodes.append((node, total_binned, out_of_range))
+
+    if failed_nodes:
+        log(f"     [!] ERROR: {len(failed_nodes)} nodes failed range validation!")
+        for n, total, years in failed_nodes[:5]:
+            log(f"         - {n}: {total} runs binned (max {n_iterations}), years outside "
+                f"{first_year}-{last_year}: {years}")
+        if len(failed_nodes) > 5:
+            log("         ... and more.")
+        ok = False
+    elif final_distributions:
+        log(f"     [✓] Verified: {len(final_distributions)} nodes complete at most once in each of "
+            f"{n_iterations} iterations, within {first_year}-{last_year}.")
+    return ok
+
+def verify_distributions(final_distributions, raw_node_counts, log=print):
+    # 2. Run Integrity Checks; returns True if every check passed
+    log("  -> Running integrity checks...")
+    ok = True
 
-    # 2. Run Integrity Checks
-    print("  -> Running integrity checks...")
-    
     # Check A: Do we have the same number of unique nodes?
     raw_unique_nodes = len(raw_node_counts)
     dist_unique_nodes = len(final_distributions)
-    
+
     if raw_unique_nodes != dist_unique_nodes:
-        print(f"     [!] ERROR: Node count mismatch. Raw: {raw_unique_nodes}, Dist: {dist_unique_nodes}")
+        log(f"     [!] ERROR: Node count mismatch. Raw: {raw_unique_nodes}, Dist: {dist_unique_nodes}")
+        ok = False
     else:
-        print(f"     [✓] Verified: {dist_unique_nodes} unique nodes processed.")
+        log(f"     [✓] Verified: {dist_unique_nodes} unique nodes processed.")
 
     # Check B: Does the sum of the bins equal the total runs for that node?
     failed_nodes = []
     for node, years_dict in final_distributions.items():
         total_binned = sum(years_dict.values())
-        expected_total = raw_node_counts[node]
-        
+        expected_total = raw_node_counts.get(node, 0)
+
         if total_binned != expected_total:
             failed_nodes.append((node, expected_total, total_binned))
 
     if failed_nodes:
-        print(f"     [!] ERROR: {len(failed_nodes)} nodes failed sum validation!")
+        log(f"     [!] ERROR: {len(failed_nodes)} nodes failed sum validation!")
         for n, expected, actual in failed_nodes[:5]:
-            print(f"         - {n}: Expected {expected} runs, got {actual} binned")
+            log(f"         - {n}: Expected {expected} runs, got {actual} binned")
         if len(failed_nodes) > 5:
-            print("         ... and more.")
-    else:
+            log("         ... and more.")
+        ok = False
+    elif final_distributions:
         sample_node = next(iter(final_distributions))
         sample_runs = raw_node_counts[sample_node]
-        print(f"     [✓] Verified: All nodes perfectly sum to their exact iteration count (e.g., {sample_runs} runs).")
+        log(f"     [✓] Verified: All nodes perfectly sum to their exact iteration count (e.g., {sample_runs} runs).")
+    return ok
 
+def verify_and_save(final_distributions, raw_node_counts, output_path, log=print):
+    verify_distributions(final_distributions, raw_node_counts, log)
+    save_distributions(final_distributions, output_path, log)
+
+def save_distributions(final_distributions, output_path, log=print):
     # 3. Save the validated data
-    print(f"  -> Saving:  {output_path.name}")
+    log(f"  -> Saving:  {output_path.name}")
     with open(output_path, 'w') as f:
         json.dump(final_distributions, f, indent=2)
 
-def process_directory(target_dir):
-    dir_path = Path(target_dir)
-    
-    if not dir_path.is_dir():
-        print(f"Error: Directory not found -> {dir_path}")
-        return
+def find_jobs(dir_path):
+    # (kind, input, output) for every raw simulation file below dir_path
+    jobs = []
+    for folder in [dir_path, *sorted(p for p in dir_path.rglob("*") if p.is_dir())]:
+        target_files = sorted(folder.glob("simulation_runs_*.json"))
+        # Run stores (runs_<option>/manifest.json) take precedence over a JSON file of the same option
+        target_stores = sorted(p.parent for p in folder.glob("runs_*/manifest.json"))
+        store_names = {p.name.replace("runs_", "distributions_") + ".json" for p in target_stores}
+        for input_path in target_files:
+            new_filename = input_path.name.replace("simulation_runs_", "distributions_")
+            if new_filename not in store_names:
+                jobs.append(("json", input_path, folder / new_filename))
+        for store_path in target_stores:
+            jobs.append(("store", store_path, folder / (store_path.name.replace("runs_", "distributions_") + ".json")))
+    return jobs
+
+def run_job(kind, input_path, output_path):
+    # Worker entry point: returns the log lines so parallel output stays readable
+    lines = []
+    if kind == "store":
+        process_run_store(input_path, output_path, lines.append)
+    else:
+        process_raw_simulations(input_path, output_path, lines.append)
+    return lines
 
-    target_files = list(dir_path.glob("simulation_runs_*.json"))
-    
-    if not target_files:
-        print(f"No 'simulation_runs_*.json' files found in {dir_path}")
+def process_directory(target_dir, workers=1):
+    process_directories([target_dir], workers)
+
+def process_directories(target_dirs, workers=1):
+    jobs = []
+    for target_dir in target_dirs:
+        dir_path = Path(target_dir)
+        if not dir_path.is_dir():
+            print(f"Error: Directory not found -> {dir_path}")
+            continue
+        found = find_jobs(dir_path)
+        if not found:
+            print(f"No 'simulation_runs_*.json' files or 'runs_*' stores found in {dir_path}")
+        jobs.extend(found)
+
+    if not jobs:
         return
-        
-    print(f"Found {len(target_files)} simulation files to process.\n")
-    
-    for input_path in target_files:
-        new_filename = input_path.name.replace("simulation_runs_", "distributions_")
-        output_path = dir_path / new_filename
-        
-        process_raw_simulations(input_path, output_path)
-        print("  Done.\n" + "-"*40 + "\n")
-        
+
+    print(f"Found {len(jobs)} simulation files to process.\n")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(run_job, *zip(*jobs))
+            for lines in results:
+                print("\n".join(lines))
+                print("  Done.\n" + "-"*40 + "\n")
+    else:
+        for kind, input_path, output_path in jobs:
+            if kind == "store":
+                process_run_store(input_path, output_path)
+            else:
+                process_raw_simulations(input_path, output_path)
+            print("  Done.\n" + "-"*40 + "\n")
+
     print("All distributions pre-computed, verified, and ready for the frontend!")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Batch pre-compute and verify histogram bins for a directory of simulation runs.")
-    parser.add_argument("target_dir", help="Path to the directory containing the simulation_runs_*.json files")
-    
+    parser = argparse.ArgumentParser(description="Batch pre-compute and verify histogram bins for directories of simulation runs.")
+    parser.add_argument("target_dirs", nargs="+", help="Directories (searched recursively) containing simulation_runs_*.json files or runs_* stores")
+    parser.add_argument("--workers", type=int, default=1, help="Process this many files in parallel (default: 1)")
+
     args = parser.parse_args()
-    process_directory(args.target_dir)
\ No newline at end of file
+    process_directories(args.target_dirs, args.workers)
@@ -0,0 +1,113 @@
+"""
+reachability.py
+---------------
+Transitive-closure index over a ``CompiledTree``, built once per scheduler.
+
+Each node's downstream set (including itself) is stored as one bit-packed
+Python integer, computed in reverse topological order by OR-ing successor
+rows. Downstream counts are precomputed, and per-node concept lists and impact
+cones are decoded from the bit rows on first use and cached, so repeated
+queries from the yearly impact loop or ``build_analysis`` cost O(1)/O(k)
+instead of a fresh BFS.
+"""
+
+import numpy as np
+
+
+def _bits_to_indices(bits):
+    """Sorted indices of the set bits of a non-negative int."""
+    if not bits:
+        return np.empty(0, dtype=np.int64)
+    raw = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder='little'))
+
+
+class ReachabilityIndex:
+    """Downstream reachability queries for a compiled tech tree."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = self._closure()
+        self.downstream_counts = np.array([row.bit_count() - 1 for row in self.rows], dtype=np.int64)
+
+        concept_mask = 0
+        for i in np.flatnonzero(tree.is_concept).tolist():
+            concept_mask |= 1 << i
+        self._concept_mask = concept_mask
+        self.reaches_concept = np.array([bool(row & concept_mask) for row in self.rows], dtype=bool)
+        self._reaches_concept_mask = sum(1 << i for i in np.flatnonzero(self.reaches_concept).tolist())
+        self._concepts = {}
+        self._cones = {}
+        # Decoded concept-list/cone cache statistics (reported by instrumentation.py)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _closure(self):
+        tree = self.tree
+        succ_lists = tree.succ_lists
+        rows = [0] * tree.n_total
+
+        # Nodes on or below a cycle never enter the topological order: BFS them
+        in_order = np.zeros(tree.n_total, dtype=bool)
+        in_order[tree.topo_order] = True
+        for start in np.flatnonzero(~in_order).tolist():
+            bits = 1 << start
+            stack = [start]
+            while stack:
+                for succ in succ_lists[stack.pop()]:
+                    if not bits >> succ & 1:
+                        bits |= 1 << succ
+                        stack.append(succ)
+            rows[start] = bits
+
+        # Phantom targets have no prerequisites, so they can precede their sources
+        # in the order; their rows are just themselves
+        for i in np.flatnonzero(tree.is_phantom).tolist():
+            rows[i] = 1 << i
+
+        for i in tree.topo_order[::-1].tolist():
+            bits = 1 << i
+            for succ in succ_lists[i]:
+                bits |= rows[succ]
+            rows[i] = bits
+        return rows
+
+    def reaches(self, source, target):
+        """True if ``target`` is downstream of (or equal to) ``source``."""
+        return bool(self.rows[source] >> target & 1)
+
+    def downstream_count(self, start):
+        """Number of nodes transitively downstream of ``start``, excluding itself."""
+        return int(self.downstream_counts[start])
+
+    def downstream(self, start):
+        """Sorted indices of all nodes downstream of ``start``, excluding itself."""
+        return _bits_to_indices(self.rows[start] & ~(1 << start))
+
+    def concepts_of(self, start):
+        """Sorted indices of the concept nodes reached from ``start`` (inclusive)."""
+        concepts = self._concepts.get(start)
+        if concepts is None:
+            self.cache_misses += 1
+            concepts = _bits_to_indices(self.rows[start] & self._concept_mask).tolist()
+            self._concepts[start] = concepts
+        else:
+            self.cache_hits += 1
+        return concepts
+
+    def impact_cone(self, start):
+        """
+        Nodes downstream of ``start`` (inclusive) that lead to a concept, in
+        topological order: the only nodes whose critical path can change the
+        pathway value when ``start`` is perturbed.
+        """
+        cone = self._cones.get(start)
+        if cone is None:
+            self.cache_misses += 1
+            members = _bits_to_indices(self.rows[start] & self._reaches_concept_mask)
+            order = np.argsort(self.tree.topo_position[members], kind='stable')
+            cone = members[order].tolist()
+            self._cones[start] = cone
+        else:
+            self.cache_hits += 1
+        return cone
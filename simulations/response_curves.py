@@ -0,0 +1,159 @@
+"""
+response_curves.py
+------------------
+Acceleration and risk-reduction response curves, behind
+``NuclearScheduler.run_response_curves``.
+
+The impact tables answer one question per node and year: what if this Active
+node were one year further along. Here every tracked node that is Active in a
+year gets a whole curve instead. Each point is the change in expected
+discounted TWh of the node's downstream pathways:
+
+* ``accelerations`` (years): the node needs ``a`` years less and its risk
+  drops by ``a`` years' worth. An ``a`` beyond the work left finishes the
+  node: only the remaining time is removed and it goes to probability 1, as
+  in the sweep, so the curve is flat from there on (the impact tables do not
+  cap it, so their one-year value differs from the ``a = 1`` point in a
+  node's final Active year only);
+* ``risk_reductions`` (fractions): ``r`` of the node's remaining risk is
+  removed, with no change in time.
+
+All points of a node are evaluated in one critical-path overlay of its
+impact cone: the node's iteration rows are repeated once per point, so the
+whole curve is a single batched counterfactual on the baseline state instead
+of one state copy per point. Curves are averaged over the iterations of
+``samples`` (a node that is not Active in an iteration adds 0 there).
+"""
+
+import numpy as np
+
+from batch_engine import simulate_batch
+
+DEFAULT_ACCELERATIONS = (0.5, 1.0, 2.0, 3.0, 4.0, 5.0)
+DEFAULT_RISK_REDUCTIONS = (0.1, 0.25, 0.5, 0.75, 1.0)
+
+
+class ResponseCurves:
+    """
+    Curves per tracked node and year: ``baseline_twh`` (tracked, years),
+    ``acceleration_twh`` (tracked, years, accelerations) and ``risk_twh``
+    (tracked, years, risk reductions); NaN where the node is not Active.
+    ``remaining_years`` (tracked, years) is the most work the node has left
+    in any iteration: every acceleration at or beyond it finishes the node.
+    """
+
+    def __init__(self, tree, years, accelerations, risk_reductions, baseline_twh, acceleration_twh,
+                 risk_twh, remaining_years):
+        self.tree = tree
+        self.years = years
+        self.tracked_labels = [tree.labels[i] for i in tree.tracked_indices]
+        self.accelerations = accelerations
+        self.risk_reductions = risk_reductions
+        self.baseline_twh = baseline_twh
+        self.acceleration_twh = acceleration_twh
+        self.risk_twh = risk_twh
+        self.remaining_years = remaining_years
+
+    def saturation_violations(self):
+        """(label, year, values) wherever the curve still changes past ``remaining_years``."""
+        accelerations = np.asarray(self.accelerations)
+        violations = []
+        for k, label in enumerate(self.tracked_labels):
+            for y, year in enumerate(self.years.tolist()):
+                saturated = self.acceleration_twh[k, y, accelerations >= self.remaining_years[k, y]]
+                if len(saturated) > 1 and not np.allclose(saturated, saturated[0], rtol=1e-12, atol=1e-9):
+                    violations.append((label, year, saturated.tolist()))
+        return violations
+
+    def to_dict(self):
+        """label -> year -> {baseline_twh, accelerate, risk}, for the years the node is Active."""
+        out = {}
+        for k, label in enumerate(self.tracked_labels):
+            rows = {}
+            for y, year in enumerate(self.years.tolist()):
+                if np.isnan(self.baseline_twh[k, y]):
+                    continue
+                rows[str(year)] = {
+                    "baseline_twh": round(float(self.baseline_twh[k, y]), 6),
+                    "accelerate": [round(float(v), 6) for v in self.acceleration_twh[k, y]],
+                    "risk": [round(float(v), 6) for v in self.risk_twh[k, y]],
+                }
+            out[label] = rows
+        return out
+
+
+class _CurveRecorder:
+    """``simulate_batch`` hook evaluating the curves of the still-active nodes each year."""
+
+    def __init__(self, tree, reach, solver, start_year, valuation, mwh_to_twh, n_iterations, n_years,
+                 accelerations, risk_reductions):
+        self.tree = tree
+        self.reach = reach
+        self.solver = solver
+        self.start_year = start_year
+        self.valuation = valuation
+        self.scale = 1.0 / (mwh_to_twh * n_iterations)
+        self.accelerations = np.asarray(accelerations, dtype=float)
+        self.risk_reductions = np.asarray(risk_reductions, dtype=float)
+        n_tracked = len(tree.tracked_indices)
+        self.baseline = np.full((n_tracked, n_years), np.nan)
+        self.acceleration = np.full((n_tracked, n_years, len(accelerations)), np.nan)
+        self.risk = np.full((n_tracked, n_years, len(risk_reductions)), np.nan)
+        self.remaining = np.full((n_tracked, n_years), np.nan)
+        self.risk_step = None
+
+    def __call__(self, y, state, in_progress):
+        if self.risk_step is None:
+            self.risk_step = (1 - self.tree.init_prob)[:, None] / state.initial_time
+        if not in_progress:
+            return
+        base_times, base_probs = self.solver.solve(state)
+        accelerations = self.accelerations[:, None]
+        risk_reductions = self.risk_reductions[:, None]
+        n_acc = len(self.accelerations)
+        n_points = n_acc + len(self.risk_reductions)
+        for k, i, rows in in_progress:
+            affected = self.reach.concepts_of(i)
+            if not affected:
+                continue
+            remaining = state.time_remaining[i, rows]
+            prob = state.prob_of_success[i, rows]
+            risk_left = 1.0 - prob
+            # (points, rows) deltas: accelerations first, then risk reductions;
+            # an acceleration that finishes the node only removes the work left
+            acc_prob = np.where(remaining - accelerations <= 0, risk_left,
+                                np.minimum(accelerations * self.risk_step[i, rows], risk_left))
+            time_delta = np.concatenate([-np.minimum(accelerations, np.maximum(remaining, 0.0)),
+                                         np.zeros((len(self.risk_reductions), len(rows)))])
+            prob_delta = np.concatenate([acc_prob, risk_reductions * risk_left])
+            times, probs = self.solver.overlay(self.reach, state, i, np.tile(rows, n_points),
+                                               time_delta.ravel(), prob_delta.ravel())
+
+            baseline = np.zeros(len(rows))
+            perturbed = np.zeros(n_points * len(rows))
+            for c in affected:
+                baseline += self.valuation(self.start_year + base_times[c, rows]) * base_probs[c, rows]
+                perturbed += self.valuation(self.start_year + times[c]) * probs[c]
+            delta = (perturbed.reshape(n_points, len(rows)) - baseline).sum(axis=1) * self.scale
+            self.baseline[k, y] = baseline.sum() * self.scale
+            self.remaining[k, y] = remaining.max()
+            self.acceleration[k, y] = delta[:n_acc]
+            self.risk[k, y] = delta[n_acc:]
+
+
+def compute_response_curves(tree, reach, solver, samples, years_to_simulate, start_year, valuation,
+                            mwh_to_twh, accelerations=DEFAULT_ACCELERATIONS,
+                            risk_reductions=DEFAULT_RISK_REDUCTIONS):
+    """Response curves of every tracked node over the baseline run of ``samples``."""
+    accelerations = tuple(float(a) for a in accelerations)
+    risk_reductions = tuple(float(r) for r in risk_reductions)
+    if any(a <= 0 for a in accelerations):
+        raise ValueError(f"accelerations must be positive, got {accelerations}")
+    if any(not 0 < r <= 1 for r in risk_reductions):
+        raise ValueError(f"risk reductions must be in (0, 1], got {risk_reductions}")
+    recorder = _CurveRecorder(tree, reach, solver, start_year, valuation, mwh_to_twh, samples.n_iterations,
+                              years_to_simulate, accelerations, risk_reductions)
+    batch = simulate_batch(tree, reach, solver, samples, years_to_simulate, start_year, valuation,
+                           mwh_to_twh, compute_impact=False, allocate=recorder)
+    return ResponseCurves(tree, batch.years, accelerations, risk_reductions, recorder.baseline,
+                          recorder.acceleration, recorder.risk, recorder.remaining)
@@ -0,0 +1,138 @@
+"""
+result_cache.py
+---------------
+Content-addressed cache for simulation outputs.
+
+A cache key is the SHA-256 of three canonical parts:
+
+* the parsed tech tree, serialised with sorted keys (so whitespace, key order
+  and file encoding do not matter, while node/edge order, which the
+  simulation depends on, does),
+* the simulation parameters (options, iterations, years, seeds, ...),
+* the code version: a hash of the simulation modules' source files. Git
+  commits that only touch outputs or the frontend leave it unchanged.
+
+Each entry is a directory ``<root>/<key[:2]>/<key>/`` holding a copy of the
+output files plus ``entry.json``. Hits refresh the entry's mtime, and
+``prune`` drops entries by age and then least-recently-used ones until the
+cache fits a size budget.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+ENTRY_FILE = "entry.json"
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def canonical_json(value):
+    """Deterministic JSON encoding used for hashing."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def tree_digest(tech_tree):
+    """Hash of the parsed tree, independent of formatting and key order."""
+    return _sha256(canonical_json(tech_tree).encode("utf-8"))
+
+
+def code_version(*source_dirs):
+    """Hash of the ``*.py`` files in ``source_dirs`` (names and contents)."""
+    digest = hashlib.sha256()
+    files = sorted({p.resolve() for d in source_dirs for p in Path(d).glob("*.py")})
+    for path in files:
+        digest.update(path.name.encode("utf-8") + b"\0")
+        digest.update(path.read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+def cache_key(tree_hash, params, version):
+    """Key for one run: tree hash, simulation parameters and code version."""
+    return _sha256(canonical_json({"tree": tree_hash, "params": params, "code": version}).encode("utf-8"))
+
+
+def _dir_size(path):
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class ResultCache:
+    """Directory of cached output sets, addressed by ``cache_key``."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def entry_path(self, key):
+        return self.root / key[:2] / key
+
+    def entries(self):
+        return [p.parent for p in self.root.glob(f"*/*/{ENTRY_FILE}")]
+
+    def restore(self, key, dest_dir):
+        """Copy the outputs cached under ``key`` into ``dest_dir``; False on a miss."""
+        entry = self.entry_path(key)
+        manifest = entry / ENTRY_FILE
+        if not manifest.exists():
+            return False
+        with open(manifest) as f:
+            files = json.load(f)["files"]
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            source = entry / name
+            target = dest_dir / name
+            if source.is_dir():
+                shutil.rmtree(target, ignore_errors=True)
+                shutil.copytree(source, target)
+            else:
+                shutil.copy2(source, target)
+        os.utime(manifest)  # recently used
+        return True
+
+    def store(self, key, source_dir, files, info=None):
+        """Cache ``files`` (names relative to ``source_dir``, files or directories) under ``key``."""
+        entry = self.entry_path(key)
+        staging = entry.with_name(f"{key}.tmp{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name in files:
+            source = Path(source_dir) / name
+            if source.is_dir():
+                shutil.copytree(source, staging / name)
+            else:
+                shutil.copy2(source, staging / name)
+        with open(staging / ENTRY_FILE, "w") as f:
+            json.dump({"key": key, "created": time.time(), "files": list(files), **(info or {})}, f, indent=2)
+        # Publish atomically; a concurrent writer of the same key wins harmlessly
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            staging.rename(entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def prune(self, max_age_days=None, max_bytes=None):
+        """Remove entries unused for ``max_age_days``, then LRU entries beyond ``max_bytes``; returns count removed."""
+        now = time.time()
+        entries = sorted(((p / ENTRY_FILE).stat().st_mtime, p) for p in self.entries())
+        removed = 0
+        if max_age_days is not None:
+            cutoff = now - max_age_days * 86400
+            for used, path in [e for e in entries if e[0] < cutoff]:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+            entries = [e for e in entries if e[0] >= cutoff]
+        if max_bytes is not None:
+            sizes = {path: _dir_size(path) for _, path in entries}
+            total = sum(sizes.values())
+            for _, path in entries:
+                if total <= max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= sizes[path]
+                removed += 1
+        return removed
@@ -0,0 +1,126 @@
+"""
+run_columns.py
+--------------
+Columnar Monte Carlo results for one option, built straight from a
+``BatchResult``.
+
+Everything is held in preallocated NumPy arrays indexed by (iteration, node,
+year): status as the batch engine's int8 STATUS_* codes, impact in TWh with
+NaN where nothing was recorded, and the random number of each (iteration,
+node) pair (constant over years), with the per-iteration global draw
+(option_1/option_3) alongside. Node labels are a ``pd.Categorical`` whose
+codes index the node axis. The long (Iteration, Node, Year, ...) table the
+runner used to assemble from per-iteration dicts and two ``pd.merge`` calls is
+only materialised on request (``to_frame``); the stats read the
+completion-year frame, which is derived from the arrays directly.
+
+As in the dict tables, nodes sharing a label collapse onto one column holding
+the values of the last such node.
+"""
+
+import numpy as np
+import pandas as pd
+
+from batch_engine import STATUS_COMPLETED, STATUS_LABELS
+
+# Name of the per-node random number column in the runner's frames
+RANDOM_NUMBER_COLUMNS = {'option_1': "YearsPerTRL", 'option_2': "RandomDelay", 'option_3': "RandomDelay"}
+
+
+class RunColumns:
+    """(iteration, node, year) arrays of one Monte Carlo option."""
+
+    __slots__ = ("option", "nodes", "years", "status", "impact_twh", "random_number", "years_per_trl")
+
+    def __init__(self, option, nodes, years, status, impact_twh, random_number, years_per_trl=None):
+        self.option = option
+        self.nodes = nodes
+        self.years = years
+        self.status = status
+        self.impact_twh = impact_twh
+        self.random_number = random_number
+        self.years_per_trl = years_per_trl
+
+    @property
+    def n_iterations(self):
+        return self.status.shape[0]
+
+    @classmethod
+    def from_batch(cls, batch, option=None):
+        """Columns of ``batch``; the arrays are views unless labels repeat."""
+        tree = batch.tree
+        samples = batch.samples
+        option = option or samples.option
+        labels = batch.tracked_labels
+
+        last_column = {label: k for k, label in enumerate(labels)}
+        unique_labels = list(last_column)
+        columns = list(last_column.values())
+        if columns == list(range(len(labels))):
+            columns = slice(None)
+        status = batch.status[:, columns]
+        impact_twh = batch.impact_twh[:, columns]
+
+        # Random number per label: last sampled node carrying it, as in the dict tables
+        sampled_position = {tree.labels[i]: p for p, i in enumerate(np.flatnonzero(tree.trl_parsed))}
+        random_number = np.full((batch.n_iterations, len(unique_labels)), np.nan)
+        have = [k for k, label in enumerate(unique_labels) if label in sampled_position]
+        positions = [sampled_position[unique_labels[k]] for k in have]
+        if option == 'option_1':
+            random_number[:, have] = np.asarray(samples.years_per_trl, dtype=float)[:, None]
+        elif option in ('option_2', 'option_3'):
+            random_number[:, have] = samples.random_delays[:, positions]
+
+        years_per_trl = None
+        if samples.years_per_trl is not None:
+            years_per_trl = np.asarray(samples.years_per_trl, dtype=float)
+        nodes = pd.Categorical(unique_labels, categories=unique_labels)
+        return cls(option, nodes, batch.years, status, impact_twh, random_number, years_per_trl)
+
+    def completion_years(self):
+        """(iterations, nodes) first year with status Completed, or -1 if never completed."""
+        completed = self.status == STATUS_COMPLETED
+        first = completed.argmax(axis=2)
+        return np.where(completed.any(axis=2), self.years[first], -1)
+
+    def completed_frame(self):
+        """
+        One row per (node, iteration) that completes: Node, Iteration (1-based),
+        the first completion Year and the random-number column(s), sorted by
+        node label and iteration.
+        """
+        completion = self.completion_years()
+        labels = np.asarray(self.nodes.categories, dtype=object)
+        order = np.argsort(labels, kind='stable')
+        node_pos, iteration = np.nonzero(completion[:, order].T >= 0)
+        node = order[node_pos]
+        frame = pd.DataFrame({
+            'Node': labels[node],
+            'Iteration': iteration + 1,
+            'Year': completion[iteration, node].astype(np.int64),
+        })
+        column = RANDOM_NUMBER_COLUMNS.get(self.option)
+        if column:
+            frame[column] = self.random_number[iteration, node]
+        if self.option == 'option_3':
+            frame['YearsPerTRL'] = self.years_per_trl[iteration]
+        return frame
+
+    def to_frame(self):
+        """Long (Iteration, Node, Year, Status, Value, <random number>...) table of every cell."""
+        n_iter, n_nodes, n_years = self.status.shape
+        iteration = np.repeat(np.arange(1, n_iter + 1), n_nodes * n_years)
+        node = np.tile(np.repeat(np.arange(n_nodes), n_years), n_iter)
+        frame = pd.DataFrame({
+            'Iteration': iteration,
+            'Node': pd.Categorical.from_codes(node, dtype=self.nodes.dtype),
+            'Year': np.tile(self.years, n_iter * n_nodes),
+            'Status': pd.Categorical.from_codes(self.status.reshape(-1), categories=list(STATUS_LABELS)),
+            'Value': self.impact_twh.reshape(-1),
+        })
+        column = RANDOM_NUMBER_COLUMNS.get(self.option)
+        if column:
+            frame[column] = np.repeat(self.random_number.reshape(-1), n_years)
+        if self.option == 'option_3':
+            frame['YearsPerTRL'] = self.years_per_trl[iteration - 1]
+        return frame
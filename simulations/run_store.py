@@ -0,0 +1,196 @@
+"""
+run_store.py
+------------
+Memory-mapped columnar store for the per-iteration results of one MCS option.
+
+A store is a directory holding one ``.npy`` file per column plus a small
+``manifest.json``:
+
+    completion_year.npy   int16  (nodes, iterations)  first Completed year, -1 if never
+    RandomDelay.npy       float  (nodes, iterations)  local draws (option_2/option_3)
+    YearsPerTRL.npy       float  (iterations,)        global draw (option_1/option_3)
+    sampled.npy           bool   (nodes,)             node has a random number
+
+Plain ``.npy`` files (rather than an ``.npz`` archive) can be opened with
+``mmap_mode='r'``, so a query only pages in the columns, and within them the
+node rows, it touches. Nodes are stored sorted by label. The
+``simulation_runs_*.json`` records are an on-demand view (``to_json``).
+
+Usage:
+    python run_store.py <store_dir> --json simulation_runs_option3.json
+    python run_store.py <store_dir> --node "<label>" [--before 2040]
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORMAT = "mcs-run-store"
+VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class RunStore:
+    """Read access to a run store directory; columns are memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT:
+            raise ValueError(f"{self.path} is not a run store")
+        if self.manifest.get("version") != VERSION:
+            raise ValueError(f"unsupported run store version {self.manifest.get('version')} in {self.path}")
+        self.option = self.manifest["option"]
+        self.nodes = self.manifest["nodes"]
+        self.n_iterations = self.manifest["n_iterations"]
+        self.node_index = {label: k for k, label in enumerate(self.nodes)}
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    def column(self, name):
+        """Memory-mapped column ``name``."""
+        array = self._columns.get(name)
+        if array is None:
+            if name not in self.manifest["columns"]:
+                raise KeyError(f"column {name!r} not in run store {self.path}")
+            array = np.load(self.path / self.manifest["columns"][name]["file"], mmap_mode='r')
+            self._columns[name] = array
+        return array
+
+    def _row(self, node):
+        try:
+            return self.node_index[node]
+        except KeyError:
+            raise KeyError(f"node {node!r} not in run store {self.path}") from None
+
+    # -- queries -------------------------------------------------------------
+
+    def completion_years(self, node):
+        """Completion year of ``node`` per iteration (-1 where it never completes)."""
+        return np.asarray(self.column("completion_year")[self._row(node)])
+
+    def distribution(self, node):
+        """{year: count} over the iterations in which ``node`` completes, years in first-seen order."""
+        years = self.completion_years(node)
+        years = years[years >= 0]
+        values, first, counts = np.unique(years, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        return dict(zip(values[order].tolist(), counts[order].tolist()))
+
+    def distributions(self):
+        """label -> {"year": count} for every node that completes, as in ``distributions_*.json``."""
+        result = {}
+        for node in self.nodes:
+            distribution = self.distribution(node)
+            if distribution:
+                result[node] = {str(year): count for year, count in distribution.items()}
+        return result
+
+    def completes_before(self, node, year):
+        """1-based iterations in which ``node`` completes in a year before ``year``."""
+        years = self.completion_years(node)
+        return np.flatnonzero((years >= 0) & (years < year)) + 1
+
+    def parameters(self, iteration):
+        """
+        Sampled inputs of 1-based ``iteration``: ``YearsPerTRL`` (scalar) and/or
+        ``RandomDelay`` (array over ``nodes``, NaN where not sampled).
+        """
+        params = {}
+        if "YearsPerTRL" in self.manifest["columns"]:
+            params["YearsPerTRL"] = float(self.column("YearsPerTRL")[iteration - 1])
+        if "RandomDelay" in self.manifest["columns"]:
+            params["RandomDelay"] = np.asarray(self.column("RandomDelay")[:, iteration - 1])
+        return params
+
+    # -- JSON view -----------------------------------------------------------
+
+    def to_frame(self):
+        """Completion records (Node, Iteration, Year, <random numbers>) as in ``simulation_runs_*.json``."""
+        completion = np.asarray(self.column("completion_year"))
+        node, iteration = np.nonzero(completion >= 0)
+        frame = pd.DataFrame({
+            'Node': np.asarray(self.nodes, dtype=object)[node],
+            'Iteration': iteration + 1,
+            'Year': completion[node, iteration].astype(np.int64),
+        })
+        sampled = np.asarray(self.column("sampled"))[node]
+        if self.option == 'option_1':
+            frame['YearsPerTRL'] = np.where(sampled, self.column("YearsPerTRL")[iteration], np.nan)
+        if self.option in ('option_2', 'option_3'):
+            frame['RandomDelay'] = np.asarray(self.column("RandomDelay"))[node, iteration]
+        if self.option == 'option_3':
+            frame['YearsPerTRL'] = np.asarray(self.column("YearsPerTRL"))[iteration]
+        return frame
+
+    def to_json(self, path):
+        """Write the ``simulation_runs_*.json`` view of the store."""
+        with open(path, "w") as f:
+            json.dump(json.loads(self.to_frame().to_json(orient="records")), f, indent=2)
+
+
+def write_run_store(path, runs):
+    """Write the ``RunColumns`` of one option as a run store at ``path``; returns a ``RunStore``."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    labels = np.asarray(runs.nodes.categories, dtype=object)
+    order = np.argsort(labels, kind='stable')
+    random_number = runs.random_number[:, order].T
+
+    columns = {"completion_year": runs.completion_years()[:, order].T.astype(np.int16),
+               "sampled": ~np.isnan(random_number).all(axis=1)}
+    if runs.option in ('option_2', 'option_3'):
+        columns["RandomDelay"] = random_number
+    if runs.years_per_trl is not None:
+        columns["YearsPerTRL"] = np.asarray(runs.years_per_trl, dtype=float)
+
+    manifest_columns = {}
+    for name, array in columns.items():
+        array = np.ascontiguousarray(array)
+        np.save(path / f"{name}.npy", array)
+        manifest_columns[name] = {"file": f"{name}.npy", "dtype": str(array.dtype), "shape": list(array.shape)}
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "option": runs.option,
+        "nodes": labels[order].tolist(),
+        "n_iterations": int(runs.n_iterations),
+        "years": [int(runs.years[0]), int(runs.years[-1])],
+        "columns": manifest_columns,
+    }
+    with open(path / MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return RunStore(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or export an MCS run store.")
+    parser.add_argument("store", help="Path to the run store directory.")
+    parser.add_argument("--json", help="Write the simulation_runs JSON view to this path.")
+    parser.add_argument("--node", help="Print the completion-year distribution of this node.")
+    parser.add_argument("--before", type=int,
+                        help="With --node: print the iterations completing before this year.")
+    args = parser.parse_args()
+
+    store = RunStore(args.store)
+    if args.json:
+        store.to_json(args.json)
+        print(f"Wrote {args.json}")
+    if args.node:
+        print(json.dumps(store.distribution(args.node), indent=2))
+        if args.before is not None:
+            print(store.completes_before(args.node, args.before).tolist())
+    if not (args.json or args.node):
+        print(f"{store.option}: {len(store.nodes)} nodes x {store.n_iterations} iterations, "
+              f"columns {', '.join(store.columns)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,14 +43,30 @@ Options:
     --years        Years to simulate (default: 30)
     --output-dir   Root output directory (default: ./public/outputs)
     --sim-path     Directory containing simulation.py (default: ./simulations)
+    --concept-types  Comma-separated node types valued as pathway endpoints
+                     (default: ReactorConcept,HydroConcept,WindConcept,SolarConcept)
+    --incremental  Diff the tree against the previous run and recompute only the rows
+                   of nodes the edit can affect; the previous run's state is kept
+                   outside the (public) output directory, see --state-dir
+    --state-dir    Directory for the --incremental state files (default: next to the
+                   compiled-tree cache, ~/.cache/investment-tech-tree/deterministic_state)
+    --strict       Reject trees with validation warnings (see tree_loader.py)
+    --no-tree-cache  Always compile the tree instead of using the compiled-tree cache
+    --response-curves  Also write response_curves.json: per node and Active year, the
+                     delta TWh for accelerations of --accelerations years and for
+                     removing --risk-reductions of the remaining risk
 """
 
 import argparse
+import hashlib
 import json
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+# Written into the output directory by earlier versions; removed when found
+LEGACY_STATE_FILE = "deterministic_state.json"
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -77,27 +93,50 @@ def parse_args():
         default="./simulations",
         help="Path to directory containing baseline_simulation.py.",
     )
-    return parser.parse_args()
-
-
-def load_tech_tree(path: Path) -> dict:
-    """Load and return a tech tree JSON, handling Python-dict format if needed."""
-    raw = path.read_text(encoding="utf-8")
-
-    # Attempt plain JSON first
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        pass
-
-    # Fall back: convert Python dict literal syntax (single quotes, True/False/None)
-    converted = (
-        raw.replace("'", '"')
-           .replace(": True", ": true")
-           .replace(": False", ": false")
-           .replace(": None", ": null")
+    parser.add_argument(
+        "--concept-types",
+        default=None,
+        help="Comma-separated node types treated as deployable concepts "
+             "(default: the scheduler's CONCEPT_TYPES).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the previous run's rows for nodes the tree edits cannot affect "
+             "(falls back to a full run when there is no comparable previous state).",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Reject trees with validation warnings (dangling edge endpoints, duplicate labels or edges).",
+    )
+    parser.add_argument(
+        "--no-tree-cache",
+        action="store_true",
+        help="Always compile the tree instead of using the compiled-tree cache.",
     )
-    return json.loads(converted)
+    parser.add_argument(
+        "--state-dir",
+        default=None,
+        help="Directory for the --incremental state files (default: next to the compiled-tree cache).",
+    )
+    parser.add_argument(
+        "--response-curves",
+        action="store_true",
+        help="Also write response_curves.json (acceleration and risk-reduction curves per node and year).",
+    )
+    parser.add_argument(
+        "--accelerations",
+        default="0.5,1,2,3,4,5",
+        help="Comma-separated accelerations in years for --response-curves (default: 0.5,1,2,3,4,5).",
+    )
+    parser.add_argument(
+        "--risk-reductions",
+        default="0.1,0.25,0.5,0.75,1",
+        help="Comma-separated fractions of the remaining risk removed for --response-curves "
+             "(default: 0.1,0.25,0.5,0.75,1).",
+    )
+    return parser.parse_args()
 
 
 def build_analysis(scheduler, impact_table, status_table, baseline_mwh_table, accelerated_mwh_table) -> dict:
@@ -153,27 +192,114 @@ def build_analysis(scheduler, impact_table, status_table, baseline_mwh_table, ac
     return analysis
 
 
-def process_tree(tech_tree_path: Path, years: int, output_dir: Path, sim_path: Path) -> None:
+def state_path(state_dir: Path, dest_file: Path) -> Path:
+    """State file of the run writing ``dest_file`` (one per output location)."""
+    location = hashlib.sha256(str(dest_file.resolve()).encode("utf-8")).hexdigest()[:16]
+    return state_dir / f"{dest_file.parent.name}-{location}.json"
+
+
+def load_previous_run(state_file: Path, dest_file: Path):
+    """
+    (state, analysis) of the previous run, or None. The analysis must still be
+    the one that run wrote (it is checked against the recorded hash).
+    """
+    try:
+        with open(state_file, encoding="utf-8") as f:
+            state = json.load(f)
+        raw = dest_file.read_bytes()
+    except (OSError, ValueError):
+        return None
+    if state.get("analysis_sha256") != hashlib.sha256(raw).hexdigest():
+        return None
+    try:
+        return state, json.loads(raw)
+    except ValueError:
+        return None
+
+
+def plan_incremental(scheduler, state, previous):
+    """
+    Node indices whose rows must be recomputed, or None if the previous run
+    cannot be reused (different parameters or code, reordered nodes, ...).
+    """
+    from tree_diff import TreeChanges, dirty_nodes
+
+    if previous is None:
+        print("  No previous state found, running in full.")
+        return None
+    old_state, old_analysis = previous
+    if old_state.get("params") != state["params"] or old_state.get("code_version") != state["code_version"]:
+        print("  Parameters or simulation code changed, running in full.")
+        return None
+    changes = TreeChanges(old_state["fingerprint"], state["fingerprint"])
+    tree = scheduler.tree
+    tracked_labels = [tree.labels[i] for i in tree.tracked_indices]
+    if not changes.comparable or changes.reordered or len(set(tracked_labels)) != len(tracked_labels):
+        print("  Node order or state format changed, running in full.")
+        return None
+
+    dirty = set(dirty_nodes(tree, scheduler.reachability, changes))
+    # Rows missing from the previous output are computed as well
+    dirty.update(i for i in tree.tracked_indices.tolist() if tree.labels[i] not in old_analysis)
+    dirty_tracked = sorted(i for i in dirty if tree.is_tracked[i])
+    print(f"  Incremental: {changes.summary()} -> recomputing {len(dirty_tracked)} of "
+          f"{len(tracked_labels)} tracked nodes.")
+    return dirty_tracked
+
+
+def process_tree(tech_tree_path: Path, years: int, output_dir: Path, sim_path: Path,
+                 concept_types=None, incremental=False, strict=False, tree_cache=True,
+                 loaded=None, response_curves=None, state_dir=None) -> None:
+    """
+    Write deterministic_analysis.json for one tree (``loaded``: a ``LoadedTree``
+    to reuse). ``response_curves`` = (accelerations, risk reductions) also
+    writes response_curves.json. The state for ``incremental`` runs goes to
+    ``state_dir`` (default: next to the compiled-tree cache).
+    """
     print(f"\n{'='*60}")
     print(f"Processing: {tech_tree_path}")
 
-    # Add simulation directory to path so we can import NuclearScheduler
-    sys.path.insert(0, str(sim_path.resolve()))
-    from baseline_simulation import NuclearScheduler  # noqa: E402
-
-    # Load tech tree
-    print(f"  Loading tech tree...")
-    tech_tree = load_tech_tree(tech_tree_path)
+    # The simulation directory is on sys.path (see main)
+    from baseline_simulation import NuclearScheduler, CONCEPT_TYPES, CURRENT_YEAR  # noqa: E402
+    from result_cache import code_version  # noqa: E402
+    from tree_diff import tree_fingerprint  # noqa: E402
+    from tree_loader import DEFAULT_CACHE_DIR, load_tree  # noqa: E402
+
+    # Load, validate and compile the tech tree
+    print("  Loading tech tree...")
+    if loaded is None:
+        loaded = load_tree(tech_tree_path, concept_types or CONCEPT_TYPES,
+                           cache_dir=DEFAULT_CACHE_DIR if tree_cache else None, strict=strict)
+    for issue in loaded.warnings:
+        print(f"  WARNING: {issue.message}")
+    tech_tree = loaded.graph_data
     node_count = len(tech_tree["graph"]["nodes"])
     edge_count = len(tech_tree["graph"]["edges"])
-    print(f"  Loaded {node_count} nodes, {edge_count} edges.")
+    print(f"  Loaded {node_count} nodes, {edge_count} edges"
+          f"{' (compiled tree from cache)' if loaded.from_cache else ''}.")
 
-    # Run deterministic simulation (option=None → uses (9 - trl) * 2.5 per node)
+    tree_name = tech_tree_path.stem
+    dest_dir = output_dir / tree_name
+    dest_file = dest_dir / "deterministic_analysis.json"
+    state_file = state_path(Path(state_dir) if state_dir else DEFAULT_CACHE_DIR.parent / "deterministic_state",
+                            dest_file)
+    scheduler = loaded.scheduler(NuclearScheduler)
+    state = {
+        "fingerprint": tree_fingerprint(tech_tree),
+        # The yearly keys start at the current year, so a new year forces a full run
+        "params": {"years": years, "start_year": CURRENT_YEAR,
+                   "concept_types": list(scheduler.tree.concept_types)},
+        "code_version": code_version(sim_path),
+    }
+    previous = load_previous_run(state_file, dest_file) if incremental else None
+    dirty = plan_incremental(scheduler, state, previous) if incremental else None
+
+    # Run deterministic simulation (option=None → uses (9 - trl) * 2.5 per node).
+    # Status is always simulated for every node; in incremental mode only the
+    # dirty nodes get their pathway impacts evaluated.
     print(f"  Running deterministic simulation ({years} years)...")
-    scheduler = NuclearScheduler(tech_tree)
-    impact_table, status_table, _rng_table, _lhc_seed, baseline_mwh_table, accelerated_mwh_table = (
-        scheduler.run_simulation(years_to_simulate=years, option=None)
-    )
+    result = scheduler.run_batch(1, option=None, years_to_simulate=years, impact_nodes=dirty)
+    impact_table, status_table, _rng_table, baseline_mwh_table, accelerated_mwh_table = result.to_tables(0)
 
     milestone_count = sum(
         1 for n in tech_tree["graph"]["nodes"]
@@ -182,10 +308,17 @@ def process_tree(tech_tree_path: Path, years: int, output_dir: Path, sim_path: P
     print(f"  Simulation complete. {milestone_count} Milestone/EnablingTechnology nodes tracked.")
 
     # Build consolidated analysis dict
-    print(f"  Building consolidated analysis...")
+    print("  Building consolidated analysis...")
     analysis = build_analysis(
         scheduler, impact_table, status_table, baseline_mwh_table, accelerated_mwh_table
     )
+    if dirty is not None:
+        # Clean rows: same timeline and values as before, downstream counts are fresh
+        recomputed = {scheduler.tree.labels[i] for i in dirty}
+        old_analysis = previous[1]
+        for label, row in analysis.items():
+            if label not in recomputed:
+                row["yearly"] = old_analysis[label]["yearly"]
 
     # Add metadata block
     metadata = {
@@ -198,32 +331,78 @@ def process_tree(tech_tree_path: Path, years: int, output_dir: Path, sim_path: P
             "node_count": node_count,
             "edge_count": edge_count,
             "tracked_nodes": milestone_count,
+            "incremental": dirty is not None,
+            "recomputed_nodes": milestone_count if dirty is None else len(dirty),
         }
     }
     output = {**metadata, **analysis}
 
     # Write output
-    tree_name = tech_tree_path.stem
-    dest_dir = output_dir / tree_name
     dest_dir.mkdir(parents=True, exist_ok=True)
-    dest_file = dest_dir / "deterministic_analysis.json"
+    raw = json.dumps(output, indent=2).encode("utf-8")
 
     print(f"  Writing → {dest_file}")
-    with open(dest_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2)
+    dest_file.write_bytes(raw)
+
+    # Tree fingerprint for the next --incremental run, kept out of the public outputs
+    state["analysis_sha256"] = hashlib.sha256(raw).hexdigest()
+    try:
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(state_file, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    except OSError as exc:
+        print(f"  WARNING: could not write the incremental state ({exc}); the next run will be full.")
+    (dest_dir / LEGACY_STATE_FILE).unlink(missing_ok=True)
 
     size_kb = dest_file.stat().st_size / 1024
     print(f"  Done. File size: {size_kb:.1f} KB")
 
+    if response_curves is not None:
+        accelerations, risk_reductions = response_curves
+        print(f"  Computing response curves ({len(accelerations)} accelerations, "
+              f"{len(risk_reductions)} risk reductions)...")
+        curves = scheduler.run_response_curves(accelerations, risk_reductions, years_to_simulate=years)
+        # Accelerating past the work left can't gain more: the curves must be flat there
+        violations = curves.saturation_violations()
+        for label, year, values in violations[:5]:
+            print(f"  WARNING: {label} ({year}) keeps changing after completion: {values}", file=sys.stderr)
+        if violations:
+            raise RuntimeError(f"{len(violations)} response curves do not saturate at node completion")
+        curves_file = dest_dir / "response_curves.json"
+        output = {
+            "__meta__": {
+                "tree_name": tech_tree_path.stem,
+                "source_file": str(tech_tree_path),
+                "years_simulated": years,
+                "simulation_option": "deterministic",
+                "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+                "accelerations_years": list(curves.accelerations),
+                "risk_reductions": list(curves.risk_reductions),
+                "values": "delta TWh of the node's downstream pathways, in the order of "
+                          "accelerations_years (accelerate) and risk_reductions (risk)",
+            },
+            **curves.to_dict(),
+        }
+        print(f"  Writing → {curves_file}")
+        with open(curves_file, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
 
 def main():
     args = parse_args()
     sim_path = Path(args.sim_path)
     output_dir = Path(args.output_dir)
+    concept_types = tuple(t.strip() for t in args.concept_types.split(",")) if args.concept_types else None
+    response_curves = None
+    if args.response_curves:
+        response_curves = (tuple(float(a) for a in args.accelerations.split(",")),
+                           tuple(float(r) for r in args.risk_reductions.split(",")))
 
     if not sim_path.exists():
         print(f"ERROR: simulation directory not found: {sim_path}", file=sys.stderr)
         sys.exit(1)
+    # Add simulation directory to path (once) so we can import NuclearScheduler
+    sys.path.insert(0, str(sim_path.resolve()))
 
     errors = []
     for raw_path in args.tech_tree_paths:
@@ -233,7 +412,9 @@ def main():
             errors.append(raw_path)
             continue
         try:
-            process_tree(path, args.years, output_dir, sim_path)
+            process_tree(path, args.years, output_dir, sim_path, concept_types, args.incremental,
+                         strict=args.strict, tree_cache=not args.no_tree_cache,
+                         response_curves=response_curves, state_dir=args.state_dir)
         except Exception as exc:
             print(f"ERROR processing {path}: {exc}", file=sys.stderr)
             errors.append(raw_path)
@@ -243,7 +424,7 @@ def main():
         print(f"Completed with {len(errors)} error(s): {errors}")
         sys.exit(1)
     else:
-        print(f"All trees processed successfully.")
+        print("All trees processed successfully.")
 
 
 if __name__ == "__main__":
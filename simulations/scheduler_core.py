@@ -0,0 +1,225 @@
+"""
+scheduler_core.py
+-----------------
+Shared implementation behind ``simulation.NuclearScheduler`` (MCS runner) and
+``baseline_simulation.NuclearScheduler`` (deterministic analysis). The two
+modules only differ in what ``run_simulation`` returns.
+
+The tech tree is compiled once in ``__init__`` (see ``compiled_tree.py``); each
+run works on a ``SimState`` of flat arrays instead of deep-copied node dicts.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from scipy.stats import triang
+
+from batch_engine import BatchSamples, draw_samples, lhs_point_stream, simulate_batch, simulate_options
+from critical_path import CriticalPathSolver
+from event_engine import simulate_events
+from compiled_tree import CONCEPT_TYPES, CompiledTree, parse_trl_key
+from instrumentation import INSTRUMENTS
+from portfolio_optimizer import optimise_portfolio
+from reachability import ReachabilityIndex
+from response_curves import DEFAULT_ACCELERATIONS, DEFAULT_RISK_REDUCTIONS, compute_response_curves
+from valuation import DiscountedEnergyValuation
+
+# --- Model Configuration & Assumptions ---
+DISCOUNT_RATE = 0.05
+YEARS_OF_OPERATION = 60
+AVG_PLANT_CAPACITY_MW = 1000
+CAPACITY_FACTOR = 0.90
+CURRENT_YEAR = datetime.now().year
+TRL_PROBABILITY_MAP = {
+    "1": 0.10, "2": 0.20, "2-3": 0.25, "3": 0.30, "3-4": 0.40,
+    "4": 0.50, "4-5": 0.60, "5": 0.70, "5-6": 0.75, "6": 0.80,
+    "6-7": 0.85, "7": 0.90, "7-8": 0.95, "8": 0.98, "9": 1.0,
+    "default": 0.6
+}
+MWH_TO_TWH = 1_000_000
+
+
+class SchedulerCore:
+    """
+    Year-by-year tech tree scheduler working on the compiled graph.
+    R&D work on an Active node reduces both its remaining time and its risk;
+    impact is measured on the concepts downstream of that node only
+    (``concept_types``, reactor/hydro/wind/solar concepts by default).
+    """
+    def __init__(self, graph_data, concept_types=CONCEPT_TYPES, compiled=None):
+        """
+        ``compiled`` optionally passes a prebuilt (CompiledTree, ReachabilityIndex)
+        pair for ``graph_data``, e.g. from ``tree_loader.load_tree``.
+        """
+        self.nodes = {node['id']: node for node in graph_data['graph']['nodes']}
+        self.edges = graph_data['graph']['edges']
+        if compiled is None:
+            tree = CompiledTree(graph_data, TRL_PROBABILITY_MAP, concept_types=concept_types)
+            compiled = (tree, ReachabilityIndex(tree))
+        self.tree, self.reachability = compiled
+        self.dependencies = self._build_dependency_map()
+        self.successors = self._build_successor_map()
+        self.critical_paths = CriticalPathSolver(self.tree)
+        self.valuation = DiscountedEnergyValuation(
+            CURRENT_YEAR, DISCOUNT_RATE, YEARS_OF_OPERATION,
+            AVG_PLANT_CAPACITY_MW * CAPACITY_FACTOR * 24 * 365,
+        )
+
+    def _build_dependency_map(self):
+        """Node id -> prerequisite ids, in edge order (read off the compiled tree)."""
+        tree = self.tree
+        return {tree.ids[i]: [tree.ids[j] for j in tree.pred_lists[i]] for i in range(tree.n_nodes)}
+
+    def _build_successor_map(self):
+        """Node id -> successor ids (phantom endpoints included), in edge order."""
+        tree = self.tree
+        return {tree.ids[i]: [tree.ids[j] for j in tree.succ_lists[i]] for i in range(tree.n_nodes)}
+
+    def _get_downstream_concepts(self, start_node_id):
+        """Find all final concepts that depend on a given start node."""
+        return [self.tree.ids[i] for i in self.reachability.concepts_of(self.tree.index[start_node_id])]
+
+    def _get_initial_prob(self, node):
+        return TRL_PROBABILITY_MAP.get(parse_trl_key(node), TRL_PROBABILITY_MAP['default'])
+
+    def _calculate_discounted_mwh(self, deployment_year):
+        return self.valuation.scalar(deployment_year)
+
+    def _calculate_pathway_mwh(self, state, concept_indices):
+        """Calculates the total expected MWh for a specific list of concepts."""
+        times, probs = self.critical_paths.solve(state)
+        total_expected_mwh = 0
+        for concept_idx in concept_indices:
+            deployment_year = CURRENT_YEAR + float(times[concept_idx])
+            potential_mwh = self._calculate_discounted_mwh(deployment_year)
+            total_expected_mwh += potential_mwh * float(probs[concept_idx])
+        return total_expected_mwh
+
+    def _single_samples(self, option=None, random_number=None, lhc_seed=None, rng=None):
+        """
+        Draw the inputs of one ``run_simulation`` call as a one-iteration
+        BatchSamples. option_2 draws from ``rng`` if given, else from the
+        global NumPy state.
+        """
+        tree = self.tree
+        n_sampled = int(tree.trl_parsed.sum())
+        years_per_trl = None
+        random_delays = None
+
+        if option in ('option_1', 'option_3'):
+            years_per_trl = np.array([random_number])
+        if option == 'option_2':
+            random_delays = (rng or np.random).triangular(left=0, mode=2, right=5, size=(1, n_sampled))
+        elif option == 'option_3':
+            # Parameter der Dreiecksverteilung für lokale Zufallswerte
+            min2, mode2, max2 = 0.0, 2.0, 5.0
+            c2 = (mode2 - min2) / (max2 - min2)
+            # One-point LHS draws per node, in node order, then a single vectorised ppf
+            uniforms = lhs_point_stream(lhc_seed, n_sampled)
+            random_delays = triang.ppf(uniforms, c2, loc=min2, scale=(max2 - min2))[None, :]
+
+        return BatchSamples.from_draws(tree, option, 1, years_per_trl, random_delays)
+
+    def _simulate(self, years_to_simulate=30, option=None, random_number=None, lhc_seed=None, rng=None):
+        """
+        Run one simulation and return (impact, status, random_number, lhc_seed,
+        baseline_mwh, accelerated_mwh) tables keyed by node label and year.
+        """
+        with INSTRUMENTS.phase('sample'):
+            samples = self._single_samples(option, random_number, lhc_seed, rng)
+        result = self.run_batch(1, option=option, years_to_simulate=years_to_simulate, samples=samples)
+        impact_table, status_table, random_number_table, baseline_mwh_table, accelerated_mwh_table = (
+            result.to_tables(0)
+        )
+        return (impact_table, status_table, random_number_table, lhc_seed,
+                baseline_mwh_table, accelerated_mwh_table)
+
+    def run_batch(self, n_iterations, option=None, years_to_simulate=30, samples=None,
+                  compute_impact=True, impact_nodes=None):
+        """
+        Run ``n_iterations`` Monte Carlo iterations of ``option`` at once.
+
+        Without explicit ``samples`` the draws reproduce the streams of the
+        serial runner (see ``batch_engine.draw_samples``). Returns a
+        ``BatchResult`` with stacked (iterations, tracked nodes, years) status
+        and impact arrays. ``impact_nodes`` limits the impact evaluation to
+        those node indices (impacts of the other nodes stay NaN).
+        """
+        if samples is None:
+            with INSTRUMENTS.phase('sample'):
+                samples = draw_samples(self.tree, option, n_iterations)
+        return simulate_batch(
+            self.tree, self.reachability, self.critical_paths, samples, years_to_simulate, CURRENT_YEAR,
+            self.valuation, MWH_TO_TWH, compute_impact=compute_impact, impact_nodes=impact_nodes,
+        )
+
+    def run_events(self, n_iterations, option=None, samples=None, resolution=1.0):
+        """
+        Start and finish times of every node for ``n_iterations`` iterations
+        of ``option`` (see ``event_engine.py``), without stepping through the
+        years. With the default annual ``resolution`` the derived status
+        matches ``run_batch``; impacts are not computed.
+        """
+        if samples is None:
+            with INSTRUMENTS.phase('sample'):
+                samples = draw_samples(self.tree, option, n_iterations)
+        INSTRUMENTS.count('event_iterations', samples.n_iterations)
+        with INSTRUMENTS.phase('simulate'):
+            return simulate_events(self.tree, samples, CURRENT_YEAR, resolution=resolution)
+
+    def run_options(self, n_iterations, options, years_to_simulate=30, samples=None,
+                    compute_impact=True):
+        """
+        Run ``n_iterations`` of every option in ``options`` in one stacked batch.
+
+        ``samples`` optionally maps option -> ``BatchSamples``; missing options
+        are drawn as in ``run_batch``. Returns option -> ``BatchResult``, each
+        identical to a separate ``run_batch`` call with the same samples.
+        """
+        samples = dict(samples or {})
+        with INSTRUMENTS.phase('sample'):
+            samples_by_option = {
+                option: samples[option] if option in samples else draw_samples(self.tree, option, n_iterations)
+                for option in options
+            }
+        return simulate_options(
+            self.tree, self.reachability, self.critical_paths, samples_by_option, years_to_simulate,
+            CURRENT_YEAR, self.valuation, MWH_TO_TWH, compute_impact=compute_impact,
+        )
+
+    def run_response_curves(self, accelerations=DEFAULT_ACCELERATIONS, risk_reductions=DEFAULT_RISK_REDUCTIONS,
+                            years_to_simulate=30, option=None, n_iterations=1, samples=None):
+        """
+        Response of each Active node's downstream pathway TWh to every
+        acceleration (years) and risk reduction (fraction of remaining risk),
+        per year of the baseline run (see ``response_curves.py``). Returns a
+        ``ResponseCurves``.
+        """
+        if samples is None:
+            with INSTRUMENTS.phase('sample'):
+                samples = draw_samples(self.tree, option, n_iterations)
+        return compute_response_curves(
+            self.tree, self.reachability, self.critical_paths, samples, years_to_simulate, CURRENT_YEAR,
+            self.valuation, MWH_TO_TWH, accelerations=accelerations, risk_reductions=risk_reductions,
+        )
+
+    def optimise_acceleration(self, budget_per_year=None, total_budget=None, years_to_simulate=30,
+                              option=None, n_iterations=1, samples=None, max_units_per_node=1,
+                              candidates=None, lazy=True):
+        """
+        Allocate a budget of acceleration-years (``budget_per_year`` each year
+        and/or ``total_budget`` over the horizon) to the Active nodes that add
+        the most expected discounted TWh, applying the choices year by year
+        (see ``portfolio_optimizer.py``). ``candidates`` optionally limits the
+        nodes (ids) that may be accelerated. Returns a ``PortfolioResult``.
+        """
+        if samples is None:
+            with INSTRUMENTS.phase('sample'):
+                samples = draw_samples(self.tree, option, n_iterations)
+        if candidates is not None:
+            candidates = [self.tree.index[node_id] for node_id in candidates]
+        return optimise_portfolio(
+            self.tree, self.reachability, self.critical_paths, samples, years_to_simulate, CURRENT_YEAR,
+            self.valuation, MWH_TO_TWH, budget_per_year=budget_per_year, total_budget=total_budget,
+            max_units_per_node=max_units_per_node, candidates=candidates, lazy=lazy,
+        )
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+simulation_service.py
+---------------------
+Long-running deterministic simulation service for the dashboard.
+
+Trees are loaded once (``tree_loader.load_tree``) and their compiled
+structures and scheduler stay in memory; a registered tree file is reloaded
+when it changes on disk. Queries run the same engine as
+``save_baseline_simulation.py`` and answer what-if questions on top of the
+deterministic baseline:
+
+* ``years``            - horizon (default 30)
+* ``years_per_trl``    - years per missing TRL level (default 2.5)
+* ``accelerate``       - node id or label -> years of work removed from that
+  node (it starts with that much less remaining time)
+* ``start_year``, ``discount_rate``, ``years_of_operation``,
+  ``plant_capacity_mw``, ``capacity_factor`` - valuation overrides (defaults
+  from ``scheduler_core``)
+
+Responses are the ``/api/simulation`` shape (``impactData``/``statusData``,
+label -> year -> value) plus ``baselineData``/``acceleratedData`` in TWh and a
+``__meta__`` block. Encoded responses are kept in an LRU keyed by the tree's
+content hash, the concept types and the normalised parameters, so a repeated
+query is answered without simulating; identical queries in flight share one
+run. Trees are loaded on one worker thread and simulations run one at a
+time on another (the schedulers' critical-path caches are not thread-safe),
+so the event loop stays free to answer cached queries meanwhile.
+
+Endpoints (HTTP/1.1 over TCP or a Unix socket):
+
+    GET  /health                      status and cache counters
+    GET  /trees                       registered trees
+    GET  /simulate?tree=<name>&years=20&accelerate=<node>:2,<node>:1&discount_rate=0.07
+    POST /simulate                    JSON body with the same parameters, and
+                                      either "tree" or an inline "graph"
+
+Usage:
+    python simulations/simulation_service.py data/nuclear_tt.json data/fossil_fuel_tt_v2.json
+    python simulations/simulation_service.py data/*.json --unix-socket /tmp/techtree.sock
+    curl 'http://127.0.0.1:8765/simulate?tree=nuclear_tt&years=20'
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+MAX_BODY_BYTES = 64 * 2**20
+DEFAULT_YEARS_PER_TRL = 2.5
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class QueryError(ValueError):
+    """A query the service cannot answer (reported as ``status``)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def default_params():
+    """Parameters of the plain deterministic run."""
+    from scheduler_core import (AVG_PLANT_CAPACITY_MW, CAPACITY_FACTOR, CURRENT_YEAR, DISCOUNT_RATE,
+                                YEARS_OF_OPERATION)
+
+    return {
+        "years": 30,
+        "years_per_trl": DEFAULT_YEARS_PER_TRL,
+        "start_year": CURRENT_YEAR,
+        "discount_rate": DISCOUNT_RATE,
+        "years_of_operation": YEARS_OF_OPERATION,
+        "plant_capacity_mw": AVG_PLANT_CAPACITY_MW,
+        "capacity_factor": CAPACITY_FACTOR,
+        "accelerate": {},
+    }
+
+
+# name -> (type, lowest, highest); bounds are inclusive
+PARAM_RANGES = {
+    "years": (int, 1, 100),
+    "years_per_trl": (float, 0.1, 10.0),
+    "start_year": (int, 1900, 2200),
+    "discount_rate": (float, 0.0, 1.0),
+    "years_of_operation": (int, 1, 200),
+    "plant_capacity_mw": (float, 1e-6, 1e6),
+    "capacity_factor": (float, 1e-6, 1.0),
+}
+
+
+def _number(name, value, kind, low, high):
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"{name} must be a {'whole number' if kind is int else 'number'}, got {value!r}")
+    if kind is int and isinstance(value, float) and value != number:
+        raise QueryError(f"{name} must be a whole number, got {value!r}")
+    if not (math.isfinite(number) and low <= number <= high):
+        raise QueryError(f"{name} must be between {low} and {high}, got {value!r}")
+    return number
+
+
+def parse_accelerate(value):
+    """node -> years from a dict or from ``"node:years,node:years"`` strings."""
+    if isinstance(value, dict):
+        return dict(value)
+    pairs = {}
+    for item in [value] if isinstance(value, str) else list(value):
+        for part in filter(None, (p.strip() for p in item.split(","))):
+            node, sep, years = part.rpartition(":")
+            if not sep or not node:
+                raise QueryError(f"accelerate expects node:years pairs, got {part!r}")
+            pairs[node] = years
+    return pairs
+
+
+def normalise_params(raw):
+    """
+    All parameters with defaults filled in and values checked, so equivalent
+    queries share a cache entry. ``accelerate`` keys are still unresolved.
+    """
+    params = default_params()
+    unknown = sorted(set(raw) - set(params))
+    if unknown:
+        raise QueryError(f"unknown parameter(s): {', '.join(unknown)}")
+    for name, (kind, low, high) in PARAM_RANGES.items():
+        if raw.get(name) is not None:
+            params[name] = _number(name, raw[name], kind, low, high)
+    if raw.get("accelerate"):
+        params["accelerate"] = {
+            str(node): _number(f"accelerate[{node}]", years, float, 0.0, 1000.0)
+            for node, years in parse_accelerate(raw["accelerate"]).items()
+        }
+    return params
+
+
+def resolve_accelerate(tree, accelerate):
+    """Node id -> years for ``accelerate`` keyed by node id or label, ids sorted."""
+    by_label = {}
+    for i in range(tree.n_nodes):
+        by_label.setdefault(tree.labels[i], tree.ids[i])
+    resolved = {}
+    for node, years in accelerate.items():
+        node_id = node if tree.index.get(node, tree.n_nodes) < tree.n_nodes else by_label.get(node)
+        if node_id is None:
+            raise QueryError(f"accelerate: unknown node {node!r}")
+        resolved[node_id] = resolved.get(node_id, 0.0) + years
+    return dict(sorted(resolved.items()))
+
+
+def run_query(scheduler, params):
+    """Deterministic run of ``scheduler`` under resolved ``params``; returns the response dict."""
+    from batch_engine import BatchSamples, simulate_batch
+    from scheduler_core import MWH_TO_TWH
+    from valuation import DiscountedEnergyValuation
+
+    tree = scheduler.tree
+    # option_1 with a fixed years-per-TRL is the deterministic run for 2.5
+    initial_times = tree.initial_times('option_1', params["years_per_trl"])
+    for node_id, years in params["accelerate"].items():
+        i = tree.index[node_id]
+        initial_times[i] = max(initial_times[i] - years, 0.0)
+    valuation = DiscountedEnergyValuation(
+        params["start_year"], params["discount_rate"], params["years_of_operation"],
+        params["plant_capacity_mw"] * params["capacity_factor"] * 24 * 365,
+    )
+    result = simulate_batch(
+        tree, scheduler.reachability, scheduler.critical_paths, BatchSamples(None, initial_times[None]),
+        params["years"], params["start_year"], valuation, MWH_TO_TWH,
+    )
+    impact_table, status_table, _rng_table, baseline_table, accelerated_table = result.to_tables(0)
+    return {
+        "impactData": impact_table,
+        "statusData": status_table,
+        "baselineData": baseline_table,
+        "acceleratedData": accelerated_table,
+    }
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class WarmTree:
+    """A loaded tree with its scheduler, and the file state it was loaded from."""
+
+    __slots__ = ("name", "loaded", "scheduler", "stamp")
+
+    def __init__(self, name, loaded, scheduler, stamp=None):
+        self.name = name
+        self.loaded = loaded
+        self.scheduler = scheduler
+        self.stamp = stamp
+
+    def describe(self):
+        graph = self.loaded.graph_data["graph"]
+        return {
+            "name": self.name,
+            "source": str(self.loaded.path),
+            "digest": self.loaded.digest,
+            "nodes": len(graph["nodes"]),
+            "edges": len(graph["edges"]),
+            "warnings": [issue.message for issue in self.loaded.warnings],
+        }
+
+
+class SimulationService:
+    """
+    Warm trees plus an LRU of encoded responses. ``simulate`` is the
+    in-process entry point; ``serve`` exposes it over HTTP.
+    """
+
+    def __init__(self, tree_paths=(), concept_types=None, cache_size=256, inline_trees=8,
+                 strict=False, tree_cache=True):
+        from scheduler_core import CONCEPT_TYPES
+        from tree_loader import DEFAULT_CACHE_DIR
+
+        self.paths = {Path(p).stem: Path(p) for p in tree_paths}
+        self.concept_types = tuple(concept_types or CONCEPT_TYPES)
+        self.strict = strict
+        self.cache_dir = DEFAULT_CACHE_DIR if tree_cache else None
+        self.results = LRUCache(cache_size)
+        self.inline = LRUCache(inline_trees)
+        self.trees = {}
+        self.simulations = 0
+        self._pending = {}
+        # Trees are (re)loaded on one thread and simulated on another, so a
+        # running simulation never delays the cache lookup of another query;
+        # one simulation thread, since they share the schedulers' caches
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="load")
+        self._simulator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulate")
+
+    # -- trees (loader thread) ------------------------------------------------
+
+    def _file_tree(self, name):
+        from baseline_simulation import NuclearScheduler
+        from tree_loader import load_tree
+
+        path = self.paths.get(name)
+        if path is None:
+            raise QueryError(f"unknown tree {name!r} (known: {', '.join(sorted(self.paths))})", 404)
+        try:
+            stat = path.stat()
+        except OSError as exc:
+            raise QueryError(f"tree {name!r} cannot be read: {exc}", 404)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        warm = self.trees.get(name)
+        if warm is None or warm.stamp != stamp:
+            loaded = load_tree(path, self.concept_types, cache_dir=self.cache_dir, strict=self.strict)
+            warm = WarmTree(name, loaded, loaded.scheduler(NuclearScheduler), stamp)
+            self.trees[name] = warm
+        return warm
+
+    def _inline_tree(self, graph_data):
+        from baseline_simulation import NuclearScheduler
+        from result_cache import tree_digest
+        from tree_loader import load_graph
+
+        digest = tree_digest(graph_data)
+        warm = self.inline.get(digest)
+        if warm is None:
+            loaded = load_graph(graph_data, "<posted graph>", self.concept_types,
+                                cache_dir=self.cache_dir, strict=self.strict)
+            warm = WarmTree(digest[:12], loaded, loaded.scheduler(NuclearScheduler))
+            self.inline.put(digest, warm)
+        return warm
+
+    def _prepare(self, spec):
+        """(warm tree, resolved params, cache key) of a query ``spec``."""
+        from result_cache import canonical_json
+
+        spec = dict(spec)
+        tree_name = spec.pop("tree", None)
+        graph_data = spec.pop("graph", None)
+        if (tree_name is None) == (graph_data is None):
+            raise QueryError("give exactly one of 'tree' (a registered tree) or 'graph' (tree data)")
+        params = normalise_params(spec)
+        warm = self._file_tree(str(tree_name)) if graph_data is None else self._inline_tree(graph_data)
+        params["accelerate"] = resolve_accelerate(warm.scheduler.tree, params["accelerate"])
+        parts = {"tree": warm.loaded.digest, "concept_types": list(self.concept_types), "params": params}
+        key = hashlib.sha256(canonical_json(parts).encode("utf-8")).hexdigest()
+        return warm, params, key
+
+    # -- simulation (simulator thread) ----------------------------------------
+
+    def _compute(self, warm, params, key):
+        started = time.perf_counter()
+        response = run_query(warm.scheduler, params)
+        response["__meta__"] = {
+            "tree": warm.name,
+            "tree_digest": warm.loaded.digest,
+            "params": params,
+            "cache_key": key,
+            "compute_ms": round(1000 * (time.perf_counter() - started), 3),
+        }
+        self.simulations += 1
+        return json.dumps(response, separators=(",", ":")).encode("utf-8")
+
+    def load_all(self):
+        """Load every registered tree now; returns name -> error message for failures."""
+        errors = {}
+        for name in self.paths:
+            try:
+                self._file_tree(name)
+            except Exception as exc:
+                errors[name] = str(exc)
+        return errors
+
+    # -- queries (event loop) -------------------------------------------------
+
+    @staticmethod
+    async def _run(executor, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def simulate(self, spec):
+        """
+        Encoded JSON response for query ``spec`` and how it was served
+        ('hit', 'shared' with an identical query in flight, or 'miss').
+        """
+        warm, params, key = await self._run(self._loader, self._prepare, spec)
+        body = self.results.get(key)
+        if body is not None:
+            return body, "hit"
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), "shared"
+        future = asyncio.ensure_future(self._run(self._simulator, self._compute, warm, params, key))
+        self._pending[key] = future
+        try:
+            body = await future
+        finally:
+            del self._pending[key]
+        self.results.put(key, body)
+        return body, "miss"
+
+    async def warm_up(self, names, horizons):
+        """Fill the cache with the default query of every tree at each horizon."""
+        for name in names:
+            for years in horizons:
+                await self.simulate({"tree": name, "years": years})
+
+    def health(self):
+        return {
+            "status": "ok",
+            "trees": sorted(self.trees),
+            "inline_trees": len(self.inline.entries),
+            "simulations": self.simulations,
+            "cache": self.results.stats(),
+        }
+
+    # -- HTTP -----------------------------------------------------------------
+
+    async def dispatch(self, method, target, body):
+        """(status, JSON bytes, cache state or None) for one request."""
+        url = urlsplit(target)
+        try:
+            if url.path == "/health" and method == "GET":
+                return 200, _encode(self.health()), None
+            if url.path == "/trees" and method == "GET":
+                trees = await self._run(self._loader, lambda: [self._file_tree(n).describe() for n in sorted(self.paths)])
+                return 200, _encode({"trees": trees}), None
+            if url.path == "/simulate" and method in ("GET", "POST"):
+                if method == "GET":
+                    spec = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                    if "accelerate" in spec:
+                        spec["accelerate"] = parse_qs(url.query)["accelerate"]
+                else:
+                    try:
+                        spec = json.loads(body or b"{}")
+                    except ValueError as exc:
+                        raise QueryError(f"request body is not JSON: {exc}")
+                    if not isinstance(spec, dict):
+                        raise QueryError("request body must be a JSON object")
+                payload, state = await self.simulate(spec)
+                return 200, payload, state
+            if url.path in ("/health", "/trees", "/simulate"):
+                return 405, _encode({"error": f"{method} is not allowed on {url.path}"}), None
+            return 404, _encode({"error": f"no such endpoint: {url.path}"}), None
+        except QueryError as exc:
+            return exc.status, _encode({"error": str(exc)}), None
+        except ValueError as exc:  # TreeValidationError and bad tree data
+            return 422, _encode({"error": str(exc)}), None
+        except Exception as exc:
+            print(f"ERROR {method} {target}: {exc!r}", file=sys.stderr)
+            return 500, _encode({"error": "simulation failed"}), None
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection (keep-alive unless closed)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await _respond(writer, 400, _encode({"error": "malformed request line"}), None, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    await _respond(writer, 413 if length > 0 else 400,
+                                   _encode({"error": "missing, invalid or too large Content-Length"}), None, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                started = time.perf_counter()
+                status, payload, state = await self.dispatch(method.upper(), target, body)
+                await _respond(writer, status, payload, state, keep_alive, time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_socket=None):
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+            where = f"unix:{unix_socket}"
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            where = "http://" + ", ".join("%s:%d" % sock.getsockname()[:2] for sock in server.sockets)
+        print(f"Serving {len(self.trees)} tree(s) on {where}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._loader.shutdown(wait=False)
+        self._simulator.shutdown(wait=False)
+
+
+def _encode(value):
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+async def _respond(writer, status, payload, cache_state, keep_alive, seconds=None):
+    headers = [
+        f"HTTP/1.1 {status} {STATUS_REASONS.get(status, 'Error')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(payload)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if cache_state:
+        headers.append(f"X-Cache: {cache_state}")
+    if seconds is not None:
+        headers.append(f"Server-Timing: total;dur={1000 * seconds:.3f}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve warm deterministic tech tree simulations over HTTP.")
+    parser.add_argument("tech_tree_paths", nargs="*", help="Tree JSON files, served under their file stem.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765).")
+    parser.add_argument("--unix-socket", default=None, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Responses kept in the LRU result cache (default: 256).")
+    parser.add_argument("--inline-trees", type=int, default=8,
+                        help="Posted (inline) trees kept compiled (default: 8).")
+    parser.add_argument("--warm-years", default="",
+                        help="Comma-separated horizons to precompute for every tree at start, "
+                             "e.g. 5,10,15,20,25,30 for the dashboard.")
+    parser.add_argument("--concept-types", default=None,
+                        help="Comma-separated node types treated as deployable concepts "
+                             "(default: the scheduler's CONCEPT_TYPES).")
+    parser.add_argument("--simulation-module-path", default=str(Path(__file__).resolve().parent),
+                        help="Directory containing simulation.py (default: this script's directory).")
+    parser.add_argument("--strict", action="store_true", help="Reject trees with validation warnings.")
+    parser.add_argument("--no-tree-cache", action="store_true",
+                        help="Always compile trees instead of using the compiled-tree cache.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(Path(args.simulation_module_path).resolve()))
+    concept_types = tuple(t.strip() for t in args.concept_types.split(",")) if args.concept_types else None
+    service = SimulationService(args.tech_tree_paths, concept_types, args.cache_size, args.inline_trees,
+                                args.strict, not args.no_tree_cache)
+    for name, error in service.load_all().items():
+        print(f"WARNING: {name} not loaded: {error}", file=sys.stderr)
+    horizons = [int(y) for y in args.warm_years.split(",") if y.strip()]
+
+    async def run():
+        if horizons:
+            started = time.perf_counter()
+            await service.warm_up(sorted(service.trees), horizons)
+            print(f"Precomputed {service.simulations} response(s) in {time.perf_counter() - started:.2f}s",
+                  flush=True)
+        await service.serve(args.host, args.port, args.unix_socket)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
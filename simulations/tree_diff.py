@@ -0,0 +1,123 @@
+"""
+tree_diff.py
+------------
+Diff two versions of a tech tree and find the nodes whose simulation results
+can have changed.
+
+A tree is summarised by a fingerprint: the node order, a hash per node over
+the fields the simulation reads (label, type, trl_current, and whether
+trl_projected_5_10_years is present) and the multiset of (source, target) edges.
+Descriptions, references and other metadata do not affect the fingerprint.
+
+Given the changes, ``dirty_nodes`` returns the nodes that need to be
+recomputed in the new tree:
+
+* the downstream cone of every changed node (including removed nodes that
+  remain as phantom edge endpoints) and of every target of an added or
+  removed edge, since their status timelines can shift;
+* every node that reaches a concept inside that cone, since the concept's
+  critical path (and so the node's pathway values) can change even if the
+  node itself is on a different branch;
+* the sources of added or removed edges and the ancestors of changed nodes,
+  since the set of concepts they reach can change.
+
+Everything else keeps the same rows.
+"""
+
+import hashlib
+import json
+from collections import Counter
+
+from compiled_tree import _edge_targets
+
+FINGERPRINT_VERSION = 1
+
+
+def _node_hash(node):
+    relevant = {
+        'label': node.get('label'),
+        'type': node.get('type'),
+        'trl_current': node.get('trl_current'),
+        'projected': 'trl_projected_5_10_years' in node,
+    }
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def tree_fingerprint(graph_data):
+    """JSON-serialisable summary of the simulation-relevant parts of a tree."""
+    nodes = graph_data['graph']['nodes']
+    # A multiset: a repeated edge counts its prerequisite twice
+    edges = sorted(
+        (edge['source'], target)
+        for edge in graph_data['graph']['edges']
+        for target in _edge_targets(edge)
+        if edge['source'] and target
+    )
+    return {
+        'version': FINGERPRINT_VERSION,
+        'order': [node['id'] for node in nodes],
+        'nodes': {node['id']: _node_hash(node) for node in nodes},
+        'edges': [list(edge) for edge in edges],
+    }
+
+
+class TreeChanges:
+    """Differences between two fingerprints."""
+
+    def __init__(self, old, new):
+        old_nodes, new_nodes = old['nodes'], new['nodes']
+        self.added = [i for i in new_nodes if i not in old_nodes]
+        self.removed = [i for i in old_nodes if i not in new_nodes]
+        self.modified = [i for i in new_nodes if i in old_nodes and old_nodes[i] != new_nodes[i]]
+        old_edges = Counter(tuple(e) for e in old['edges'])
+        new_edges = Counter(tuple(e) for e in new['edges'])
+        self.edges_added = sorted((new_edges - old_edges).elements())
+        self.edges_removed = sorted((old_edges - new_edges).elements())
+        # Same-year unlocking follows node order, so a reordering changes everything
+        common = set(old_nodes) & set(new_nodes)
+        self.reordered = ([i for i in old['order'] if i in common]
+                          != [i for i in new['order'] if i in common])
+        self.comparable = old.get('version') == new.get('version') == FINGERPRINT_VERSION
+
+    @property
+    def empty(self):
+        return not (self.added or self.removed or self.modified
+                    or self.edges_added or self.edges_removed or self.reordered)
+
+    def summary(self):
+        return (f"{len(self.modified)} modified, {len(self.added)} added, {len(self.removed)} removed nodes; "
+                f"{len(self.edges_added)} added, {len(self.edges_removed)} removed edges")
+
+
+def dirty_nodes(tree, reach, changes):
+    """Indices (in ``tree``) of the nodes whose results may differ after ``changes``."""
+    index = tree.index
+    changed_edges = changes.edges_added + changes.edges_removed
+    # A removed node still named by an edge lives on as a phantom (time 0, probability 1)
+    timeline_seeds = [index[i] for i in changes.added + changes.modified + changes.removed if i in index]
+    timeline_seeds += [index[target] for _, target in changed_edges if target in index]
+    # Edge sources and ancestors of changed nodes reach a different set of concepts
+    # (e.g. a removed or retyped concept)
+    upstream_seeds = [index[source] for source, _ in changed_edges if source in index] + timeline_seeds
+
+    cone = 0
+    for i in timeline_seeds:
+        cone |= reach.rows[i]
+    # Phantoms have no successor rows; reach their dependents through the prerequisite lists
+    phantom_seeds = {i for i in timeline_seeds if tree.is_phantom[i]}
+    if phantom_seeds:
+        for j, preds in enumerate(tree.pred_lists):
+            if phantom_seeds.intersection(preds):
+                cone |= reach.rows[j]
+    concept_mask = 0
+    for c in tree.is_concept.nonzero()[0].tolist():
+        if cone >> c & 1:
+            concept_mask |= 1 << c
+    upstream_mask = 0
+    for i in upstream_seeds:
+        upstream_mask |= 1 << i
+
+    return sorted(
+        i for i, row in enumerate(reach.rows)
+        if cone >> i & 1 or row & concept_mask or row & upstream_mask
+    )
@@ -0,0 +1,273 @@
+"""
+tree_loader.py
+--------------
+One loader for every entry point: parse, validate and compile a tech tree.
+
+``load_tree(path)`` reads the JSON file (or, for old exports, a Python dict
+literal via ``ast.literal_eval``), validates it (``load_graph`` does the same
+for graph data that is already parsed) and returns a ``LoadedTree``
+holding the graph data, its content hash and the compiled structures
+(``CompiledTree`` and ``ReachabilityIndex``) that ``SchedulerCore`` would
+otherwise rebuild on every start.
+
+Validation reports ``TreeIssue`` objects:
+
+* errors (``TreeValidationError``, raised before any simulation time is
+  spent): missing ``graph.nodes``/``graph.edges``, nodes without
+  ``id``/``label``, duplicate node ids, edges without a source, edges with
+  neither or both of ``target``/``targets`` or a ``targets`` that is not a
+  non-empty list of ids, and dependency cycles;
+* warnings: dangling edge endpoints (simulated as phantom nodes that are
+  complete from the start, as before), duplicate labels (outputs are keyed
+  by label, so the last such node wins) and repeated edges. ``strict=True``
+  turns warnings into errors.
+
+The compiled structures are pickled to ``<cache_dir>/<key>.pickle`` (default
+``$MCS_TREE_CACHE_DIR`` or ``~/.cache/investment-tech-tree/compiled``), keyed by
+the tree's content hash, the concept types, the TRL probability map, the
+simulation code version and the Python/NumPy versions, so a repeated load of
+an unchanged tree skips compilation.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import pickle
+import platform
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from compiled_tree import CONCEPT_TYPES, CompiledTree, _edge_targets
+from critical_path import find_cycle
+from reachability import ReachabilityIndex
+from result_cache import canonical_json, code_version, tree_digest
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get("MCS_TREE_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "investment-tech-tree" / "compiled"
+)
+
+
+class TreeIssue:
+    """One validation finding (``severity`` is 'error' or 'warning')."""
+
+    __slots__ = ("severity", "code", "message")
+
+    def __init__(self, severity, code, message):
+        self.severity = severity
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return f"{self.severity}: {self.message} [{self.code}]"
+
+    def to_dict(self):
+        return {"severity": self.severity, "code": self.code, "message": self.message}
+
+
+class TreeValidationError(ValueError):
+    """
+    Raised when a tree has validation errors (or, with ``strict``, warnings);
+    ``issues`` lists every finding.
+    """
+
+    def __init__(self, source, issues, strict=False):
+        self.issues = list(issues)
+        blocking = [i for i in self.issues if strict or i.severity == "error"]
+        super().__init__(f"{source}: {len(blocking)} validation issue(s):\n"
+                         + "\n".join(f"  {issue}" for issue in blocking))
+
+
+def parse_tree(path):
+    """Graph data of a tech tree file: JSON, or a Python dict literal for old exports."""
+    raw = Path(path).read_text(encoding="utf-8")
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(raw)
+    except (ValueError, SyntaxError) as exc:
+        raise TreeValidationError(path, [TreeIssue("error", "parse", f"neither JSON nor a dict literal: {exc}")])
+
+
+def validate_tree(graph_data):
+    """Structural issues of ``graph_data`` (cycles are checked on the compiled tree)."""
+    issues = []
+
+    def error(code, message):
+        issues.append(TreeIssue("error", code, message))
+
+    def warning(code, message):
+        issues.append(TreeIssue("warning", code, message))
+
+    graph = graph_data.get("graph") if isinstance(graph_data, dict) else None
+    nodes = graph.get("nodes") if isinstance(graph, dict) else None
+    edges = graph.get("edges") if isinstance(graph, dict) else None
+    if not isinstance(nodes, list) or not isinstance(edges, list):
+        error("structure", "expected {'graph': {'nodes': [...], 'edges': [...]}}")
+        return issues
+
+    ids = []
+    for k, node in enumerate(nodes):
+        if not isinstance(node, dict) or not node.get("id"):
+            error("node_id", f"node #{k} has no id")
+            continue
+        ids.append(node["id"])
+        if "label" not in node:
+            error("node_label", f"node {node['id']!r} has no label")
+    for node_id, count in Counter(ids).items():
+        if count > 1:
+            error("duplicate_id", f"node id {node_id!r} is used {count} times")
+    labels = Counter(node.get("label") for node in nodes if isinstance(node, dict) and "label" in node)
+    for label, count in labels.items():
+        if count > 1:
+            warning("duplicate_label", f"label {label!r} is used by {count} nodes")
+
+    known = set(ids)
+    dangling = Counter()
+    pairs = Counter()
+    for k, edge in enumerate(edges):
+        name = edge.get("id", f"#{k}") if isinstance(edge, dict) else f"#{k}"
+        if not isinstance(edge, dict) or not edge.get("source"):
+            error("edge_source", f"edge {name!r} has no source")
+            continue
+        if ("target" in edge) == ("targets" in edge):
+            error("edge_target", f"edge {name!r} needs exactly one of 'target' or 'targets'")
+            continue
+        targets = edge.get("targets")
+        if "targets" in edge and (not isinstance(targets, list) or not targets
+                                  or not all(isinstance(t, str) and t for t in targets)):
+            error("edge_targets", f"edge {name!r}: 'targets' must be a non-empty list of node ids")
+            continue
+        if "target" in edge and not (isinstance(edge["target"], str) and edge["target"]):
+            error("edge_target", f"edge {name!r}: 'target' must be a node id")
+            continue
+        for target in _edge_targets(edge):
+            pairs[(edge["source"], target)] += 1
+            for endpoint in (edge["source"], target):
+                if endpoint not in known:
+                    dangling[endpoint] += 1
+    for endpoint, count in sorted(dangling.items()):
+        warning("dangling_endpoint",
+                f"{endpoint!r} ({count} edge(s)) is not a node; it is simulated as already complete")
+    for (source, target), count in sorted(pairs.items()):
+        if count > 1:
+            warning("duplicate_edge", f"edge {source!r} -> {target!r} appears {count} times")
+    return issues
+
+
+def check_cycles(tree):
+    """An error issue for a dependency cycle of the compiled ``tree``, if any."""
+    cycle = find_cycle(tree)
+    if not cycle:
+        return []
+    return [TreeIssue("error", "cycle", "dependency cycle: " + " -> ".join(cycle))]
+
+
+class LoadedTree:
+    """A parsed, validated and compiled tech tree."""
+
+    def __init__(self, path, graph_data, digest, tree, reachability, issues, from_cache):
+        self.path = path
+        self.graph_data = graph_data
+        self.digest = digest
+        self.tree = tree
+        self.reachability = reachability
+        self.issues = issues
+        self.from_cache = from_cache
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == "warning"]
+
+    def scheduler(self, scheduler_cls):
+        """``scheduler_cls`` (a ``SchedulerCore`` subclass) on the precompiled structures."""
+        return scheduler_cls(self.graph_data, concept_types=self.tree.concept_types,
+                             compiled=(self.tree, self.reachability))
+
+
+def _compile_key(digest, concept_types, trl_probability_map):
+    parts = {
+        "format": CACHE_FORMAT_VERSION,
+        "tree": digest,
+        "concept_types": list(concept_types),
+        "trl_probability_map": trl_probability_map,
+        "code": code_version(Path(__file__).resolve().parent),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    return hashlib.sha256(canonical_json(parts).encode("utf-8")).hexdigest()
+
+
+def _read_cache(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # A truncated or incompatible entry is rebuilt
+        return None
+
+
+def _write_cache(path, compiled):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so concurrent loaders never see a partial entry
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_tree(path, concept_types=CONCEPT_TYPES, cache_dir=DEFAULT_CACHE_DIR, strict=False):
+    """
+    Parse, validate and compile the tree at ``path``; returns a ``LoadedTree``.
+
+    Raises ``TreeValidationError`` on errors (or warnings with ``strict``).
+    ``cache_dir=None`` disables the compiled-tree cache.
+    """
+    path = Path(path)
+    return load_graph(parse_tree(path), path, concept_types, cache_dir, strict)
+
+
+def load_graph(graph_data, source="<graph>", concept_types=CONCEPT_TYPES, cache_dir=DEFAULT_CACHE_DIR,
+               strict=False):
+    """``load_tree`` for already parsed ``graph_data`` (e.g. posted to the simulation service)."""
+    from scheduler_core import TRL_PROBABILITY_MAP
+
+    issues = validate_tree(graph_data)
+    if any(strict or issue.severity == "error" for issue in issues):
+        raise TreeValidationError(source, issues, strict)
+
+    digest = tree_digest(graph_data)
+    concept_types = tuple(concept_types)
+    compiled = None
+    entry = None
+    if cache_dir is not None:
+        entry = Path(cache_dir) / f"{_compile_key(digest, concept_types, TRL_PROBABILITY_MAP)}.pickle"
+        compiled = _read_cache(entry)
+    from_cache = compiled is not None
+    if compiled is None:
+        tree = CompiledTree(graph_data, TRL_PROBABILITY_MAP, concept_types=concept_types)
+        compiled = (tree, ReachabilityIndex(tree))
+    tree, reachability = compiled
+
+    issues += check_cycles(tree)
+    if any(strict or issue.severity == "error" for issue in issues):
+        raise TreeValidationError(source, issues, strict)
+    if entry is not None and not from_cache:
+        try:
+            _write_cache(entry, compiled)
+        except OSError:
+            pass  # a read-only cache only costs the compile time
+    return LoadedTree(source, graph_data, digest, tree, reachability, issues, from_cache)
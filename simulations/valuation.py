@@ -0,0 +1,45 @@
+"""
+valuation.py
+------------
+Closed-form discounted-energy valuation of deployed concepts.
+
+A plant deployed in year ``d`` produces ``annual_mwh`` in each of the years
+``d, d + 1, ..., d + years_of_operation - 1``; only years strictly after the
+valuation year count, each discounted by ``(1 + discount_rate) ** (year -
+current_year)``. That is a truncated annuity, so instead of summing the terms
+one by one it is evaluated as a geometric series starting at the first counted
+year. Deployment years may be scalars or arrays of any shape (a whole batch of
+concepts or iterations in one call); ``inf`` (never deployed) is worth 0.
+"""
+
+import numpy as np
+
+
+class DiscountedEnergyValuation:
+    """Discounted lifetime MWh of a plant as a function of its deployment year."""
+
+    def __init__(self, current_year, discount_rate, years_of_operation, annual_mwh):
+        self.current_year = current_year
+        self.discount_rate = discount_rate
+        self.years_of_operation = years_of_operation
+        self.annual_mwh = annual_mwh
+        self._v = 1.0 / (1.0 + discount_rate)
+
+    def __call__(self, deployment_years):
+        offset = np.asarray(deployment_years, dtype=float) - self.current_year
+        n = self.years_of_operation
+        # First operating year i with offset + i > 0, clipped to [0, n]
+        with np.errstate(invalid='ignore'):
+            first = np.clip(np.floor(-offset) + 1, 0, n)
+        remaining = n - first
+        with np.errstate(over='ignore', invalid='ignore'):
+            if self.discount_rate == 0:
+                value = self.annual_mwh * remaining
+            else:
+                v = self._v
+                value = self.annual_mwh * v ** (offset + first) * (1 - v ** remaining) / (1 - v)
+        return np.where(np.isfinite(offset) & (remaining > 0), value, 0.0)
+
+    def scalar(self, deployment_year):
+        """Same as calling the valuation, for a single year, as a Python float."""
+        return float(self(deployment_year))
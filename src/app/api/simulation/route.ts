@@ -3,6 +3,30 @@ import clientPromise from '@/lib/mongodb';
 import { runSimulation } from '@/lib/simulation';
 import { TOPICS, TopicKey } from '@/lib/topicConfig';
 
+// Base URL of simulations/simulation_service.py, e.g. http://127.0.0.1:8765
+const SIMULATION_SERVICE_URL = process.env.SIMULATION_SERVICE_URL;
+
+async function runOnSimulationService(techTree: object, years: number) {
+  if (!SIMULATION_SERVICE_URL) return null;
+  try {
+    const response = await fetch(`${SIMULATION_SERVICE_URL}/simulate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ graph: techTree, years }),
+      cache: 'no-store',
+    });
+    if (!response.ok) {
+      console.error('Simulation service error:', response.status, await response.text());
+      return null;
+    }
+    console.log('🐍 Simulation service:', { cache: response.headers.get('x-cache') });
+    return await response.json();
+  } catch (error) {
+    console.error('Simulation service unreachable, using the built-in simulation:', error);
+    return null;
+  }
+}
+
 export async function GET(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams;
@@ -56,8 +80,8 @@ export async function GET(request: NextRequest) {
       edgeCount: techTree.graph.edges.length
     });
 
-    // Run simulation
-    const results = runSimulation(techTree, years);
+    // Run simulation (on the Python simulation service when configured)
+    const results = (await runOnSimulationService(techTree, years)) ?? runSimulation(techTree, years);
 
     // DEBUG: Check the year range in results
     const impactYears = new Set<number>();